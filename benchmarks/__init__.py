@@ -0,0 +1,16 @@
+'''
+Copyright (c) Kevin Keogh 2016
+
+Benchmark suite of qbootstrapper: full builds of the examples.py curves,
+microbenchmarks of the instrument, schedule and curve query kernels, and
+scaling runs over the pillar count and the query batch size.
+
+Run it with
+
+    python -m benchmarks [--quick] [--output results.json]
+
+from the root of the repository. The results are written as JSON, and
+compared against a baseline from the same machine when one is passed with
+--baseline, see benchmarks.suite.
+'''
+from benchmarks.suite import *
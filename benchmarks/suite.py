@@ -0,0 +1,451 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the benchmark suite. There are four groups of benchmarks:
+
+    builds      : Full builds of each of the examples.py curves, including
+                  the simultaneous Fed Funds/LIBOR strip
+    kernels     : Single calls of the instrument, schedule and curve query
+                  kernels: OIS and LIBOR _swap_value (which includes the OIS
+                  daily compounding), Schedule and ScheduleTable generation,
+                  instrument creation from arguments and from an
+                  InstrumentSet, daycount and log_discount_factor
+    scaling     : Builds of a synthetic OIS curve (see
+                  qbootstrapper.synthetic) over a range of pillar counts, and
+                  log_discount_factor over a range of query batch sizes,
+                  interpolated and on the daily grid
+    imports     : Import times of the package and of the submodules that
+                  tools use to read curves, each in a fresh interpreter
+
+Every benchmark is timed as the best, and the median, of a number of
+repeats, each of enough calls to last at least 50ms. The results are written
+as JSON, keyed by benchmark name, with the seconds per call. Timings are
+specific to the machine that ran them, so there is no committed baseline:
+a baseline is saved locally (--save-baseline) and compared against only when
+it is passed with --baseline, with the same number of repeats, and a
+benchmark regresses if it is slower than its baseline by more than the
+threshold. The imports also have an absolute budget, IMPORT_BUDGETS, and
+must not import scipy, which is only needed to solve curves.
+
+Only numpy, scipy and the standard library are needed, so the suite runs
+offline.
+'''
+# python libraries
+from __future__ import division, print_function
+import argparse
+import datetime
+import json
+import os
+import platform
+import runpy
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+import scipy
+
+# qlib libraries
+import qbootstrapper as qb
+import qbootstrapper.synthetic as synthetic
+
+__all__ = ['BASELINE', 'SUITES', 'IMPORT_BUDGETS', 'measure', 'run',
+           'compare', 'check_budgets', 'main']
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'examples.py')
+
+EXAMPLE_CURVES = [('EONIA', 'eonia'),
+                  ('FEDFUNDS', 'fedfunds'),
+                  ('SONIA', 'sonia'),
+                  ('EURIBOR', 'euribor'),
+                  ('USDLIBOR', 'usdlibor'),
+                  ('FEDFUNDS_LIBOR', 'fedfunds_libor')]
+
+PILLAR_COUNTS = [10, 20, 40, 80, 160]
+BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+QUICK_PILLAR_COUNTS = [10, 40]
+QUICK_BATCH_SIZES = [1, 1000, 100000]
+
+# seconds that each import may take
+IMPORT_BUDGETS = {'qbootstrapper': 0.05,
+                  'qbootstrapper.curves': 0.5,
+                  'qbootstrapper.loader': 0.5,
+                  'qbootstrapper.store': 0.5}
+
+_IMPORT = ('import json, sys, time\n'
+           'started = time.perf_counter()\n'
+           'import {0}\n'
+           'print(json.dumps([time.perf_counter() - started,'
+           ' "scipy" in sys.modules]))')
+
+
+def measure(function, repeat=5, minimum=0.05):
+    '''Returns the timing of a function, called without arguments, as a dict
+    of the best and median seconds per call, the number of calls per repeat
+    and the number of repeats
+
+    kwargs
+    ------
+    repeat (int)        : Number of repeats [default: 5]
+    minimum (float)     : Minimum seconds of each repeat, the number of
+                          calls is increased until it is reached
+                          [default: 0.05]
+    '''
+    number = 1
+    while True:
+        elapsed = _time(function, number)
+        if elapsed >= minimum:
+            break
+        number *= max(2, min(10, int(minimum / max(elapsed, 1e-9) * 1.2) + 1))
+    times = [elapsed] + [_time(function, number) for _ in range(repeat - 1)]
+    times = sorted(time / number for time in times)
+    return {'seconds': times[0],
+            'median': times[len(times) // 2],
+            'number': number,
+            'repeat': repeat}
+
+
+def bench_builds(repeat=5):
+    '''Returns the timings of the full builds of the examples.py curves
+    '''
+    namespace = _examples()
+    results = {}
+    for name, variable in EXAMPLE_CURVES:
+        results['build.' + name] = measure(namespace[variable].build, repeat)
+    return results
+
+
+def bench_kernels(repeat=5):
+    '''Returns the timings of the instrument, schedule and curve query
+    kernels
+    '''
+    namespace = _examples()
+    eonia, euribor = namespace['eonia'], namespace['euribor']
+    eonia.build()
+    euribor.build()
+
+    results = {}
+    results['kernel.ois_swap_value'] = _measure_swap(eonia, repeat)
+    results['kernel.libor_swap_value'] = _measure_swap(euribor, repeat)
+
+    effective = datetime.datetime(2016, 7, 5)
+    maturity = datetime.datetime(2046, 7, 5)
+    results['kernel.schedule'] = measure(
+        lambda: qb.Schedule(effective, maturity, 6,
+                            period_adjustment='modified following',
+                            payment_adjustment='following'), repeat)
+    effectives = np.datetime64('2016-07-05') + np.arange(1000)
+    results['kernel.schedule_table'] = measure(
+        lambda: qb.ScheduleTable(effectives, effectives + 10957, 6,
+                                 period_adjustment='modified following',
+                                 payment_adjustment='following'), repeat)
+
+    # creating the instrument objects of a curve, from their arguments and
+    # from an InstrumentSet with the periods generated in advance
+    instrument_set = qb.InstrumentSet.from_instruments(eonia.instruments)
+    results['kernel.instruments.objects'] = measure(
+        lambda: [type(instrument)(*instrument._arguments[0],
+                                  **instrument._arguments[1])
+                 for instrument in eonia.instruments], repeat)
+    results['kernel.instruments.instrument_set'] = measure(
+        lambda: instrument_set.instruments(eonia), repeat)
+    results['kernel.instrument_set'] = measure(
+        lambda: qb.InstrumentSet.from_instruments(eonia.instruments), repeat)
+    results['kernel.daycount.Act360'] = measure(
+        lambda: qb.Instrument.daycount(effective, maturity, 'Act360'), repeat)
+    results['kernel.daycount.30E360'] = measure(
+        lambda: qb.Instrument.daycount(effective, maturity, '30E360'), repeat)
+
+    date = datetime.datetime(2030, 5, 17)
+    timestamps = _timestamps(eonia, 1000)
+    results['kernel.log_discount_factor.date'] = measure(
+        lambda: eonia.log_discount_factor(date), repeat)
+    results['kernel.log_discount_factor.batch'] = measure(
+        lambda: eonia.log_discount_factor(timestamps), repeat)
+    return results
+
+
+def bench_scaling(repeat=5, pillar_counts=None, batch_sizes=None):
+    '''Returns the timings of the builds of an OIS curve with each of a list
+    of pillar counts, and of log_discount_factor with each of a list of
+    query batch sizes, interpolated and on the daily grid
+
+    kwargs
+    ------
+    pillar_counts (list)    : Pillar counts [default: PILLAR_COUNTS]
+    batch_sizes (list)      : Batch sizes [default: BATCH_SIZES]
+    '''
+    results = {}
+    for pillars in pillar_counts or PILLAR_COUNTS:
+        curve = _ois_curve(pillars)
+        results['scaling.pillars.{0}'.format(pillars)] = measure(curve.build,
+                                                                 repeat)
+
+    curve = _ois_curve(40)
+    curve.build()
+    grid = _ois_curve(40)
+    grid.daily_grid = True
+    grid.build()
+    for size in batch_sizes or BATCH_SIZES:
+        timestamps = _timestamps(curve, size)
+        results['scaling.batch.{0}'.format(size)] = measure(
+            lambda: curve.log_discount_factor(timestamps), repeat)
+        results['scaling.grid_batch.{0}'.format(size)] = measure(
+            lambda: grid.log_discount_factor(timestamps), repeat)
+    return results
+
+
+def bench_imports(repeat=5):
+    '''Returns the timings of the imports of IMPORT_BUDGETS, each in a fresh
+    interpreter, with whether scipy was imported
+    '''
+    results = {}
+    for module in sorted(IMPORT_BUDGETS):
+        _import(module)
+        timings = [_import(module) for _ in range(repeat)]
+        seconds = sorted(seconds for seconds, _ in timings)
+        results['import.' + module] = {'seconds': seconds[0],
+                                       'median': seconds[len(seconds) // 2],
+                                       'number': 1,
+                                       'repeat': repeat,
+                                       'scipy': any(scipy for _, scipy in timings)}
+    return results
+
+
+SUITES = {'builds': bench_builds,
+          'imports': bench_imports,
+          'kernels': bench_kernels,
+          'scaling': bench_scaling}
+
+
+def run(suites=None, repeat=5, quick=False):
+    '''Runs the benchmarks and returns the results document, a
+    JSON-compatible dict of the machine, the creation time and the timings
+
+    kwargs
+    ------
+    suites (list)       : Names of the suites to run, see SUITES
+                          [default: every suite]
+    repeat (int)        : Number of repeats of each benchmark [default: 5]
+    quick (bool)        : Run fewer scaling points [default: False]
+    '''
+    results = {}
+    for name in suites or sorted(SUITES):
+        if name not in SUITES:
+            raise Exception('Benchmark suite "{name}" not '
+                            'recognized'.format(**locals()))
+        if name == 'scaling' and quick:
+            results.update(bench_scaling(repeat, QUICK_PILLAR_COUNTS,
+                                         QUICK_BATCH_SIZES))
+        else:
+            results.update(SUITES[name](repeat))
+    return {'machine': _machine(),
+            'created': datetime.datetime.now().isoformat(),
+            'results': results}
+
+
+def compare(results, baseline, threshold=0.25):
+    '''Returns the benchmarks that are slower than their baseline by more
+    than the threshold, as a list of dicts of the name, baseline and current
+    seconds per call, and the ratio of the two, slowest first. Benchmarks
+    that were timed with a different number of repeats than their baseline
+    are not compared.
+
+    Arguments:
+        results (dict)      : Results document, see run
+        baseline (dict)     : Baseline results document
+
+        kwargs
+        ------
+        threshold (float)   : Relative slowdown that counts as a regression
+                              [default: 0.25]
+    '''
+    regressions = []
+    for name, timing in results['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or not base['seconds']:
+            continue
+        if timing['repeat'] != base['repeat']:
+            continue
+        ratio = timing['seconds'] / base['seconds']
+        if ratio > 1 + threshold:
+            regressions.append({'name': name,
+                                'baseline': base['seconds'],
+                                'seconds': timing['seconds'],
+                                'ratio': ratio})
+    return sorted(regressions, key=lambda regression: -regression['ratio'])
+
+
+def check_budgets(results):
+    '''Returns the imports in a results document that are over their budget
+    or import scipy, as a list of messages
+    '''
+    failures = []
+    for module, budget in sorted(IMPORT_BUDGETS.items()):
+        timing = results['results'].get('import.' + module)
+        if timing is None:
+            continue
+        if timing['seconds'] > budget:
+            failures.append('{0} took {1}, over its budget of '
+                            '{2}'.format(module, _format(timing['seconds']),
+                                         _format(budget)))
+        if timing['scipy']:
+            failures.append('{0} imported scipy'.format(module))
+    return failures
+
+
+def main(argv=None):
+    '''Command line entry point, returns 1 if any benchmark regressed
+    against the --baseline results, or any import is over its budget
+    '''
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='qbootstrapper benchmarks')
+    parser.add_argument('suites', nargs='*',
+                        help='suites to run, of {0} '
+                             '[default: all]'.format(', '.join(sorted(SUITES))))
+    parser.add_argument('--repeat', type=int,
+                        help='repeats of each benchmark [default: those of '
+                             'the baseline, or 5 (3 with --quick)]')
+    parser.add_argument('--quick', action='store_true',
+                        help='fewer repeats and scaling points')
+    parser.add_argument('--output', help='path to write the results JSON to')
+    parser.add_argument('--baseline',
+                        help='baseline results JSON to compare against, '
+                             'saved on the same machine with --save-baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown that counts as a regression '
+                             '[default: %(default)s]')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='write the results to the --baseline path '
+                             '[default: benchmarks/baseline.json, which is '
+                             'not tracked]')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline is not None and not args.save_baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+    repeat = args.repeat
+    if repeat is None and baseline is not None:
+        repeat = max(timing['repeat'] for timing in baseline['results'].values())
+    if repeat is None:
+        repeat = 3 if args.quick else 5
+
+    document = run(args.suites, repeat=repeat, quick=args.quick)
+
+    for name in sorted(document['results']):
+        timing = document['results'][name]
+        line = '{0:<40} {1:>14}'.format(name, _format(timing['seconds']))
+        if baseline is not None and name in baseline['results']:
+            ratio = timing['seconds'] / baseline['results'][name]['seconds']
+            line += '  {0:>6.2f}x baseline'.format(ratio)
+        print(line)
+
+    if args.output:
+        _write(args.output, document)
+    if args.save_baseline:
+        _write(args.baseline or BASELINE, document)
+
+    failures = check_budgets(document)
+    for failure in failures:
+        print('OVER BUDGET {0}'.format(failure))
+    if baseline is None:
+        return 1 if failures else 0
+
+    regressions = compare(document, baseline, args.threshold)
+    for regression in regressions:
+        print('REGRESSION {name}: {ratio:.2f}x baseline'.format(**regression))
+    return 1 if regressions or failures else 0
+
+
+def _time(function, number):
+    '''Private function to return the seconds taken by number calls
+    '''
+    started = timeit.default_timer()
+    for _ in range(number):
+        function()
+    return timeit.default_timer() - started
+
+
+def _import(module):
+    '''Private function to return the seconds that importing a module takes
+    in a fresh interpreter, and whether it imported scipy
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output([sys.executable, '-c',
+                                      _IMPORT.format(module)], cwd=root)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def _examples():
+    '''Private function to return the namespace of a fresh run of
+    examples.py, with the unbuilt example curves
+    '''
+    return runpy.run_path(EXAMPLES)
+
+
+def _measure_swap(curve, repeat):
+    '''Private function to time _swap_value of the longest swap of a built
+    curve, against the pillars before its own, as in the bootstrap
+    '''
+    index = max(i for i, instrument in enumerate(curve.instruments)
+                if hasattr(instrument, '_swap_value'))
+    instrument = curve.instruments[index]
+    full = curve.curve
+    log_df = full['discount_factor'][index + 1]
+    curve.curve = full[:index + 1]
+    try:
+        return measure(lambda: instrument._swap_value(log_df), repeat)
+    finally:
+        curve.curve = full
+
+
+def _ois_curve(pillars):
+    '''Private function to return an unbuilt synthetic OIS curve with a
+    cash instrument and up to pillars - 1 swaps, see SyntheticMarket
+    '''
+    market = synthetic.SyntheticMarket(ois_pillars=pillars - 1, libor_pillars=0)
+    return market.curves(datetime.datetime(2016, 6, 30))['USD_OIS']
+
+
+def _timestamps(curve, size):
+    '''Private function to return whole day timestamps spread over the
+    pillars of a built curve
+    '''
+    if not curve._built:
+        curve.build()
+    days = np.linspace(curve.curve['timestamp'][0], curve.curve['timestamp'][-1],
+                       size) // 86400
+    return days * 86400
+
+
+def _machine():
+    '''Private function to describe the machine and library versions
+    '''
+    return {'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__}
+
+
+def _format(seconds):
+    '''Private function to format seconds per call with a unit
+    '''
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{0:.3f} {1}'.format(seconds / scale, unit)
+    return '{0:.1f} ns'.format(seconds / 1e-9)
+
+
+def _write(path, document):
+    '''Private function to write a results document as JSON
+    '''
+    with open(path, 'w') as handle:
+        json.dump(document, handle, indent=2, sort_keys=True)
+        handle.write('\n')
@@ -1,4 +1,67 @@
-from qbootstrapper.curves import *
-from qbootstrapper.instruments import *
-from qbootstrapper.swapscheduler import *
-__all__ = ['curves', 'instruments', 'swapscheduler']
+'''
+Copyright (c) Kevin Keogh 2016
+
+The public classes and functions of the submodules are available from the
+package, e.g., qbootstrapper.Curve, but each submodule is only imported the
+first time that one of its names is used, so that importing the package is
+cheap for tools that only need part of it, e.g., qbootstrapper.store. SciPy
+is in turn only imported when a curve is solved, see solvers.
+'''
+import importlib
+
+__all__ = ['curves', 'environment', 'instrumentation', 'instruments',
+           'instrumentset', 'interpolation', 'loader', 'portfolio',
+           'scenarios', 'swapscheduler']
+
+_SUBMODULES = set(__all__ + ['backfill', 'cache', 'capture', 'cli', 'export',
+                             'risk', 'service', 'sharedcurves', 'solvers',
+                             'store', 'synthetic'])
+
+_EXPORTS = {
+    'curves': ['Curve', 'LIBORCurve', 'OISCurve', 'SimultaneousStrippedCurve'],
+    'environment': ['MarketEnvironment'],
+    'instrumentation': ['BuildHook', 'BuildReport', 'InstrumentReport',
+                        'add_hook', 'remove_hook'],
+    'instruments': ['AverageIndexBasisSwapInstrument', 'BasisSwapInstrument',
+                    'FRAInstrumentByDates', 'FuturesInstrumentByDates',
+                    'Instrument', 'LIBORInstrument', 'LIBORSwapInstrument',
+                    'OISSwapInstrument', 'SimultaneousInstrument',
+                    'SwapInstrument'],
+    'instrumentset': ['INSTRUMENT_CLASSES', 'InstrumentSet',
+                      'build_scenarios'],
+    'interpolation': ['INTERPOLATIONS', 'Interpolation',
+                      'LinearZeroInterpolation', 'LogLinearInterpolation',
+                      'MonotoneConvexInterpolation',
+                      'NaturalCubicInterpolation', 'PchipInterpolation'],
+    'loader': ['CURVE_TYPES', 'CurveDefinition', 'CurveLoader',
+               'INSTRUMENT_TYPES', 'TENOR_UNITS', 'build_curve_set',
+               'iter_quote_dates', 'load_definitions', 'order_definitions',
+               'parse_tenor', 'read_quotes'],
+    'portfolio': ['LEG_DTYPE', 'PortfolioValuation', 'SwapPortfolio',
+                  'TRADE_DEFAULTS'],
+    'scenarios': ['Butterfly', 'CurveView', 'KeyRateShift', 'ParallelShift',
+                  'SECONDS_PER_YEAR', 'SpreadCurve', 'Twist', 'ZeroShift',
+                  'evaluate_views', 'key_rate_shifts'],
+    'swapscheduler': ['Schedule', 'ScheduleTable'],
+}
+
+_NAMES = dict((name, module) for module, names in _EXPORTS.items()
+              for name in names)
+
+
+def __getattr__(name):
+    '''Imports the submodule of a name on first use
+    '''
+    if name in _SUBMODULES:
+        return importlib.import_module('qbootstrapper.' + name)
+    if name not in _NAMES:
+        raise AttributeError('module "qbootstrapper" has no attribute '
+                             '"{name}"'.format(**locals()))
+    value = getattr(importlib.import_module('qbootstrapper.' + _NAMES[name]),
+                    name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES | set(_NAMES))
@@ -0,0 +1,5 @@
+import sys
+
+from qbootstrapper.cli import main
+
+sys.exit(main())
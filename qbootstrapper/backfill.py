@@ -0,0 +1,330 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the BackfillRunner object that rebuilds the curve history for a
+set of curve definitions and quote files, sharding the as-of dates across a
+pool of worker processes.
+
+The built curves are written in chunks of as-of dates to a CurveStore in
+the output directory, see the store module for the layout of the chunks.
+
+Finished as-of dates are appended to a checkpoint file after their chunk has
+been written, so that an interrupted backfill resumes from the last chunk.
+Each chunk number is reserved in the checkpoint file before the chunk is
+written, so that a chunk that was interrupted part way through is removed
+from the store (with its failures) when the backfill resumes, rather than
+written again under a new chunk number.
+'''
+# python libraries
+from __future__ import division
+import collections
+import json
+import multiprocessing
+import os
+import time
+
+# qlib libraries
+import qbootstrapper.loader as loader
+from qbootstrapper.store import CurveStore
+
+
+CHECKPOINT = 'checkpoint.txt'
+FAILURES = 'failures.jsonl'
+_RESERVED = 'chunk '
+
+
+class BackfillRunner(object):
+    '''Parallel historical curve backfill
+
+    Arguments:
+        definitions (list)      : List of CurveDefinition objects
+        paths (list)            : List of quote files, see CurveLoader
+        output (str)            : Output directory
+
+        kwargs
+        ------
+        processes (int)         : Number of worker processes, 1 builds the
+                                  curves in this process
+                                  [default: multiprocessing.cpu_count()]
+        chunk_size (int)        : Number of as-of dates in each output chunk
+                                  [default: 250]
+        start (datetime)        : First as-of date to build
+                                  [default: None]
+        end (datetime)          : Last as-of date to build
+                                  [default: None]
+        dtype (str)             : Type of the stored log discount factors,
+                                  see CurveStore
+                                  [default: float64]
+    '''
+    def __init__(self, definitions, paths, output, processes=None,
+                 chunk_size=250, start=None, end=None, dtype='float64'):
+        self.definitions = loader.order_definitions(definitions)
+        self.paths = list(paths)
+        self.output = output
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.start = start
+        self.end = end
+        self.dtype = dtype
+
+    def run(self, progress=None):
+        '''Runs the backfill, skipping any dates in the checkpoint file, and
+        returns a BackfillReport
+
+        Arguments:
+            progress (function) : Optional callback that is called with the
+                                  BackfillReport after each chunk is written
+        '''
+        store = CurveStore(self.output, dtype=self.dtype)
+        _recover(store)
+        finished = read_checkpoint(self.output)
+        dates = loader.CurveLoader(self.definitions, self.paths,
+                                   start=self.start, end=self.end).dates()
+        report = BackfillReport()
+
+        def pending():
+            for as_of, rows in dates:
+                if as_of in finished:
+                    report.skipped += 1
+                else:
+                    yield as_of, rows
+
+        interpolations = dict((definition.name, definition.interpolation)
+                              for definition in self.definitions)
+        writer = _ChunkWriter(store, self.chunk_size, interpolations)
+        for as_of, pillars, failures, _ in build_dates(self.definitions,
+                                                       pending(),
+                                                       self.processes):
+            report.dates += 1
+            report.curves += len(pillars)
+            report.failures += len(failures)
+            if writer.add(as_of, pillars, failures):
+                report.elapsed = time.time() - report.started
+                if progress is not None:
+                    progress(report)
+        written = writer.flush()
+        report.elapsed = time.time() - report.started
+        if written and progress is not None:
+            progress(report)
+        return report
+
+
+class BackfillReport(object):
+    '''Progress and throughput of a backfill
+
+    Attributes:
+        dates (int)         : As-of dates built in this run
+        curves (int)        : Curves built in this run
+        failures (int)      : Curves that failed to build in this run
+        skipped (int)       : As-of dates of the quote files, between start
+                              and end, skipped as they are in the
+                              checkpoint
+        elapsed (float)     : Seconds since the start of the run
+    '''
+    def __init__(self, skipped=0):
+        self.dates = 0
+        self.curves = 0
+        self.failures = 0
+        self.skipped = skipped
+        self.started = time.time()
+        self.elapsed = 0.0
+
+    def curves_per_second(self):
+        '''Returns the throughput of the run in curves per second
+        '''
+        if self.elapsed <= 0:
+            return 0.0
+        return self.curves / self.elapsed
+
+    def __str__(self):
+        return ('{dates} dates, {curves} curves, {failures} failures, '
+                '{skipped} skipped in {elapsed:.1f}s '
+                '({rate:.2f} curves/sec)').format(rate=self.curves_per_second(),
+                                                  **self.__dict__)
+
+
+class _ChunkWriter(object):
+    '''Private helper that buffers built curves and writes them in chunks,
+    appending the dates of each written chunk to the checkpoint file
+    '''
+    def __init__(self, store, chunk_size, interpolations):
+        self.store = store
+        self.interpolations = interpolations
+        self.output = store.root
+        self.chunk_size = chunk_size
+        self.chunk = store.next_chunk()
+        self._dates = []
+        self._curves = collections.defaultdict(list)
+        self._failures = []
+
+    def add(self, as_of, pillars, failures):
+        '''Adds the built curves for a date, returning True if a chunk was
+        written
+        '''
+        self._dates.append(as_of)
+        for name, (maturities, log_dfs) in pillars.items():
+            self._curves[name].append((as_of, maturities, log_dfs))
+        for name, error in failures.items():
+            self._failures.append({'date': as_of.strftime('%Y-%m-%d'),
+                                   'curve': name,
+                                   'error': error})
+        if len(self._dates) >= self.chunk_size:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        '''Reserves the chunk number in the checkpoint, writes the buffered
+        curves as a chunk, then checkpoints the dates. Returns True if a
+        chunk was written
+        '''
+        if not self._dates:
+            return False
+        failures_path = os.path.join(self.output, FAILURES)
+        failures_size = 0
+        if os.path.exists(failures_path):
+            failures_size = os.path.getsize(failures_path)
+        with open(os.path.join(self.output, CHECKPOINT), 'a') as checkpoint:
+            checkpoint.write('{0}{1} {2}\n'.format(_RESERVED, self.chunk,
+                                                   failures_size))
+
+        for name, entries in self._curves.items():
+            self.store.append(name, entries, chunk=self.chunk,
+                              interpolation=self.interpolations[name])
+
+        if self._failures:
+            with open(failures_path, 'a') as failures:
+                for failure in self._failures:
+                    failures.write(json.dumps(failure) + '\n')
+
+        with open(os.path.join(self.output, CHECKPOINT), 'a') as checkpoint:
+            checkpoint.write(''.join(as_of.strftime('%Y-%m-%d') + '\n'
+                                     for as_of in self._dates))
+
+        self.chunk += 1
+        self._dates = []
+        self._curves = collections.defaultdict(list)
+        self._failures = []
+        return True
+
+
+def build_dates(definitions, tasks, processes=1):
+    '''Generator of the built curves for each (as_of, quote rows) task, in
+    task order, as tuples of
+
+        (as_of, pillars, failures, reports)
+
+    where pillars is a dict of curve name to (pillar dates, log discount
+    factors), failures a dict of curve name to error message and reports a
+    dict of curve name to a dict of the build time, pillar count and
+    _swap_value evaluations of the curve, see BuildReport.
+
+    The tasks are built across a pool of processes worker processes, or in
+    this process if processes is 1. Only a bounded number of tasks are in
+    flight at a time, so the quote files are streamed rather than read up
+    front.
+    '''
+    if processes == 1:
+        _init_worker(definitions)
+        for task in tasks:
+            yield _build_date(task)
+        return
+
+    pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                initargs=(definitions,))
+    try:
+        in_flight = collections.deque()
+        for task in tasks:
+            in_flight.append(pool.apply_async(_build_date, (task,)))
+            if len(in_flight) >= 4 * processes:
+                yield in_flight.popleft().get()
+        while in_flight:
+            yield in_flight.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def read_checkpoint(output):
+    '''Returns the set of finished as-of dates (as datetimes) from the
+    checkpoint file of an output directory
+    '''
+    path = os.path.join(output, CHECKPOINT)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as checkpoint:
+        return set(loader._date(line.strip()) for line in checkpoint
+                   if line.strip() and not line.startswith(_RESERVED))
+
+
+def _recover(store):
+    '''Private function to remove the chunk (and its failures) of an
+    interrupted backfill, i.e., a chunk that was reserved in the checkpoint
+    file without any of its dates being checkpointed
+    '''
+    path = os.path.join(store.root, CHECKPOINT)
+    if not os.path.exists(path):
+        return
+    with open(path) as checkpoint:
+        lines = checkpoint.readlines()
+    if not lines or not lines[-1].startswith(_RESERVED):
+        return
+
+    chunk, failures_size = lines[-1][len(_RESERVED):].split()
+    store.remove_chunk(int(chunk))
+    failures_path = os.path.join(store.root, FAILURES)
+    if os.path.exists(failures_path):
+        with open(failures_path, 'r+') as failures:
+            failures.truncate(int(failures_size))
+    with open(path, 'w') as checkpoint:
+        checkpoint.writelines(lines[:-1])
+
+
+_definitions = None
+
+
+def _init_worker(definitions):
+    '''Private function to hold the curve definitions in each worker
+    process, so they are only sent to each worker once. scipy.optimize is
+    imported here, rather than in the first solve, so that its import time
+    is not part of the build time of the first curve of each worker
+    '''
+    global _definitions
+    _definitions = definitions
+    import scipy.optimize
+
+
+def _build_date(task):
+    '''Private function to build every curve for a single as-of date.
+    Returns the as-of date, a dict of curve name to (pillar dates, log
+    discount factors), a dict of curve name to error message for the
+    curves that failed to build, and a dict of curve name to the summary of
+    its build report, see build_dates.
+    '''
+    as_of, rows = task
+    pillars, failures, reports = {}, {}, {}
+    curve_set = loader.build_curve_set(_definitions, as_of, rows,
+                                       columnar=True, failures=failures)
+    for definition in _definitions:
+        if definition.name not in curve_set:
+            continue
+        if definition.discount_curve in failures:
+            failures[definition.name] = ('Discount curve "{0}" failed to '
+                                         'build'.format(definition.discount_curve))
+            continue
+        curve = curve_set[definition.name]
+        try:
+            curve.build()
+        except Exception as error:
+            failures[definition.name] = '{0}: {1}'.format(type(error).__name__,
+                                                          error)
+            continue
+        pillars[definition.name] = (curve.curve['maturity'].copy(),
+                                    curve.curve['discount_factor'].copy())
+        report = curve.build_report
+        reports[definition.name] = {'elapsed': report.elapsed,
+                                    'pillars': len(report.instruments),
+                                    'evaluations': report.evaluations()}
+    return as_of, pillars, failures, reports
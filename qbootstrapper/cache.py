@@ -0,0 +1,195 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the BuildCache object, a content-addressed on-disk cache of
+built curves.
+
+The key of a curve is the SHA-256 hash of its full build input, as captured
+by qbootstrapper.capture: the curve type and settings, and the instrument
+types, arguments (dates and conventions) and quotes, of the curve and of
+every curve it links to, so the key of a curve changes with the inputs of
+its discount curve. Each entry is an .npz file of the pillar arrays, named
+by the key, so identical builds in different processes share entries.
+
+A curve with a cache (see Curve) loads its pillars from the cache when the
+key is found, rather than solving them, and stores them after solving them
+otherwise. Entries are evicted, least recently used first, when the cache
+grows beyond max_bytes.
+'''
+# python libraries
+from __future__ import division
+import hashlib
+import importlib.metadata
+import json
+import numpy as np
+import os
+import tempfile
+
+# qlib libraries
+from qbootstrapper.capture import _inputs
+
+# Change when the pillars built from the same inputs change, so that older
+# entries are no longer found. The numpy and scipy versions are also part of
+# the key, the scipy version is read from the package metadata so that a
+# cache hit does not import scipy
+CACHE_VERSION = 1
+
+_SCIPY_VERSION = None
+
+
+def _scipy_version():
+    '''Private function to return the version of the installed scipy,
+    without importing it unless it has no package metadata
+    '''
+    global _SCIPY_VERSION
+    if _SCIPY_VERSION is None:
+        try:
+            _SCIPY_VERSION = importlib.metadata.version('scipy')
+        except importlib.metadata.PackageNotFoundError:
+            import scipy
+            _SCIPY_VERSION = scipy.__version__
+    return _SCIPY_VERSION
+
+
+class BuildCache(object):
+    '''Content-addressed on-disk cache of the pillars of built curves
+
+    Arguments:
+        directory (str)         : Directory of the cache, created if needed
+
+        kwargs
+        ------
+        max_bytes (int)         : Size of the entries above which the least
+                                  recently used are evicted, or None for no
+                                  limit
+                                  [default: None]
+
+    Attributes:
+        hits (int)              : Number of entries loaded
+        misses (int)            : Number of lookups that found no entry
+    '''
+    def __init__(self, directory, max_bytes=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, curve):
+        '''Returns the key of the current build input of a curve
+        '''
+        root, specs = _inputs(curve)
+        document = {'version': CACHE_VERSION,
+                    'numpy': np.__version__,
+                    'scipy': _scipy_version(),
+                    'root': root,
+                    'curves': specs}
+        encoded = json.dumps(document, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def get(self, curve):
+        '''Returns the cached pillar arrays of a curve, as a dict keyed by
+        the attribute of the curve that each array is held in, or None
+        '''
+        path = self._path(self.key(curve))
+        try:
+            with np.load(path) as entry:
+                arrays = dict((name, entry[name]) for name in entry.files)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        _touch(path)
+        self.hits += 1
+        return arrays
+
+    def put(self, curve, arrays):
+        '''Stores the pillar arrays of a built curve, see get
+        '''
+        path = self._path(self.key(curve))
+        folder = os.path.dirname(path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        # written to a temporary file first, so that readers in other
+        # processes never see a partial entry
+        handle, temporary = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as stream:
+            np.savez(stream, **arrays)
+        os.rename(temporary, path)
+        if self.max_bytes is not None:
+            self.evict(self.max_bytes)
+
+    def invalidate(self, curve):
+        '''Removes the entry of the current build input of a curve, returns
+        whether there was one
+        '''
+        path = self._path(self.key(curve))
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
+
+    def clear(self):
+        '''Removes every entry
+        '''
+        for path, _, _ in self._entries():
+            os.remove(path)
+
+    def size(self):
+        '''Returns the total size of the entries, in bytes
+        '''
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes):
+        '''Removes the least recently used entries until the entries take at
+        most max_bytes, returns the number of entries removed
+        '''
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def _path(self, key):
+        '''Private method to return the path of the entry of a key
+        '''
+        return os.path.join(self.directory, key[:2], key + '.npz')
+
+    def _entries(self):
+        '''Private method to return a list of (path, size, last use) of the
+        entries
+        '''
+        entries = []
+        for folder in os.listdir(self.directory):
+            folder = os.path.join(self.directory, folder)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith('.npz'):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+
+def _touch(path):
+    '''Private function to mark an entry as used, for the eviction
+    '''
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
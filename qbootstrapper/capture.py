@@ -0,0 +1,450 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the capture and replay of curve builds.
+
+capture returns a self-contained, JSON-compatible record of everything that
+a build of a curve depends on: the type and settings of the curve and of
+every curve that it links to (discount, projection curves), and for each
+instrument its type, the arguments it was created with (dates and
+conventions) and its current quote. Curves and instruments in the arguments
+are recorded as links, so the whole graph is rebuilt by restore. When the
+curve is built, the pillars and the build report are captured with it.
+
+replay rebuilds a captured curve under cProfile, and compare checks the
+rebuilt pillars against the captured ones, so that a production build can be
+investigated offline:
+
+    python -m qbootstrapper.capture build.json [--sort tottime]
+
+The CaptureHook captures the slow and the failed builds automatically.
+'''
+# python libraries
+from __future__ import division
+import argparse
+import cProfile
+import datetime
+import json
+import numpy as np
+import os
+import platform
+import pstats
+import sys
+
+# qlib libraries
+import qbootstrapper.curves as curves
+import qbootstrapper.instrumentation as instrumentation
+import qbootstrapper.instruments as instruments
+from qbootstrapper.solvers import SolverPolicy
+
+FORMAT = 'qbootstrapper-capture'
+VERSION = 1
+
+_LINKS = ['discount_curve', 'projection_curve', 'projection_discount_curve']
+
+
+def capture(curve):
+    '''Returns the JSON-compatible capture of the build inputs of a curve,
+    and of its pillars and build report if it is built
+
+    The cache and grid_path of the curves are left out on purpose: a replay
+    solves the pillars again, rather than loading them from the cache, and
+    does not overwrite the grid file of the captured curve.
+    '''
+    # imported here rather than with the module, see qbootstrapper.solvers
+    import scipy
+
+    root, specs = _inputs(curve)
+    document = {'format': FORMAT,
+                'version': VERSION,
+                'captured_at': datetime.datetime.now().isoformat(),
+                'environment': {'python': platform.python_version(),
+                                'numpy': np.__version__,
+                                'scipy': scipy.__version__,
+                                'platform': platform.platform()},
+                'root': root,
+                'curves': specs,
+                'pillars': None,
+                'build_report': None}
+    if curve._built:
+        document['pillars'] = dict((name, _pillars(item))
+                                   for name, item in _built_curves(root, curve))
+    if getattr(curve, 'build_report', None) is not None:
+        document['build_report'] = curve.build_report.to_dict()
+    return document
+
+
+def restore(document):
+    '''Returns the unbuilt curve of a capture, with all of the curves that
+    it links to
+    '''
+    if document.get('format') != FORMAT:
+        raise Exception('Not a {0} document'.format(FORMAT))
+    if document['version'] > VERSION:
+        raise Exception('Capture version "{version}" is newer than '
+                        'this version of qbootstrapper'.format(**document))
+
+    decoder = _Decoder(document['curves'])
+    for spec in document['curves']:
+        decoder.create(spec)
+    for spec in document['curves']:
+        decoder.add_instruments(spec['name'])
+    return decoder.curves[document['root']]
+
+
+def replay(document, profile=True):
+    '''Rebuilds the curve of a capture, under cProfile unless profile is
+    False. Returns a tuple of the built curve and the pstats.Stats of the
+    build, or None
+    '''
+    curve = restore(document)
+    if not profile:
+        curve.build()
+        return curve, None
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        curve.build()
+    finally:
+        profiler.disable()
+    return curve, pstats.Stats(profiler)
+
+
+def compare(curve, document):
+    '''Returns the largest absolute difference of the log discount factors
+    of the pillars of a built curve from the captured pillars, for each of
+    the curves built with it, as a dict keyed by curve name
+    '''
+    if document['pillars'] is None:
+        raise Exception('The captured curve was not built')
+
+    differences = {}
+    for name, item in _built_curves(document['root'], curve):
+        captured = document['pillars'][name]
+        pillars = _pillars(item)
+        if pillars['maturity'] != captured['maturity']:
+            differences[name] = float('inf')
+            continue
+        differences[name] = float(np.abs(np.array(pillars['log_df']) -
+                                         np.array(captured['log_df'])).max())
+    return differences
+
+
+def write_capture(curve, path):
+    '''Writes the capture of a curve to a JSON file
+    '''
+    with open(path, 'w') as handle:
+        json.dump(capture(curve), handle, indent=1)
+
+
+def read_capture(path):
+    '''Reads a capture from a JSON file
+    '''
+    with open(path) as handle:
+        return json.load(handle)
+
+
+class CaptureHook(instrumentation.BuildHook):
+    '''Build hook that writes the capture of the builds that fail, or that
+    take longer than a threshold, to a directory
+
+    Arguments:
+        directory (str)         : Directory that the captures are written to
+
+        kwargs
+        ------
+        slower_than (float)     : Seconds above which a build is captured, or
+                                  None to capture only failed builds
+                                  [default: None]
+
+    Attributes:
+        paths (list)            : Paths of the captures written
+    '''
+    def __init__(self, directory, slower_than=None):
+        self.directory = directory
+        self.slower_than = slower_than
+        self.paths = []
+
+    def build_finished(self, curve, report):
+        '''Writes the capture of the build if it failed or was slow
+        '''
+        slow = self.slower_than is not None and report.elapsed > self.slower_than
+        if report.error is None and not slow:
+            return
+        name = '{0}-{1:.6f}.json'.format(report.curve_type, report.started)
+        path = os.path.join(self.directory, name)
+        write_capture(curve, path)
+        self.paths.append(path)
+
+
+def main(argv=None):
+    '''Command line entry point, replays a capture file
+    '''
+    parser = argparse.ArgumentParser(prog='python -m qbootstrapper.capture',
+                                     description='Replay a captured curve build')
+    parser.add_argument('path', help='capture JSON file')
+    parser.add_argument('--no-profile', action='store_true',
+                        help='build without cProfile')
+    parser.add_argument('--sort', default='cumulative',
+                        help='pstats sort key [default: %(default)s]')
+    parser.add_argument('--limit', type=int, default=30,
+                        help='profile lines to print [default: %(default)s]')
+    parser.add_argument('--output', help='path to write the pstats file to')
+    args = parser.parse_args(argv)
+
+    document = read_capture(args.path)
+    curve, stats = replay(document, profile=not args.no_profile)
+    print(curve.build_report)
+    if document['build_report'] is not None:
+        print('captured build: {0:.6f}s'.format(document['build_report']['elapsed']))
+    if document['pillars'] is not None:
+        for name, difference in sorted(compare(curve, document).items()):
+            print('{0}: largest log discount factor difference '
+                  '{1:.3e}'.format(name, difference))
+    if stats is not None:
+        stats.sort_stats(args.sort).print_stats(args.limit)
+        if args.output:
+            stats.dump_stats(args.output)
+    return 0
+
+
+class _Encoder(object):
+    '''Private class that encodes curves, and the instruments and values in
+    their arguments, giving each curve a name
+    '''
+    def __init__(self):
+        self.curves = []
+        self.names = {}
+
+    def curve_name(self, curve):
+        '''Returns the name of a curve, registering it, after the curves it
+        links to, if it is new
+        '''
+        if id(curve) not in self.names:
+            for link in _LINKS:
+                linked = getattr(curve, link, False)
+                if isinstance(linked, curves.Curve):
+                    self.curve_name(linked)
+            self.names[id(curve)] = 'curve{0}'.format(len(self.curves))
+            self.curves.append(curve)
+        return self.names[id(curve)]
+
+    def curve_spec(self, curve):
+        '''Returns the record of a registered curve and its instruments
+        '''
+        links = {}
+        for link in _LINKS:
+            linked = getattr(curve, link, False)
+            if isinstance(linked, curves.Curve):
+                links[link] = self.curve_name(linked)
+
+        if isinstance(curve, curves.SimultaneousStrippedCurve):
+            effective = _effective(curve.discount_curve)
+            settings = {'allow_extrapolation': curve.allow_extrapolation}
+        else:
+            # the instruments of an InstrumentSet are only created by the
+            # build, and are captured as instrument objects
+            curve._create_instruments()
+            effective = _effective(curve)
+            settings = {'allow_extrapolation': curve.allow_extrapolation,
+                        'interpolation': curve.interpolation,
+                        'daily_grid': curve.daily_grid,
+                        'solver': dict(vars(curve.solver))}
+
+        return {'name': self.names[id(curve)],
+                'type': type(curve).__name__,
+                'effective_date': self.value(datetime.datetime.fromtimestamp(effective)),
+                'settings': settings,
+                'links': links,
+                'instruments': [self.instrument(instrument)
+                                for instrument in curve.instruments]}
+
+    def instrument(self, instrument):
+        '''Returns the record of an instrument. The curve argument is
+        recorded as the curve that the instrument currently values on,
+        which the curves can change when the instrument is added.
+        '''
+        args, kwargs = instrument._arguments
+        current = getattr(instrument, 'curve', None)
+        if isinstance(current, curves.Curve):
+            args = [current if isinstance(value, curves.Curve) else value
+                    for value in args]
+            kwargs = dict((key, current if isinstance(value, curves.Curve) else value)
+                          for key, value in kwargs.items())
+        return {'type': type(instrument).__name__,
+                'args': [self.value(value) for value in args],
+                'kwargs': dict((key, self.value(value))
+                               for key, value in kwargs.items()),
+                'quote': self.value(instrument.get_quote())}
+
+    def value(self, value):
+        '''Returns the JSON-compatible encoding of an argument value
+        '''
+        if value is None or isinstance(value, (bool, str)):
+            return value
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            return value.item() if isinstance(value, np.generic) else value
+        if isinstance(value, datetime.datetime):
+            return {'datetime': value.isoformat()}
+        if isinstance(value, datetime.date):
+            return {'date': value.isoformat()}
+        if isinstance(value, np.datetime64):
+            return {'datetime64': str(value)}
+        if isinstance(value, curves.Curve):
+            return {'curve': self.curve_name(value)}
+        if isinstance(value, instruments.Instrument):
+            return {'instrument': self.instrument(value)}
+        if isinstance(value, (list, tuple)):
+            return {'list': [self.value(item) for item in value]}
+        if isinstance(value, dict):
+            return {'dict': dict((key, self.value(item))
+                                 for key, item in value.items())}
+        if isinstance(value, np.ndarray):
+            return {'array': [self.value(item) for item in value.tolist()],
+                    'dtype': value.dtype.str}
+        raise TypeError('Cannot capture an argument of type '
+                        '"{0}"'.format(type(value).__name__))
+
+
+class _Decoder(object):
+    '''Private class that recreates the curves and instruments of a capture
+    '''
+    def __init__(self, specs):
+        self.specs = dict((spec['name'], spec) for spec in specs)
+        self.curves = {}
+        self._populated = set()
+
+    def create(self, spec):
+        '''Creates the curve of a record, without its instruments
+        '''
+        links = dict((link, self.link(name))
+                     for link, name in spec['links'].items())
+        settings = dict(spec['settings'])
+        effective = self.value(spec['effective_date'])
+
+        if spec['type'] == 'SimultaneousStrippedCurve':
+            # the sub-curves are deep copied, so they must be complete
+            for link in _LINKS:
+                if link in spec['links']:
+                    self.add_instruments(spec['links'][link])
+            curve = curves.SimultaneousStrippedCurve(effective,
+                                                     links['discount_curve'],
+                                                     links['projection_curve'],
+                                                     links.get('projection_discount_curve', False),
+                                                     **settings)
+        else:
+            settings['solver'] = SolverPolicy(**settings['solver'])
+            cls = _class(curves, spec['type'], curves.Curve)
+            curve = cls(effective, discount_curve=links.get('discount_curve', False),
+                        **settings)
+        self.curves[spec['name']] = curve
+
+    def add_instruments(self, name):
+        '''Creates and adds the instruments of a curve, once
+        '''
+        if name in self._populated:
+            return
+        self._populated.add(name)
+        curve = self.link(name)
+        for spec in self.specs[name]['instruments']:
+            curve.add_instrument(self.instrument(spec))
+
+    def instrument(self, spec):
+        '''Creates an instrument from its record, with its quote
+        '''
+        instrument = _class(instruments, spec['type'], instruments.Instrument)
+        instrument = instrument(*[self.value(value) for value in spec['args']],
+                                **dict((key, self.value(value))
+                                       for key, value in spec['kwargs'].items()))
+        instrument.set_quote(self.value(spec['quote']))
+        return instrument
+
+    def link(self, name):
+        '''Returns a created curve by name
+        '''
+        if name not in self.curves:
+            raise Exception('Curve "{name}" is linked before it is '
+                            'created'.format(**locals()))
+        return self.curves[name]
+
+    def value(self, value):
+        '''Returns the argument value of a JSON-compatible encoding
+        '''
+        if not isinstance(value, dict):
+            return value
+        if 'array' in value:
+            return np.array([self.value(item) for item in value['array']],
+                            dtype=value['dtype'])
+        (tag, encoded), = value.items()
+        if tag == 'datetime':
+            return datetime.datetime.strptime(encoded.replace('T', ' '),
+                                              '%Y-%m-%d %H:%M:%S' if '.' not in encoded
+                                              else '%Y-%m-%d %H:%M:%S.%f')
+        if tag == 'date':
+            return datetime.datetime.strptime(encoded, '%Y-%m-%d').date()
+        if tag == 'datetime64':
+            return np.datetime64(encoded)
+        if tag == 'curve':
+            return self.link(encoded)
+        if tag == 'instrument':
+            return self.instrument(encoded)
+        if tag == 'list':
+            return [self.value(item) for item in encoded]
+        if tag == 'dict':
+            return dict((key, self.value(item)) for key, item in encoded.items())
+        raise TypeError('Capture value "{tag}" not recognized'.format(**locals()))
+
+
+def _inputs(curve):
+    '''Private function to return the name of a curve and the records of it
+    and of the curves it links to, in the order that they are created
+    '''
+    encoder = _Encoder()
+    root = encoder.curve_name(curve)
+    specs = []
+    while len(specs) < len(encoder.curves):
+        specs.append(encoder.curve_spec(encoder.curves[len(specs)]))
+    return root, specs
+
+
+def _class(module, name, base):
+    '''Private function to return a class of a module by name, checking that
+    it is a sub-class of base
+    '''
+    cls = getattr(module, name, None)
+    if not isinstance(cls, type) or not issubclass(cls, base):
+        raise TypeError('{0} "{name}" not recognized'.format(base.__name__,
+                                                              **locals()))
+    return cls
+
+
+def _effective(curve):
+    '''Private function to return the effective timestamp of a curve, whose
+    pillars are a single record while it starts building
+    '''
+    return float(np.atleast_1d(curve.curve)[0]['timestamp'])
+
+
+def _built_curves(root, curve):
+    '''Private function to return the (name, curve) pairs of the curves that
+    hold the pillars of a build
+    '''
+    if isinstance(curve, curves.SimultaneousStrippedCurve):
+        return [(root + '.discount_curve', curve.discount_curve),
+                (root + '.projection_curve', curve.projection_curve)]
+    return [(root, curve)]
+
+
+def _pillars(curve):
+    '''Private function to return the pillars of a built curve as a dict of
+    lists
+    '''
+    return {'maturity': [str(date) for date in curve.curve['maturity']],
+            'log_df': curve.curve['discount_factor'].tolist()}
+
+
+if __name__ == '__main__':
+    sys.exit(main())
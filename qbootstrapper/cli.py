@@ -0,0 +1,209 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the qbootstrapper command line, installed as the qbootstrapper
+console command and also run by python -m qbootstrapper.
+
+    qbootstrapper build --definitions curves.json --quotes quotes.csv
+                        [--curves EONIA USDLIBOR] [--start 2016-01-04]
+                        [--end 2016-12-30] [--workers 4]
+                        [--output pillars.npz]
+
+builds the curves of a definitions file (see CurveDefinition) for every
+as-of date in the quote files (see CurveLoader), across a pool of worker
+processes, streams the pillars, discount factors, zero and forward rates of
+every curve to a columnar .npz, .csv or .parquet file (see
+qbootstrapper.export), and prints the build timing of each curve. The exit
+status is 1 if any curve failed to build, and 2 if a curve of --curves is
+not in the definitions.
+
+    qbootstrapper replay build.json
+
+replays a captured build under cProfile, see qbootstrapper.capture.
+'''
+# python libraries
+from __future__ import division, print_function
+import argparse
+import collections
+import sys
+import time
+
+# qlib libraries
+import qbootstrapper.backfill as backfill
+import qbootstrapper.export as export
+import qbootstrapper.loader as loader
+
+
+def main(argv=None):
+    '''Command line entry point, returns the exit status
+    '''
+    parser = argparse.ArgumentParser(prog='qbootstrapper',
+                                     description='Interest rate curve '
+                                                 'bootstrapping')
+    commands = parser.add_subparsers(dest='command')
+
+    build = commands.add_parser('build', help='build curves from definitions '
+                                              'and quote files')
+    build.add_argument('--definitions', required=True,
+                       help='JSON file of curve definitions')
+    build.add_argument('--quotes', required=True, nargs='+',
+                       help='quote files (.csv or .jsonl), each sorted by date')
+    build.add_argument('--curves', nargs='+',
+                       help='curves to build, with their discount curves '
+                            '[default: all]')
+    build.add_argument('--start', help='first as-of date (YYYY-MM-DD)')
+    build.add_argument('--end', help='last as-of date (YYYY-MM-DD)')
+    build.add_argument('--workers', type=int, default=1,
+                       help='worker processes [default: %(default)s]')
+    build.add_argument('--solver', choices=['default', 'fast'],
+                       help='solver policy of every curve, overriding the '
+                            'definitions')
+    build.add_argument('--output', help='.npz, .csv or .parquet file of the '
+                                        'pillars')
+    build.add_argument('--verbose', action='store_true',
+                       help='print the build timing of every curve and date')
+
+    replay = commands.add_parser('replay', help='replay a captured build '
+                                                'under cProfile')
+    replay.add_argument('arguments', nargs=argparse.REMAINDER,
+                        help='arguments of python -m qbootstrapper.capture')
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        return build_command(args)
+    if args.command == 'replay':
+        import qbootstrapper.capture as capture
+        return capture.main(args.arguments)
+    parser.print_help()
+    return 2
+
+
+def build_command(args):
+    '''Runs the build command of parsed arguments, returns the exit status
+    '''
+    try:
+        definitions = select_definitions(loader.load_definitions(args.definitions),
+                                         args.curves)
+    except KeyError as error:
+        print('qbootstrapper: curve "{0}" not in the '
+              'definitions'.format(error.args[0]), file=sys.stderr)
+        return 2
+    if args.solver is not None:
+        for definition in definitions:
+            definition.solver = args.solver
+    output = None
+    if args.output is not None:
+        output = export.writer(args.output, export.CURVE_COLUMNS)
+
+    dates = loader.CurveLoader(definitions, args.quotes,
+                               start=loader._date(args.start),
+                               end=loader._date(args.end)).dates()
+    timings = collections.OrderedDict((definition.name, BuildTiming())
+                                      for definition in definitions)
+    started = time.time()
+    try:
+        failed = _build_dates(args, definitions, dates, timings, output)
+    except BaseException:
+        if output is not None:
+            output.abort()
+        raise
+    if output is not None:
+        output.close()
+    print_timings(timings, time.time() - started, args.workers)
+    return 1 if failed else 0
+
+
+def _build_dates(args, definitions, dates, timings, output):
+    '''Private function to build the curves of each date, adding to the
+    timings and writing the pillars to output (a ColumnWriter or None),
+    returns the number of failed builds
+    '''
+    failed = 0
+    for as_of, pillars, failures, reports in backfill.build_dates(definitions,
+                                                                  dates,
+                                                                  args.workers):
+        date = as_of.strftime('%Y-%m-%d')
+        for name, report in reports.items():
+            timings[name].add(report)
+            if args.verbose:
+                print('{0} {1:<20} {2:>4} pillars {3:>6} evaluations '
+                      '{4:>10.2f} ms'.format(date, name, report['pillars'],
+                                             report['evaluations'],
+                                             report['elapsed'] * 1000))
+        for name, error in failures.items():
+            timings[name].failures += 1
+            failed += 1
+            print('{0} {1} failed: {2}'.format(date, name, error),
+                  file=sys.stderr)
+        if output is None:
+            continue
+        for name in sorted(pillars):
+            maturities, log_dfs = pillars[name]
+            output.append(export.pillar_columns(name, maturities, log_dfs,
+                                                as_of=as_of))
+    return failed
+
+
+class BuildTiming(object):
+    '''Build timing of a curve over the as-of dates of a run
+
+    Attributes:
+        builds (int)            : Number of successful builds
+        failures (int)          : Number of failed builds
+        elapsed (float)         : Total seconds of the builds
+        slowest (float)         : Seconds of the slowest build
+        evaluations (int)       : Total _swap_value evaluations
+    '''
+    def __init__(self):
+        self.builds = 0
+        self.failures = 0
+        self.elapsed = 0.0
+        self.slowest = 0.0
+        self.evaluations = 0
+
+    def add(self, report):
+        '''Adds the summary of a build report, see backfill.build_dates
+        '''
+        self.builds += 1
+        self.elapsed += report['elapsed']
+        self.slowest = max(self.slowest, report['elapsed'])
+        self.evaluations += report['evaluations']
+
+
+def select_definitions(definitions, names=None):
+    '''Returns the definitions of the named curves, and of the curves they
+    are discounted on, in build order, or every definition if names is None.
+    Raises a KeyError of the name of a curve that is not in the definitions.
+    '''
+    definitions = loader.order_definitions(definitions)
+    if names is None:
+        return definitions
+    by_name = dict((definition.name, definition) for definition in definitions)
+    selected = set()
+    for name in names:
+        while name is not None and name not in selected:
+            if name not in by_name:
+                raise KeyError(name)
+            selected.add(name)
+            name = by_name[name].discount_curve
+    return [definition for definition in definitions
+            if definition.name in selected]
+
+
+def print_timings(timings, elapsed, workers):
+    '''Prints the build timing of each curve, and the wall time of the run
+    '''
+    print('{0:<20} {1:>7} {2:>7} {3:>11} {4:>11} {5:>12}'.format(
+        'curve', 'builds', 'failed', 'mean (ms)', 'max (ms)', 'evaluations'))
+    builds = 0
+    for name, timing in timings.items():
+        builds += timing.builds
+        mean = timing.elapsed / timing.builds if timing.builds else 0.0
+        print('{0:<20} {1:>7} {2:>7} {3:>11.2f} {4:>11.2f} {5:>12}'.format(
+            name, timing.builds, timing.failures, mean * 1000,
+            timing.slowest * 1000, timing.evaluations))
+    print('{0} curves in {1:.2f}s with {2} '
+          'worker(s)'.format(builds, elapsed, workers))
+
@@ -15,11 +15,14 @@ import copy
 import datetime
 import numpy as np
 import operator
-import scipy.interpolate
 import time
 
 # qlib libraries
+import qbootstrapper.instrumentation as instrumentation
 import qbootstrapper.instruments as instruments
+from qbootstrapper.instrumentset import InstrumentSet
+from qbootstrapper.interpolation import INTERPOLATIONS
+from qbootstrapper.solvers import _policy
 
 
 class Curve(object):
@@ -37,6 +40,31 @@ class Curve(object):
                                       [default: False]
         allow_extrapolation (bool)  : Boolean for allowing the interpolant
                                       to extrapolation
+        interpolation (str)         : Interpolation of the log discount
+                                      factors, used both while bootstrapping
+                                      and after the build
+                                      available: pchip, log_linear,
+                                      linear_zero, monotone_convex,
+                                      natural_cubic
+                                      [default: pchip]
+        daily_grid (bool)           : Materialize the log discount factors
+                                      of every calendar day from the
+                                      effective date to the last pillar
+                                      after each build, so that daily date
+                                      queries are array lookups, see grid
+                                      [default: False]
+        grid_path (str)             : Path of a file to hold the daily grid
+                                      memory-mapped, rather than in memory
+                                      [default: None]
+        solver (SolverPolicy)       : Root finding policy of the swap
+                                      pillars, or the name of one
+                                      available: default, fast
+                                      [default: default]
+        cache (BuildCache)          : Cache that the pillars are loaded
+                                      from, when the build inputs are
+                                      unchanged, and stored to, see
+                                      qbootstrapper.cache
+                                      [default: None]
 
     Attributes:
         curve (np.array)            : Numpy 3xn array of log discount factors
@@ -46,11 +74,38 @@ class Curve(object):
                                       holds the reference to the curve
 
         instruments (list)          : List of the instruments in the curve
+        instrument_set (InstrumentSet)
+                                    : Columnar instruments that the
+                                      instruments are created from, or None,
+                                      see set_instruments
         allow_extrapolation (bool)  : Boolean, reflecting whether the
                                       interpolant can extrapolate
+        interpolation (str)         : Name of the interpolation engine
+        daily_grid (bool)           : Whether daily date queries are looked
+                                      up on the materialized daily grid
+        grid_path (str)             : Path of the memory-mapped daily grid,
+                                      or None
+        solver (SolverPolicy)       : Root finding policy of the swap
+                                      pillars, see qbootstrapper.solvers
+        cache (BuildCache)          : Build cache of the curve, or None
+        sensitivities (np.array)    : In fast update mode, the pillar x
+                                      quote matrix of log discount factor
+                                      sensitivities to the quotes, see
+                                      enable_fast_update
+        fast_update_error (float)   : In fast update mode, the largest
+                                      repricing residual at the last check
+        build_report (BuildReport)  : Report of the last build, see
+                                      qbootstrapper.instrumentation
+        hooks (list)                : BuildHooks called by the builds of
+                                      this curve only
+        allocation_counts (list)    : Running counts of the interpolants
+                                      constructed, and of the arrays and
+                                      bytes allocated, by the curve
     '''
     def __init__(self, effective_date, discount_curve=False,
-                 allow_extrapolation=True):
+                 allow_extrapolation=True, interpolation='pchip',
+                 daily_grid=False, grid_path=None, solver='default',
+                 cache=None):
         if type(effective_date) is not datetime.datetime:
             raise TypeError('Effective date must be of type datetime.datetime')
 
@@ -60,6 +115,10 @@ class Curve(object):
         if type(allow_extrapolation) is not bool:
             raise TypeError('Allow_extrapolation must be of type \'bool\'')
 
+        if interpolation not in INTERPOLATIONS:
+            raise TypeError('Interpolation "{interpolation}" not '
+                            'recognized'.format(**locals()))
+
         self.curve = np.array([(np.datetime64(effective_date.strftime('%Y-%m-%d')),
                                 time.mktime(effective_date.timetuple()),
                                 np.log(1))],
@@ -70,32 +129,274 @@ class Curve(object):
         self.curve_type = 'IR_curve'
         self.discount_curve = discount_curve
         self.instruments = []
+        self.instrument_set = None
+        self._instrument_version = None
         self._built = False
+        self._interpolator = None
         self.allow_extrapolation = allow_extrapolation
+        self.interpolation = interpolation
+        self.daily_grid = daily_grid
+        self.grid_path = grid_path
+        self.solver = _policy(solver)
+        self.cache = cache
+        self._grid = None
+        self.sensitivities = None
+        self.fast_update_error = None
+        self.build_report = None
+        self.hooks = []
+        self.allocation_counts = [0, 0, 0]
 
     def add_instrument(self, instrument):
         '''Add an instrument to the curve
         '''
+        if self.instrument_set is not None:
+            raise Exception('The instruments of a curve with an InstrumentSet '
+                            'are set with set_instruments')
         if isinstance(instrument, instruments.Instrument):
             self._built = False
+            self._interpolator = None
+            self._grid = None
+            self.sensitivities = None
             self.instruments.append(instrument)
         else:
             raise TypeError('Instruments must be a of type Instrument')
 
-    def build(self):
+    def set_instruments(self, instrument_set):
+        '''Sets the instruments of the curve from an InstrumentSet, replacing
+        any instruments added before. The curve keeps its own copy of the
+        quotes, sharing the other columns and the periods with the set.
+
+        The instrument objects are created from the set when the curve is
+        built, and created again after set_quotes. Quotes set on the
+        instrument objects themselves, e.g., by the risk functions, are
+        copied back into the quotes of the set by the next build.
+        '''
+        if not isinstance(instrument_set, InstrumentSet):
+            raise TypeError('Instrument set must be of type InstrumentSet')
+        self.instrument_set = instrument_set.with_quotes(instrument_set.quote)
+        self.instruments = []
+        self._instrument_version = None
+        self._built = False
+        self._interpolator = None
+        self._grid = None
+        self.sensitivities = None
+
+    def build(self, use_cache=True):
         '''Initiate the curve construction procedure
+
+        kwargs
+        ------
+        use_cache (bool)    : Load the pillars from, and store them to, the
+                              cache of the curve, if it has one. The
+                              rebuilds with bumped quotes, e.g., of
+                              enable_fast_update, pass False, so that their
+                              pillars are not cached
+                              [default: True]
         '''
         self.curve = self.curve[0]
+        self._built = False
+        self._create_instruments()
+        self._interpolator = None
+        self._grid = None
+        self.instruments.sort(key=operator.attrgetter('maturity'))
+        recorder = instrumentation._BuildRecorder(self, [self])
+        cache = self.cache if use_cache else None
+        try:
+            cached = cache.get(self) if cache is not None else None
+            if cached is not None:
+                self.curve = cached['curve']
+                self._count_allocation(self.curve.nbytes)
+            else:
+                for index, instrument in enumerate(self.instruments):
+                    start = time.time()
+                    instrument.solver_report = None
+                    discount_factor = instrument.discount_factor()
+
+                    array = np.array([(np.datetime64(instrument.maturity.strftime('%Y-%m-%d')),
+                                      time.mktime(instrument.maturity.timetuple()),
+                                      discount_factor)], dtype=self.curve.dtype)
+                    self.curve = np.append(self.curve, array)
+                    self._count_allocation(self.curve.nbytes)
+                    recorder.instrument(index, instrument, instrument.maturity,
+                                        instrument.solver_report, start)
+                if cache is not None:
+                    cache.put(self, {'curve': self.curve})
+
+            self._built = True
+            if self.daily_grid:
+                self.grid()
+        except Exception as error:
+            recorder.finish(error)
+            raise
+        recorder.finish(cached=cached is not None)
+
+    def _create_instruments(self):
+        '''Private method to create the instrument objects from the
+        instrument set, if its quotes were set since they were last created,
+        or otherwise to copy the quotes of the objects into the set
+        '''
+        instrument_set = self.instrument_set
+        if instrument_set is None:
+            return
+        if self._instrument_version != instrument_set.version:
+            self.instruments = instrument_set.instruments(self)
+            self._instrument_version = instrument_set.version
+        else:
+            instrument_set.quote[:] = [instrument.get_quote()
+                                       for instrument in self.instruments]
+
+    def quotes(self):
+        '''Returns the quotes of the instruments, in maturity order (the
+        order of the pillars), as an array
+        '''
+        if (self.instrument_set is not None and
+                self._instrument_version != self.instrument_set.version):
+            return self.instrument_set.quote.copy()
         self.instruments.sort(key=operator.attrgetter('maturity'))
-        for instrument in self.instruments:
-            discount_factor = instrument.discount_factor()
+        return np.array([instrument.get_quote() for instrument in self.instruments],
+                        dtype=np.float64)
 
-            array = np.array([(np.datetime64(instrument.maturity.strftime('%Y-%m-%d')),
-                              time.mktime(instrument.maturity.timetuple()),
-                              discount_factor)], dtype=self.curve.dtype)
-            self.curve = np.append(self.curve, array)
+    def set_quotes(self, quotes):
+        '''Sets the quotes of the instruments, in maturity order. The curve
+        must be rebuilt for the quotes to take effect.
+        '''
+        if self.instrument_set is not None:
+            self.instrument_set.set_quotes(quotes)
+            self._built = False
+            return
+        self.instruments.sort(key=operator.attrgetter('maturity'))
+        if len(quotes) != len(self.instruments):
+            raise Exception('Expected {0} quotes, got '
+                            '{1}'.format(len(self.instruments), len(quotes)))
+        for instrument, quote in zip(self.instruments, quotes):
+            instrument.set_quote(quote)
+        self._built = False
 
-        self._built = True
+    def enable_fast_update(self, bump=0.0001, threshold=0.0025,
+                           residual_tolerance=None):
+        '''Builds the curve and the sensitivities of the pillar log discount
+        factors to the quotes, by bumping each quote and rebuilding, so that
+        small quote moves can be applied with apply_quote_deltas
+
+        kwargs
+        ------
+        bump (float)                : Size of the quote bumps, as a rate
+                                      [default: 0.0001]
+        threshold (float)           : Largest move of any quote, as a rate,
+                                      since the last full build before
+                                      apply_quote_deltas rebuilds the curve
+                                      [default: 0.0025]
+        residual_tolerance (float)  : If set, apply_quote_deltas reprices the
+                                      instruments after each update and
+                                      rebuilds the curve if any residual is
+                                      larger
+                                      [default: None]
+
+        The sensitivities are kept when the curve is rebuilt by
+        apply_quote_deltas; call enable_fast_update again to refresh them.
+        '''
+        quotes = self.quotes()
+        self.build()
+        scales = np.array([instrument.quote_scale for instrument in self.instruments],
+                          dtype=np.float64)
+        base = self.curve['discount_factor'][1:].copy()
+        sensitivities = np.empty((len(base), len(quotes)))
+        try:
+            for i, instrument in enumerate(self.instruments):
+                instrument.set_quote(quotes[i] + bump * scales[i])
+                self.build(use_cache=False)
+                sensitivities[:, i] = ((self.curve['discount_factor'][1:] - base) /
+                                       (bump * scales[i]))
+                instrument.set_quote(quotes[i])
+        finally:
+            self.set_quotes(quotes)
+            self.build()
+
+        self.sensitivities = sensitivities
+        self._fast_thresholds = threshold * scales
+        self.residual_tolerance = residual_tolerance
+        self._fast_update_base()
+
+    def apply_quote_deltas(self, deltas):
+        '''Applies quote moves to the curve with a first order update of the
+        pillar log discount factors, rebuilding the curve instead if the
+        quotes have moved past the threshold, or the residuals past the
+        residual tolerance. Returns True if the curve was rebuilt.
+
+        Arguments:
+            deltas (np.array)   : Quote moves, in maturity order
+        '''
+        if self.sensitivities is None:
+            raise Exception('Fast update mode not enabled, see '
+                            'enable_fast_update')
+        if self.curve is not self._fast_curve:
+            # the curve was rebuilt outside of apply_quote_deltas
+            self._fast_update_base()
+
+        deltas = np.asarray(deltas, dtype=np.float64)
+        if deltas.shape != self._quote_moves.shape:
+            raise Exception('Expected {0} quote deltas, got '
+                            '{1}'.format(len(self._quote_moves), len(deltas)))
+        for instrument, delta in zip(self.instruments, deltas):
+            if delta:
+                instrument.set_quote(instrument.get_quote() + delta)
+        self._quote_moves += deltas
+
+        if np.any(np.abs(self._quote_moves) > self._fast_thresholds):
+            self._fast_update_rebuild()
+            return True
+
+        curve = self._fast_base.copy()
+        curve['discount_factor'][1:] += self.sensitivities.dot(self._quote_moves)
+        self.curve = self._fast_curve = curve
+
+        if self.residual_tolerance is not None:
+            self.fast_update_error = np.abs(self.residuals()).max()
+            if self.fast_update_error > self.residual_tolerance:
+                self._fast_update_rebuild()
+                return True
+        return False
+
+    def residuals(self):
+        '''Returns the repricing residual of each instrument, in maturity
+        order, against the current pillars: the error in the log discount
+        factor for cash, FRA and futures instruments, and the value per unit
+        notional for swaps. Each instrument is repriced on the pillars before
+        its own, as in the bootstrap.
+        '''
+        return np.array([self._residual(i) for i in range(len(self.instruments))])
+
+    def _residual(self, index):
+        '''Private method to return the repricing residual of a single
+        instrument, see residuals
+        '''
+        full, built = self.curve, self._built
+        instrument = self.instruments[index]
+        log_df = full['discount_factor'][index + 1]
+        try:
+            # unbuilt, as in the bootstrap, so that the truncated pillars are
+            # evaluated through interpolator() rather than a daily grid
+            self.curve, self._built = full[:index + 1], False
+            if hasattr(instrument, '_swap_value'):
+                return instrument._swap_value(log_df) / instrument.notional
+            return instrument.discount_factor() - log_df
+        finally:
+            self.curve, self._built = full, built
+
+    def _fast_update_rebuild(self):
+        '''Private method to fully rebuild the curve in fast update mode
+        '''
+        self.build()
+        self._fast_update_base()
+
+    def _fast_update_base(self):
+        '''Private method to take the built curve as the base of the fast
+        updates
+        '''
+        self._fast_base = self.curve.copy()
+        self._fast_curve = self.curve
+        self._quote_moves = np.zeros(self.sensitivities.shape[1])
+        self.fast_update_error = 0.0
 
     def discount_factor(self, date):
         '''Returns the interpolated discount factor for an arbitrary date
@@ -109,14 +410,91 @@ class Curve(object):
 
     def log_discount_factor(self, date):
         '''Returns the natural log of the discount factor for an arbitrary date
+
+        With the daily grid, once the curve is built, the timestamps of the
+        (local) midnights of the days on the grid, i.e., those of the
+        pillars, are looked up rather than interpolated, giving the same
+        values.
         '''
         if type(date) == datetime.datetime:
             date = time.mktime(date.timetuple())
 
-        interpolator = scipy.interpolate.PchipInterpolator(self.curve['timestamp'],
-                                                           self.curve['discount_factor'],
-                                                           extrapolate=self.allow_extrapolation)
-        return interpolator(date)
+        if self.daily_grid and self._built:
+            timestamps = np.asarray(date)
+            if timestamps.dtype.kind in 'if':
+                return self._grid_lookup(timestamps.astype(np.float64))
+        return self.interpolator()(date)
+
+    def grid(self):
+        '''Returns the daily grid, as a tuple of the first day
+        (np.datetime64) and the array of the log discount factors of every
+        calendar day from the effective date to the last pillar, at the
+        timestamps of the (local) midnights of the days, as the pillars. The
+        grid is materialized on the first call after the pillars change,
+        memory-mapped to grid_path if it is set (the file is overwritten each
+        time).
+        '''
+        if not self._built:
+            self.build()
+        if self._grid is None or self._grid[0] is not self.curve:
+            first = self.curve['maturity'][0]
+            days = np.arange(first, self.curve['maturity'][-1] + np.timedelta64(1, 'D'))
+            timestamps = _timestamps(days)
+            log_dfs = self.interpolator()(timestamps)
+            self._count_allocation(log_dfs.nbytes + timestamps.nbytes)
+            if self.grid_path is not None:
+                values = np.memmap(self.grid_path, dtype=np.float64, mode='w+',
+                                   shape=log_dfs.shape)
+                values[:] = log_dfs
+                values.flush()
+                log_dfs = values
+            self._grid = (self.curve, first, log_dfs, timestamps)
+        return self._grid[1:3]
+
+    def _grid_lookup(self, timestamps):
+        '''Private method to return the log discount factors of an array of
+        timestamps, looked up on the daily grid where they are the midnights
+        of days on the grid and interpolated elsewhere
+        '''
+        self.grid()
+        log_dfs, days = self._grid[2:]
+        index = np.minimum(np.searchsorted(days, timestamps), len(days) - 1)
+        found = days[index] == timestamps
+        if found.all():
+            return log_dfs[index]
+        values = self.interpolator()(timestamps)
+        if found.any():
+            values[found] = log_dfs[index[found]]
+        return values
+
+    def interpolator(self):
+        '''Returns the interpolant of the log discount factors against the
+        timestamps. The interpolant is cached until the pillars change.
+        '''
+        if self._interpolator is None or self._interpolator[0] is not self.curve:
+            interpolator = self.interpolant(self.curve['timestamp'],
+                                            self.curve['discount_factor'],
+                                            extrapolate=self.allow_extrapolation)
+            self._interpolator = (self.curve, interpolator)
+        return self._interpolator[1]
+
+    def interpolant(self, timestamps, log_dfs, extrapolate=True):
+        '''Returns an interpolant of arbitrary log discount factors against
+        timestamps, with the interpolation of the curve, e.g., of the pillars
+        with a guess appended while bootstrapping
+        '''
+        interpolant = INTERPOLATIONS[self.interpolation](timestamps, log_dfs,
+                                                         extrapolate=extrapolate)
+        self.allocation_counts[0] += 1
+        self._count_allocation(interpolant.nbytes, interpolant.arrays)
+        return interpolant
+
+    def _count_allocation(self, nbytes, arrays=1):
+        '''Private method that counts arrays allocated by the curve, see
+        allocation_counts
+        '''
+        self.allocation_counts[1] += arrays
+        self.allocation_counts[2] += nbytes
 
     def view(self, ret=False):
         '''Prints the discount factor curve
@@ -164,14 +542,14 @@ class LIBORCurve(Curve):
         super(LIBORCurve, self).__init__(*args, **kwargs)
         self.curve_type = 'LIBOR_curve'
 
-    def build(self):
+    def build(self, use_cache=True):
         '''Checks to see if the discount curve has already been built before
-        running the base class build method
+        running the base class build method, see Curve.build
         '''
         if self.discount_curve and self.discount_curve._built is False:
             self.discount_curve.build()
 
-        super(LIBORCurve, self).build()
+        super(LIBORCurve, self).build(use_cache)
 
 
 class OISCurve(Curve):
@@ -187,7 +565,8 @@ class SimultaneousStrippedCurve(Curve):
     bootstrap OIS and LIBOR curves using AverageIndexBasisSwap instruments
     '''
     def __init__(self, effective_date, discount_curve, projection_curve,
-                 projection_discount_curve=False, allow_extrapolation=True):
+                 projection_discount_curve=False, allow_extrapolation=True,
+                 cache=None):
 
         if type(effective_date) is not datetime.datetime:
             raise TypeError('Effective date must be of type datetime.datetime')
@@ -212,7 +591,11 @@ class SimultaneousStrippedCurve(Curve):
         self.projection_discount_curve = copy.deepcopy(projection_discount_curve)
         self.instruments = []
         self._built = False
+        self._interpolator = None
         self.allow_extrapolation = allow_extrapolation
+        self.cache = cache
+        self.build_report = None
+        self.hooks = []
 
     def add_instrument(self, instrument):
         '''Needs special because the discount_curve and projection curve
@@ -225,32 +608,59 @@ class SimultaneousStrippedCurve(Curve):
         else:
             raise TypeError('Instruments must be a of type Instrument')
 
-    def build(self):
-        '''
+    def build(self, use_cache=True):
+        '''Builds the discount and projection curves, and then solves the
+        simultaneous instruments, see Curve.build
         '''
-        self.discount_curve.build()
-        self.projection_curve.build()
-        
-        # TODO figure out some way of sorting these things
-        # self.instruments.sort(key=operator.attrgetter('maturity'))
-
-        for instrument in self.instruments:
-            df = instrument.discount_factor()
-
-            if df.success:
-                leg_one_df, leg_two_df = df.x
-
-                array = np.array([(np.datetime64(instrument.discount_instrument.maturity.strftime('%Y-%m-%d')),
-                                   time.mktime(instrument.discount_instrument.maturity.timetuple()),
-                                   leg_one_df)], dtype=self.discount_curve.curve.dtype)
-                self.discount_curve.curve = np.append(self.discount_curve.curve, array)
-
-                array = np.array([(np.datetime64(instrument.projection_instrument.maturity.strftime('%Y-%m-%d')),
-                                   time.mktime(instrument.projection_instrument.maturity.timetuple()),
-                                   leg_two_df)], dtype=self.projection_curve.curve.dtype)
-                self.projection_curve.curve = np.append(self.projection_curve.curve, array)
-                
-        self._built = True
+        recorder = instrumentation._BuildRecorder(self, [self.discount_curve,
+                                                         self.projection_curve])
+        cache = self.cache if use_cache else None
+        try:
+            cached = cache.get(self) if cache is not None else None
+            if cached is not None:
+                for name in ['discount_curve', 'projection_curve']:
+                    curve = getattr(self, name)
+                    curve.curve = cached[name]
+                    curve._built = True
+                    curve._count_allocation(curve.curve.nbytes)
+            else:
+                self.discount_curve.build(use_cache)
+                self.projection_curve.build(use_cache)
+
+                # TODO figure out some way of sorting these things
+                # self.instruments.sort(key=operator.attrgetter('maturity'))
+
+                for index, instrument in enumerate(self.instruments):
+                    start = time.time()
+                    df = instrument.discount_factor()
+
+                    if df.success:
+                        leg_one_df, leg_two_df = df.x
+
+                        array = np.array([(np.datetime64(instrument.discount_instrument.maturity.strftime('%Y-%m-%d')),
+                                           time.mktime(instrument.discount_instrument.maturity.timetuple()),
+                                           leg_one_df)], dtype=self.discount_curve.curve.dtype)
+                        self.discount_curve.curve = np.append(self.discount_curve.curve, array)
+                        self.discount_curve._count_allocation(self.discount_curve.curve.nbytes)
+
+                        array = np.array([(np.datetime64(instrument.projection_instrument.maturity.strftime('%Y-%m-%d')),
+                                           time.mktime(instrument.projection_instrument.maturity.timetuple()),
+                                           leg_two_df)], dtype=self.projection_curve.curve.dtype)
+                        self.projection_curve.curve = np.append(self.projection_curve.curve, array)
+                        self.projection_curve._count_allocation(self.projection_curve.curve.nbytes)
+
+                    recorder.instrument(index, instrument,
+                                        instrument.discount_instrument.maturity,
+                                        instrument.solver_report, start)
+                if cache is not None:
+                    cache.put(self, {'discount_curve': self.discount_curve.curve,
+                                     'projection_curve': self.projection_curve.curve})
+
+            self._built = True
+        except Exception as error:
+            recorder.finish(error)
+            raise
+        recorder.finish(cached=cached is not None)
 
     def view(self):
         '''
@@ -265,3 +675,18 @@ class SimultaneousStrippedCurve(Curve):
         raise NotImplementedError('Please view the individual curves using the'
                                   ' self.discount_curve and'
                                   ' self.projection_curve syntax')
+
+
+def _timestamps(dates):
+    '''Private function to return the timestamps of an array of dates in the
+    convention of the curve pillars, i.e., time.mktime of the (local)
+    midnight of each date, so that the timestamp of a date matches that of a
+    pillar on the same date
+    '''
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if time.timezone == 0 and not time.daylight:
+        return dates.astype('<M8[s]').astype(np.float64)
+    days, index = np.unique(dates.ravel(), return_inverse=True)
+    local = np.array([time.mktime(day.timetuple()) for day in days.astype(object)],
+                     dtype=np.float64)
+    return local[index].reshape(dates.shape)
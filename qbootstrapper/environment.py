@@ -0,0 +1,266 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the MarketEnvironment object, which holds a set of curves with
+their dependencies and rebuilds them lazily.
+
+LIBORCurve.build only builds its discount curve if the discount curve has
+never been built, so a dependent curve keeps stale pillars when the curve it
+depends on changes. The environment instead marks a curve, and every curve
+that depends on it, dirty when its quotes change. Dirty curves are rebuilt,
+after the curves they depend on, the first time they are queried.
+'''
+# python libraries
+import datetime
+import numpy as np
+
+# qlib libraries
+import qbootstrapper.curves as curves
+import qbootstrapper.instruments as instruments
+
+
+class MarketEnvironment(object):
+    '''Set of curves with lazy, dependency-ordered rebuilds
+
+    Curves are registered with add_curve. A curve depends on its
+    discount_curve (and projection_curve) if that curve is also registered,
+    and on any further curves named in depends_on, e.g., the projection
+    curve of a basis swap.
+
+    Note that a SimultaneousStrippedCurve copies its discount and projection
+    curves when it is created, so it does not depend on the registered
+    originals; its quotes are set on the SimultaneousStrippedCurve itself.
+
+    Attributes:
+        curves (dict)       : Registered curves keyed by name
+        builds (dict)       : Number of times each curve has been rebuilt
+    '''
+    def __init__(self):
+        self.curves = {}
+        self._upstream = {}
+        self._dirty = set()
+        self.builds = {}
+
+    def add_curve(self, name, curve, depends_on=None):
+        '''Registers a curve, marking it dirty
+
+        Arguments:
+            name (str)          : Name of the curve
+            curve (Curve)       : Curve, built or unbuilt
+
+            kwargs
+            ------
+            depends_on (list)   : Names of further curves that the curve
+                                  depends on
+                                  [default: None]
+        '''
+        if not isinstance(curve, curves.Curve):
+            raise TypeError('Curve must be of type Curve')
+        self.curves[name] = curve
+        self.builds[name] = 0
+        self._upstream[name] = set(depends_on or [])
+        for other, other_curve in self.curves.items():
+            if _depends(other_curve, curve):
+                self._upstream[other].add(name)
+            if _depends(curve, other_curve):
+                self._upstream[name].add(other)
+        self._upstream[name].discard(name)
+        missing = sorted(self._upstream[name] - set(self.curves))
+        if missing or self._cycle(name):
+            self.remove_curve(name)
+            if missing:
+                raise Exception('Curve "{0}" not in '
+                                'environment'.format(missing[0]))
+            raise Exception('Curve "{name}" has a circular '
+                            'dependency'.format(**locals()))
+        self.invalidate(name)
+
+    def remove_curve(self, name):
+        '''Removes a curve, and its dependencies, from the environment
+        '''
+        del self.curves[name]
+        del self.builds[name]
+        del self._upstream[name]
+        self._dirty.discard(name)
+        for upstream in self._upstream.values():
+            upstream.discard(name)
+
+    def dependents(self, name):
+        '''Returns the names of every curve that depends, directly or
+        indirectly, on a curve
+        '''
+        found = set()
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            for other, upstream in self._upstream.items():
+                if current in upstream and other not in found:
+                    found.add(other)
+                    pending.append(other)
+        return sorted(found)
+
+    def invalidate(self, name):
+        '''Marks a curve, and every curve that depends on it, dirty
+        '''
+        self._dirty.add(name)
+        self._dirty.update(self.dependents(name))
+
+    def dirty(self):
+        '''Returns the names of the dirty curves
+        '''
+        return sorted(self._dirty)
+
+    def get_quote(self, name, instrument):
+        '''Returns the quote of an instrument in a curve
+
+        Arguments:
+            name (str)          : Name of the curve
+            instrument          : Instrument in the curve, or the maturity
+                                  (datetime) of a single instrument in the
+                                  curve
+        '''
+        return self._instrument(name, instrument).get_quote()
+
+    def set_quote(self, name, instrument, quote):
+        '''Sets the quote of an instrument in a curve, marking the curve and
+        its dependents dirty if the quote changed
+
+        Arguments:
+            name (str)          : Name of the curve
+            instrument          : Instrument in the curve, or the maturity
+                                  (datetime) of a single instrument in the
+                                  curve
+            quote (float)       : New quote
+        '''
+        self.set_quotes(name, [(instrument, quote)])
+
+    def set_quotes(self, name, quotes):
+        '''Sets the quotes of several instruments in a curve at once
+
+        Arguments:
+            name (str)          : Name of the curve
+            quotes (list)       : List of (instrument, quote) tuples, or a
+                                  dict, see set_quote
+        '''
+        if isinstance(quotes, dict):
+            quotes = quotes.items()
+        changed = False
+        for key, quote in quotes:
+            instrument = self._instrument(name, key)
+            if instrument.get_quote() != quote:
+                instrument.set_quote(quote)
+                changed = True
+        if changed:
+            self.invalidate(name)
+
+    def curve(self, name):
+        '''Returns a curve, rebuilding it and the curves it depends on first
+        if they are dirty
+        '''
+        if name not in self.curves:
+            raise KeyError('Curve "{name}" not in environment'.format(**locals()))
+        for upstream in self._order(name):
+            if upstream in self._dirty:
+                self.curves[upstream].build()
+                self.builds[upstream] += 1
+                self._dirty.discard(upstream)
+        return self.curves[name]
+
+    def build(self):
+        '''Rebuilds every dirty curve
+        '''
+        for name in sorted(self._dirty):
+            if name in self._dirty:
+                self.curve(name)
+
+    def discount_factor(self, name, date):
+        '''Returns the interpolated discount factor of a curve for an
+        arbitrary date
+        '''
+        return self.curve(name).discount_factor(date)
+
+    def log_discount_factor(self, name, date):
+        '''Returns the natural log of the discount factor of a curve for an
+        arbitrary date
+        '''
+        return self.curve(name).log_discount_factor(date)
+
+    def _order(self, name):
+        '''Private method to return a curve and the curves it depends on,
+        upstream curves first
+        '''
+        order = []
+
+        def visit(current):
+            for upstream in sorted(self._upstream[current]):
+                visit(upstream)
+            if current not in order:
+                order.append(current)
+
+        visit(name)
+        return order
+
+    def _cycle(self, name):
+        '''Private method to return whether a curve depends on itself
+        '''
+        seen = set()
+        pending = list(self._upstream[name])
+        while pending:
+            current = pending.pop()
+            if current == name:
+                return True
+            if current not in seen:
+                seen.add(current)
+                pending.extend(self._upstream[current])
+        return False
+
+    def _instrument(self, name, key):
+        '''Private method to find an instrument in a curve by the instrument
+        itself or by its maturity
+        '''
+        if name not in self.curves:
+            raise KeyError('Curve "{name}" not in environment'.format(**locals()))
+        candidates = _instruments(self.curves[name])
+        if isinstance(key, instruments.Instrument):
+            if any(key is instrument for instrument in candidates):
+                return key
+        elif isinstance(key, (datetime.datetime, np.datetime64)):
+            if isinstance(key, np.datetime64):
+                key = key.astype('<M8[us]').astype(datetime.datetime)
+            matches = [instrument for instrument in candidates
+                       if instrument.maturity == key]
+            if len(matches) == 1:
+                return matches[0]
+            if len(matches) > 1:
+                raise Exception('Several instruments in curve "{name}" '
+                                'mature on {key}'.format(**locals()))
+        else:
+            raise TypeError('Instrument must be an Instrument or a maturity')
+        raise KeyError('Instrument {key} not in curve '
+                       '"{name}"'.format(**locals()))
+
+
+def _depends(curve, other):
+    '''Private function to return whether a curve is discounted on, or
+    projected from, another curve
+    '''
+    return (getattr(curve, 'discount_curve', False) is other or
+            getattr(curve, 'projection_curve', False) is other)
+
+
+def _instruments(curve):
+    '''Private function to return every quoted instrument of a curve,
+    including the instruments of the curves held by a
+    SimultaneousStrippedCurve, and both instruments of each of its
+    SimultaneousInstruments
+    '''
+    if not isinstance(curve, curves.SimultaneousStrippedCurve):
+        return list(curve.instruments)
+    found = list(curve.discount_curve.instruments)
+    found.extend(curve.projection_curve.instruments)
+    for instrument in curve.instruments:
+        found.extend([instrument.discount_instrument,
+                      instrument.projection_instrument])
+    return found
@@ -0,0 +1,478 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the columnar export of built curves and of the cashflow
+schedules of their instruments, for bulk loading into downstream systems.
+
+    export_curves('curves.npz', {'EONIA': eonia, 'USDLIBOR': usdlibor},
+                  grid=30)
+    export_schedules('schedules.csv', {'EONIA': eonia})
+
+write one row per pillar (or grid date) of each curve, see CURVE_COLUMNS,
+and one row per period of each leg of each instrument, see
+SCHEDULE_COLUMNS. The format is chosen by the extension of the path, see
+FORMATS: .npz and .csv are always available, .parquet when pyarrow is
+installed.
+
+Rows are buffered and written in chunks of chunk_rows, so that exports of
+many curves use bounded memory: CSV and Parquet chunks are appended to the
+file as they are written, and .npz columns are spooled to temporary files
+and copied into the archive when the writer is closed. Every file is
+written to a temporary path and renamed when complete.
+'''
+# python libraries
+from __future__ import division
+import csv
+import datetime
+import numpy as np
+import os
+import shutil
+import tempfile
+import zipfile
+
+# qlib libraries
+from qbootstrapper.curves import _timestamps
+
+CURVE_COLUMNS = ['as_of', 'curve', 'maturity', 'days', 'discount_factor',
+                 'log_discount_factor', 'zero_rate', 'forward_rate']
+
+SCHEDULE_COLUMNS = ['curve', 'instrument', 'instrument_type', 'maturity',
+                    'leg', 'period', 'fixing_date', 'accrual_start',
+                    'accrual_end', 'payment_date', 'cashflow', 'pv']
+
+# Schedule attributes of the swap instruments, exported as the leg named
+# by the prefix
+SCHEDULES = ['fixed_schedule', 'float_schedule', 'leg_one_schedule',
+             'leg_two_schedule']
+
+# Rows copied at a time from the spooled .npz columns into the archive
+_BLOCK_ROWS = 1 << 16
+
+
+def pillar_columns(name, maturities, log_dfs, as_of=None):
+    '''Returns the export columns of a curve from its pillars, see
+    CURVE_COLUMNS
+
+    Arguments:
+        name (str)              : Name of the curve
+        maturities (np.array)   : datetime64[D] dates, the first of which is
+                                  the effective date of the curve
+        log_dfs (np.array)      : Natural log of the discount factors
+
+        kwargs
+        ------
+        as_of (datetime)        : As-of date of the curve
+                                  [default: the first of the maturities]
+
+    The zero rates and forward rates are continuously compounded Act/365,
+    the forward rate of a row being that from the previous row to the row.
+    Both are 0 in the first row.
+    '''
+    maturities = np.asarray(maturities, dtype='datetime64[D]')
+    log_dfs = np.asarray(log_dfs, dtype=np.float64)
+    count = len(maturities)
+    as_of = maturities[0] if as_of is None else _day(as_of)
+    days = (maturities - maturities[0]).astype(np.int64)
+    years = days / 365
+    forward_rates = np.zeros(count)
+    spans = np.diff(years)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zero_rates = np.where(days > 0, -log_dfs / years, 0.0)
+        forward_rates[1:] = np.where(spans > 0, -np.diff(log_dfs) / spans, 0.0)
+    return {'as_of': np.full(count, as_of, dtype='datetime64[D]'),
+            'curve': np.full(count, name),
+            'maturity': maturities,
+            'days': days,
+            'discount_factor': np.exp(log_dfs),
+            'log_discount_factor': log_dfs,
+            'zero_rate': zero_rates,
+            'forward_rate': forward_rates}
+
+
+def curve_columns(name, curve, grid=None, as_of=None):
+    '''Returns the export columns of a built curve, see CURVE_COLUMNS
+
+    Arguments:
+        name (str)              : Name of the curve
+        curve (Curve)           : Curve, built if it is not already
+
+        kwargs
+        ------
+        grid (int or array)     : Dates to export the curve at, either every
+                                  grid days from the effective date to the
+                                  last pillar (which is included), or an
+                                  array of dates (datetime64 or datetime),
+                                  or None for the pillars
+                                  [default: None]
+        as_of (datetime)        : As-of date of the curve
+                                  [default: the effective date]
+
+    Simultaneously stripped curves are exported through their
+    discount_curve and projection_curve.
+    '''
+    if not curve._built:
+        curve.build()
+    pillars = curve.curve['maturity']
+    if grid is None:
+        return pillar_columns(name, pillars, curve.curve['discount_factor'],
+                              as_of=as_of)
+
+    if isinstance(grid, (int, np.integer)):
+        if grid <= 0:
+            raise Exception('Grid step "{grid}" must be a positive number of '
+                            'days'.format(**locals()))
+        dates = np.arange(pillars[0], pillars[-1], np.timedelta64(int(grid), 'D'))
+        dates = np.append(dates, pillars[-1])
+    else:
+        dates = np.unique(np.array([_day(date) for date in grid],
+                                   dtype='datetime64[D]'))
+        # the effective date is always the first row, as for the pillars
+        dates = np.append(pillars[:1], dates[dates > pillars[0]])
+    log_dfs = np.asarray(curve.log_discount_factor(_timestamps(dates)),
+                         dtype=np.float64)
+    return pillar_columns(name, dates, log_dfs, as_of=as_of)
+
+
+def schedule_columns(name, curve):
+    '''Returns the export columns of the schedules of the instruments of a
+    curve, see SCHEDULE_COLUMNS. The cashflows and PVs are those left by the
+    last valuation of each leg, i.e., at the solved pillars once the curve
+    is built.
+
+    Only instruments with Schedule legs (the swaps) have rows. The legs of
+    a SimultaneousInstrument are exported under its index in the curve.
+    '''
+    chunks = []
+    for index, instrument in enumerate(curve.instruments):
+        for item in _expand(instrument):
+            for attribute in SCHEDULES:
+                schedule = getattr(item, attribute, None)
+                if schedule is None:
+                    continue
+                periods = schedule.periods
+                count = len(periods)
+                chunks.append({
+                    'curve': np.full(count, name),
+                    'instrument': np.full(count, index, dtype=np.int64),
+                    'instrument_type': np.full(count, item.instrument_type),
+                    'maturity': np.full(count, _day(item.maturity),
+                                        dtype='datetime64[D]'),
+                    'leg': np.full(count, attribute[:-len('_schedule')]),
+                    'period': np.arange(count, dtype=np.int64),
+                    'fixing_date': np.asarray(periods['fixing_date']),
+                    'accrual_start': np.asarray(periods['accrual_start']),
+                    'accrual_end': np.asarray(periods['accrual_end']),
+                    'payment_date': np.asarray(periods['payment_date']),
+                    'cashflow': np.array(periods['cashflow'], dtype=np.float64),
+                    'pv': np.array(periods['PV'], dtype=np.float64)})
+    return _concatenate(chunks, SCHEDULE_COLUMNS)
+
+
+def export_curves(path, curves, grid=None, chunk_rows=1 << 16):
+    '''Writes the export columns of curves to a file, see curve_columns,
+    returns the number of rows written
+
+    Arguments:
+        path (str)              : Path of the file, whose extension selects
+                                  the format, see FORMATS
+        curves (dict or list)   : Curves keyed by name, or an iterable of
+                                  (name, curve) tuples, e.g., a generator
+                                  that builds the curves one at a time
+
+        kwargs
+        ------
+        grid (int or array)     : See curve_columns [default: None]
+        chunk_rows (int)        : Rows buffered before a chunk is written
+                                  [default: 65536]
+    '''
+    with writer(path, CURVE_COLUMNS, chunk_rows=chunk_rows) as output:
+        for name, curve in _items(curves):
+            output.append(curve_columns(name, curve, grid=grid))
+    return output.rows
+
+
+def export_schedules(path, curves, chunk_rows=1 << 16):
+    '''Writes the export columns of the schedules of the instruments of
+    curves to a file, see schedule_columns and export_curves, returns the
+    number of rows written
+    '''
+    with writer(path, SCHEDULE_COLUMNS, chunk_rows=chunk_rows) as output:
+        for name, curve in _items(curves):
+            output.append(schedule_columns(name, curve))
+    return output.rows
+
+
+def writer(path, columns, chunk_rows=1 << 16):
+    '''Returns the ColumnWriter of the format of the extension of path, see
+    FORMATS
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise TypeError('Export format "{extension}" not '
+                        'recognized'.format(**locals()))
+    return FORMATS[extension](path, columns, chunk_rows=chunk_rows)
+
+
+class ColumnWriter(object):
+    '''Base class of the writers of columnar files. Appended columns are
+    buffered, and written as a chunk once chunk_rows are buffered or the
+    writer is closed. Sub-classes implement _write and _close.
+
+    Arguments:
+        path (str)              : Path of the file
+        columns (list)          : Names of the columns, in order
+
+        kwargs
+        ------
+        chunk_rows (int)        : Rows buffered before a chunk is written
+                                  [default: 65536]
+
+    Attributes:
+        rows (int)              : Number of rows appended
+        chunks (int)            : Number of chunks written
+    '''
+    def __init__(self, path, columns, chunk_rows=1 << 16):
+        self.path = path
+        self.columns = list(columns)
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.chunks = 0
+        self._buffer = []
+        self._buffered = 0
+        self._closed = False
+        folder = os.path.dirname(os.path.abspath(path))
+        handle, self._temporary = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        os.close(handle)
+
+    def append(self, columns):
+        '''Appends rows, given as a dict of equal length arrays keyed by
+        column
+        '''
+        missing = [column for column in self.columns if column not in columns]
+        if missing:
+            raise Exception('Columns "{0}" missing from the '
+                            'rows'.format(', '.join(missing)))
+        count = len(columns[self.columns[0]])
+        if not count:
+            return
+        self._buffer.append(columns)
+        self._buffered += count
+        self.rows += count
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        '''Writes the buffered rows as a chunk
+        '''
+        if not self._buffered:
+            return
+        self._write(_concatenate(self._buffer, self.columns))
+        self._buffer = []
+        self._buffered = 0
+        self.chunks += 1
+
+    def close(self):
+        '''Writes the buffered rows and completes the file
+        '''
+        if self._closed:
+            return
+        self.flush()
+        self._close()
+        os.rename(self._temporary, self.path)
+        self._closed = True
+
+    def abort(self):
+        '''Discards the file
+        '''
+        self._closed = True
+        if os.path.exists(self._temporary):
+            os.remove(self._temporary)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, arrays):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class CSVWriter(ColumnWriter):
+    '''ColumnWriter of CSV files with a header row. Dates are written as
+    YYYY-MM-DD and floats with the shortest repr that round-trips.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(CSVWriter, self).__init__(*args, **kwargs)
+        self._handle = open(self._temporary, 'w')
+        self._writer = csv.writer(self._handle, lineterminator='\n')
+        self._writer.writerow(self.columns)
+
+    def _write(self, arrays):
+        self._writer.writerows(zip(*[arrays[column].astype(str)
+                                     for column in self.columns]))
+
+    def _close(self):
+        self._handle.close()
+
+    def abort(self):
+        self._handle.close()
+        super(CSVWriter, self).abort()
+
+
+class NPZWriter(ColumnWriter):
+    '''ColumnWriter of .npz archives of one array per column, as written by
+    np.savez. Each column is spooled to a temporary file as its chunks are
+    written (string columns as codes into their distinct values), and
+    copied into the archive in blocks when the writer is closed.
+    '''
+    def __init__(self, *args, **kwargs):
+        super(NPZWriter, self).__init__(*args, **kwargs)
+        self._spool = tempfile.mkdtemp(dir=os.path.dirname(self._temporary))
+        self._dtypes = {}
+        self._labels = dict((column, {}) for column in self.columns)
+
+    def _write(self, arrays):
+        for column in self.columns:
+            array = np.asarray(arrays[column])
+            if array.dtype.kind == 'U':
+                labels = self._labels[column]
+                values, inverse = np.unique(array, return_inverse=True)
+                codes = np.array([labels.setdefault(value, len(labels))
+                                  for value in values.tolist()], dtype=np.int64)
+                array = codes[inverse.reshape(-1)]
+                dtype = np.dtype(np.int64)
+            else:
+                dtype = self._dtypes.setdefault(column, array.dtype)
+            with open(os.path.join(self._spool, column), 'ab') as handle:
+                handle.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+    def _close(self):
+        try:
+            with zipfile.ZipFile(self._temporary, 'w', zipfile.ZIP_STORED,
+                                 allowZip64=True) as archive:
+                for column in self.columns:
+                    self._copy(archive, column)
+        finally:
+            shutil.rmtree(self._spool, ignore_errors=True)
+
+    def _copy(self, archive, column):
+        '''Private method to copy a spooled column into the archive
+        '''
+        spooled = os.path.join(self._spool, column)
+        labels = None
+        if self._labels[column]:
+            labels = np.array(sorted(self._labels[column],
+                                     key=self._labels[column].get))
+            stored, dtype = np.dtype(np.int64), labels.dtype
+        else:
+            stored = dtype = self._dtypes.get(column, np.dtype(np.float64))
+        rows = os.path.getsize(spooled) // stored.itemsize if (
+            os.path.exists(spooled)) else 0
+        header = {'descr': np.lib.format.dtype_to_descr(dtype),
+                  'fortran_order': False,
+                  'shape': (rows,)}
+        with archive.open(column + '.npy', 'w', force_zip64=True) as output:
+            np.lib.format.write_array_header_2_0(output, header)
+            if not rows:
+                return
+            with open(spooled, 'rb') as handle:
+                while True:
+                    block = np.fromfile(handle, dtype=stored, count=_BLOCK_ROWS)
+                    if not len(block):
+                        break
+                    if labels is not None:
+                        block = labels[block]
+                    output.write(block.tobytes())
+
+    def abort(self):
+        shutil.rmtree(self._spool, ignore_errors=True)
+        super(NPZWriter, self).abort()
+
+
+class ParquetWriter(ColumnWriter):
+    '''ColumnWriter of Parquet files, one row group per chunk. Requires
+    pyarrow, which is imported when the writer is created.
+    '''
+    def __init__(self, *args, **kwargs):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception('Parquet export requires pyarrow')
+        super(ParquetWriter, self).__init__(*args, **kwargs)
+        self._pyarrow = pyarrow
+        self._writer = None
+
+    def _write(self, arrays):
+        pyarrow = self._pyarrow
+        table = pyarrow.Table.from_arrays([pyarrow.array(arrays[column])
+                                           for column in self.columns],
+                                          names=self.columns)
+        if self._writer is None:
+            self._writer = pyarrow.parquet.ParquetWriter(self._temporary,
+                                                         table.schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+
+    def _close(self):
+        if self._writer is None:
+            self._write(dict((column, np.array([])) for column in self.columns))
+        self._writer.close()
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        super(ParquetWriter, self).abort()
+
+
+FORMATS = {'.csv': CSVWriter,
+           '.npz': NPZWriter,
+           '.parquet': ParquetWriter}
+
+
+def _items(curves):
+    '''Private function to return the (name, curve) tuples of a dict or an
+    iterable of tuples
+    '''
+    if isinstance(curves, dict):
+        return sorted(curves.items(), key=lambda item: item[0])
+    return curves
+
+
+def _expand(instrument):
+    '''Private function to return the instruments of a SimultaneousInstrument,
+    or a list of the instrument
+    '''
+    if hasattr(instrument, 'discount_instrument'):
+        return [instrument.discount_instrument,
+                instrument.projection_instrument]
+    return [instrument]
+
+
+def _concatenate(chunks, columns):
+    '''Private function to concatenate a list of dicts of column arrays
+    '''
+    arrays = {}
+    for column in columns:
+        if chunks:
+            arrays[column] = np.concatenate([chunk[column] for chunk in chunks])
+        else:
+            arrays[column] = np.array([])
+    return arrays
+
+
+def _day(date):
+    '''Private function to return the datetime64[D] of a datetime, date or
+    datetime64
+    '''
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return np.datetime64(date, 'D')
@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the build reports of the curves, and the hooks that forward the
+build events to a metrics system.
+
+Every build of a curve leaves a BuildReport in curve.build_report, with an
+InstrumentReport for each pillar (the solver, its iterations, the
+evaluations of the instrument's _swap_value, the final residual and the
+wall time), and the interpolants and arrays allocated by the build as a
+whole.
+
+Hooks are sub-classes of BuildHook, registered either for every curve with
+add_hook, or for a single curve by appending to curve.hooks. Each hook is
+called when a build starts, after each instrument is solved and when the
+build finishes, whether or not it succeeded.
+'''
+# python libraries
+from __future__ import division
+import collections
+import time
+
+
+InstrumentReport = collections.namedtuple('InstrumentReport',
+                                          ['index', 'instrument_type',
+                                           'maturity', 'method', 'iterations',
+                                           'evaluations', 'converged',
+                                           'residual', 'elapsed'])
+
+_HOOKS = []
+
+
+class BuildReport(object):
+    '''Report of a single build of a curve
+
+    Arguments:
+        curve_type (str)        : Curve type of the curve built
+
+    Attributes:
+        instruments (list)      : InstrumentReport of each instrument, in
+                                  the order they were solved
+        interpolants (int)      : Interpolants constructed by the build
+        allocations (int)       : Arrays allocated by the build for the
+                                  pillars and the interpolants
+        allocated_bytes (int)   : Size of those arrays
+        started (float)         : Epoch time the build started
+        elapsed (float)         : Wall time of the build, in seconds
+        error (Exception)       : Exception that stopped the build, or None
+        cached (bool)           : Whether the pillars were loaded from the
+                                  build cache rather than solved
+    '''
+    def __init__(self, curve_type):
+        self.curve_type = curve_type
+        self.instruments = []
+        self.interpolants = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.started = time.time()
+        self.elapsed = None
+        self.error = None
+        self.cached = False
+
+    def evaluations(self):
+        '''Returns the total evaluations of the instruments' _swap_value
+        '''
+        return sum(report.evaluations for report in self.instruments)
+
+    def slowest(self, count=5):
+        '''Returns the InstrumentReports of the count slowest instruments
+        '''
+        return sorted(self.instruments,
+                      key=lambda report: report.elapsed, reverse=True)[:count]
+
+    def to_dict(self):
+        '''Returns the report as a dict of plain values, e.g., to be
+        serialized to JSON
+        '''
+        instruments = []
+        for report in self.instruments:
+            report = report._asdict()
+            report['maturity'] = report['maturity'].strftime('%Y-%m-%d')
+            instruments.append(report)
+        return {'curve_type': self.curve_type,
+                'instruments': instruments,
+                'interpolants': self.interpolants,
+                'allocations': self.allocations,
+                'allocated_bytes': self.allocated_bytes,
+                'started': self.started,
+                'elapsed': self.elapsed,
+                'error': None if self.error is None else repr(self.error),
+                'cached': self.cached}
+
+    def __repr__(self):
+        return ('BuildReport({0}, {1} instruments, {2} evaluations, '
+                '{3} interpolants, {4:.6f}s)'.format(self.curve_type,
+                                                     len(self.instruments),
+                                                     self.evaluations(),
+                                                     self.interpolants,
+                                                     self.elapsed or 0.0))
+
+
+class BuildHook(object):
+    '''Base class of the build hooks, whose methods do nothing. Sub-classes
+    override the events they forward.
+    '''
+    def build_started(self, curve):
+        '''Called before the first instrument of the curve is solved
+        '''
+        pass
+
+    def instrument_solved(self, curve, report):
+        '''Called with the InstrumentReport of each instrument once its
+        pillar is added to the curve
+        '''
+        pass
+
+    def build_finished(self, curve, report):
+        '''Called with the BuildReport when the build finishes, and when it
+        fails, in which case report.error is set
+        '''
+        pass
+
+
+def add_hook(hook):
+    '''Registers a BuildHook for the builds of every curve
+    '''
+    if not isinstance(hook, BuildHook):
+        raise TypeError('Hooks must be of type BuildHook')
+    _HOOKS.append(hook)
+
+
+def remove_hook(hook):
+    '''Unregisters a BuildHook added with add_hook
+    '''
+    _HOOKS.remove(hook)
+
+
+class _BuildRecorder(object):
+    '''Private class that records a build of curve into a BuildReport,
+    calling the hooks. The interpolants and allocations are counted on
+    each of counted, the curves whose pillars the build extends.
+    '''
+    def __init__(self, curve, counted):
+        self.curve = curve
+        self.counted = counted
+        self.report = BuildReport(curve.curve_type)
+        self.hooks = _HOOKS + list(getattr(curve, 'hooks', []))
+        self._counts = [list(item.allocation_counts) for item in counted]
+        self._start = time.time()
+        for hook in self.hooks:
+            hook.build_started(curve)
+
+    def instrument(self, index, instrument, maturity, solver, start):
+        '''Records the solve of an instrument, started at start, from the
+        solver report it left, or as analytic when it left none
+        '''
+        solver = solver or {'method': 'analytic', 'iterations': 0,
+                            'evaluations': 0, 'converged': True,
+                            'residual': 0.0}
+        report = InstrumentReport(index, type(instrument).__name__, maturity,
+                                  solver['method'], solver['iterations'],
+                                  solver['evaluations'], solver['converged'],
+                                  solver['residual'], time.time() - start)
+        self.report.instruments.append(report)
+        for hook in self.hooks:
+            hook.instrument_solved(self.curve, report)
+
+    def finish(self, error=None, cached=False):
+        '''Completes the report, leaves it on the curve and returns it
+        '''
+        report = self.report
+        report.elapsed = time.time() - self._start
+        report.error = error
+        report.cached = cached
+        for item, counts in zip(self.counted, self._counts):
+            interpolants, allocations, allocated_bytes = item.allocation_counts
+            report.interpolants += interpolants - counts[0]
+            report.allocations += allocations - counts[1]
+            report.allocated_bytes += allocated_bytes - counts[2]
+        self.curve.build_report = report
+        for hook in self.hooks:
+            hook.build_finished(self.curve, report)
+        return report
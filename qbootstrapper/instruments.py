@@ -14,13 +14,11 @@ from __future__ import division
 import dateutil.relativedelta
 import datetime
 import numpy as np
-import scipy.interpolate
-import scipy.optimize
 import sys
 import time
 
 # qlib libraries
-from qbootstrapper.swapscheduler import Schedule
+from qbootstrapper.swapscheduler import Schedule, _shift_dates
 
 if sys.version_info > (3,):
     long = int
@@ -30,10 +28,56 @@ class Instrument(object):
     '''Base Instrument convenience class
     Class is primarily used for the date adjustment methods that are used
     by the sub-classes.
+
+    Attributes:
+        quote_scale (float) : Change in the quote for a unit change in the
+                              rate of the instrument, in absolute value
+        solver_report (dict): Solver statistics of the last discount_factor
+                              call of a root-found instrument: method,
+                              iterations, evaluations, converged and
+                              residual (per unit notional), or None for
+                              analytic instruments
     '''
+    quote_scale = 1
+    solver_report = None
+
+    def __new__(cls, *args, **kwargs):
+        '''Records the arguments that the instrument is created with, so
+        that the build inputs of a curve can be captured, see
+        qbootstrapper.capture
+        '''
+        instrument = super(Instrument, cls).__new__(cls)
+        instrument._arguments = (args, kwargs)
+        return instrument
+
     def __init__(self):
         pass
 
+    def get_quote(self):
+        '''Returns the market quote of the instrument
+        '''
+        return self.rate
+
+    def set_quote(self, quote):
+        '''Sets the market quote of the instrument. The curve holding the
+        instrument must be rebuilt for the quote to take effect.
+        '''
+        self.rate = quote
+
+    def _solve(self, function):
+        '''Private method that root finds the log discount factor of the
+        instrument's pillar with the solver policy of its curve, from the
+        last pillar of the curve, and records the solver statistics in
+        self.solver_report
+        '''
+        last = self.curve.curve[-1]
+        years = (self._maturity_timestamp - last['timestamp']) / 31536000
+        root, self.solver_report = self.curve.solver.solve(function,
+                                                           last['discount_factor'],
+                                                           years)
+        self.solver_report['residual'] /= self.notional
+        return root
+
     def _date_adjust(self, date, adjustment):
         '''Method to return a date that is adjusted according to the
         adjustment convention method defined
@@ -129,6 +173,76 @@ class Instrument(object):
                             'not recognized'.format(**locals()))
         return accrual_period
 
+    @staticmethod
+    def _daycounts(effectives, maturities, basis):
+        '''Static method to return the accrual lengths, as decimals, for
+        arrays of effective and maturity dates. Vectorized equivalent of the
+        daycount method.
+
+        Arguments:
+            effectives (np.array)   : datetime64[D] array of the first days of
+                                      the accrual periods
+            maturities (np.array)   : datetime64[D] array of the last days of
+                                      the accrual periods
+            basis (str)             : Basis convention, see daycount
+        '''
+        effectives = np.asarray(effectives, dtype='datetime64[D]')
+        maturities = np.asarray(maturities, dtype='datetime64[D]')
+        if basis.lower() == 'act360':
+            return (maturities - effectives).astype(np.float64) / 360
+        elif basis.lower() == 'act365':
+            return (maturities - effectives).astype(np.float64) / 365
+
+        def split(dates):
+            months = dates.astype('datetime64[M]')
+            years = dates.astype('datetime64[Y]')
+            day = (dates - months).astype(np.int64) + 1
+            month = (months - years).astype(np.int64) + 1
+            year = years.astype(np.int64) + 1970
+            return year, month, day
+
+        start_year, start_month, start_day = split(effectives)
+        end_year, end_month, end_day = split(maturities)
+        if basis.lower() == '30360':
+            start, end = np.minimum(start_day, 30), np.minimum(end_day, 30)
+            months = (30 * (end_month - start_month) +
+                      360 * (end_year - start_year))
+            return (end - start + months) / 360
+        elif basis.lower() == '30e360':
+            start = np.maximum(0, 30 - start_day)
+            end = np.minimum(30, end_day)
+            months = 30 * (end_month - start_month - 1)
+            years = 360 * (end_year - start_year)
+            return (years + months + start + end) / 360
+        else:
+            raise Exception('Accrual basis "{basis}" '
+                            'not recognized'.format(**locals()))
+
+    @staticmethod
+    def _overnight_grid(starts, ends):
+        '''Static method to return the concatenated daily fixing dates for a
+        series of overnight accrual periods, along with the offsets of each
+        period into the concatenated array (for use with np.add.reduceat).
+
+        Saturdays and Sundays are replaced by the preceding Friday, so that
+        each Friday compounds 3 times (no new rates on weekends).
+
+        Arguments:
+            starts (np.array)   : datetime64[D] array of accrual start dates
+            ends (np.array)     : datetime64[D] array of accrual end dates
+        '''
+        starts = np.asarray(starts, dtype='datetime64[D]')
+        ends = np.asarray(ends, dtype='datetime64[D]')
+        days = (ends - starts).astype(np.int64)
+        offsets = np.zeros(len(days), dtype=np.int64)
+        offsets[1:] = np.cumsum(days)[:-1]
+        steps = np.arange(days.sum()) - np.repeat(offsets, days)
+        dates = np.repeat(starts, days) + steps.astype('timedelta64[D]')
+        # 1970-01-01 is a Thursday, so Monday is 0 and Friday is 4
+        weekdays = (dates.astype(np.int64) + 3) % 7
+        dates = dates - np.maximum(weekdays - 4, 0).astype('timedelta64[D]')
+        return dates, offsets
+
 
 class LIBORInstrument(Instrument):
     '''LIBOR cash instrument class for use with the Swap Curve bootstrapper.
@@ -273,6 +387,8 @@ class FuturesInstrumentByDates(Instrument):
     TODO: Add FuturesInstrumentByTicker
     TODO: Add Futures convexity calculation
     '''
+    quote_scale = 100
+
     def __init__(self, effective, maturity, price, curve,
                  basis='Act360'):
         # assignments
@@ -288,6 +404,17 @@ class FuturesInstrumentByDates(Instrument):
                                                    self.basis)
         self.instrument_type = 'Futures'
 
+    def get_quote(self):
+        '''Returns the price of the future
+        '''
+        return self.price
+
+    def set_quote(self, quote):
+        '''Sets the price, and the implied rate, of the future
+        '''
+        self.price = quote
+        self.rate = (100 - quote) / 100
+
     def discount_factor(self):
         '''Method for returning the discount factor for a future
         '''
@@ -300,6 +427,9 @@ class SwapInstrument(Instrument):
     '''Base class for swap instruments. See OISSwapInstrument and
     LIBORSwapInstrument for more detailed specs.
     '''
+    # (fixed, floating) schedules generated in advance, see _with_schedules
+    _schedules = None
+
     def __init__(self, effective, maturity, rate, curve,
                  fixed_basis='30360', float_basis='Act360',
                  fixed_length=6, float_length=6,
@@ -339,9 +469,23 @@ class SwapInstrument(Instrument):
 
         self._set_schedules()
 
+    @classmethod
+    def _with_schedules(cls, schedules, *args, **kwargs):
+        '''Private constructor of a swap whose fixed and floating schedules
+        were generated in advance, e.g., by an InstrumentSet, as a tuple of
+        objects with the periods attribute of a Schedule
+        '''
+        instrument = cls.__new__(cls, *args, **kwargs)
+        instrument._schedules = schedules
+        instrument.__init__(*args, **kwargs)
+        return instrument
+
     def _set_schedules(self):
         '''Sets the fixed and floating schedules of the swap.
         '''
+        if self._schedules is not None:
+            self.fixed_schedule, self.float_schedule = self._schedules
+            return
         if hasattr(self, 'second'):
             self.fixed_schedule = Schedule(self.effective, self.maturity,
                                            self.fixed_length,
@@ -483,11 +627,45 @@ class OISSwapInstrument(SwapInstrument):
         super(OISSwapInstrument, self).__init__(*args, **kwargs)
         self.instrument_type = 'OIS_swap'
 
+    def _set_schedules(self):
+        '''Sets the fixed and floating schedules of the swap, and precomputes
+        the date and accrual arrays used to value the swap.
+        '''
+        super(OISSwapInstrument, self)._set_schedules()
+        self._set_leg_arrays()
+
+    def _set_leg_arrays(self):
+        '''Precomputes the date and accrual arrays for both legs, which do
+        not depend on the discount factor guess.
+
+        The daily fixing dates for every floating period are concatenated
+        into a single array, with the offsets of each period kept for
+        per-period compounding with np.add.reduceat.
+        '''
+        float_periods = self.float_schedule.periods
+        fixed_periods = self.fixed_schedule.periods
+
+        first_dates, self._float_offsets = self._overnight_grid(float_periods['accrual_start'],
+                                                                float_periods['accrual_end'])
+        second_dates = first_dates + np.timedelta64(1, 'D')
+        self._fixed_accruals = self._daycounts(fixed_periods['accrual_start'],
+                                               fixed_periods['accrual_end'],
+                                               self.fixed_basis)
+
+        self._splits = np.cumsum([len(first_dates), len(second_dates),
+                                  len(float_periods)])
+        self._dates = np.concatenate([first_dates,
+                                      second_dates,
+                                      float_periods['payment_date'],
+                                      fixed_periods['payment_date']])
+        self._dates = self._dates.astype('<M8[s]').astype(np.float64)
+        self._maturity_timestamp = time.mktime(self.maturity.timetuple())
+
     def discount_factor(self):
         '''Returns the discount factor for the swap using Newton's method
-        root finder.
+        root finder, with the solver policy of the curve.
         '''
-        return scipy.optimize.newton(self._swap_value, 0)
+        return self._solve(self._swap_value)
 
     def _swap_value(self, guess, args=()):
         '''Private method used for root finding discount factor
@@ -498,6 +676,17 @@ class OISSwapInstrument(SwapInstrument):
         each cashflow and PV for each leg, and returns the net value of the pay
         fixed swap.
 
+        The compounded forward rate for each floating period is calculated as
+
+                                     DF[i]
+                                Π [ ------- ] - 1
+                                i   DF[i+1]
+
+        Note that every date needed for both legs is interpolated in a single
+        call, and the products are taken per period as sums of the log
+        discount factor differences. There are 3 entries for every Friday, as
+        each friday should compound 3 times (no new rates on weekends).
+
         Arguments:
             guess (float)   :   guess to be appended to a copy of the attached
                                 curve.
@@ -507,81 +696,28 @@ class OISSwapInstrument(SwapInstrument):
             # simultaneous bootstrapping sets the guess[0] as the ois guess
             guess = guess[0]
 
-        temp_curve = self.curve.curve
-        temp_curve = np.append(self.curve.curve,
-                               np.array([(np.datetime64(self.maturity.strftime('%Y-%m-%d')),
-                                          time.mktime(self.maturity.timetuple()),
-                                          guess)],
-                                        dtype=self.curve.curve.dtype))
-        interpolator = scipy.interpolate.PchipInterpolator(temp_curve['timestamp'],
-                                                           temp_curve['discount_factor'])
+        interpolator = self.curve.interpolant(np.append(self.curve.curve['timestamp'],
+                                                        self._maturity_timestamp),
+                                              np.append(self.curve.curve['discount_factor'],
+                                                        guess))
 
-        for period in self.float_schedule.periods:
-            forward_rate = self.__forward_rate(interpolator, period)
-            period['cashflow'] = forward_rate * self.notional
+        initial_dfs, end_dfs, float_dfs, fixed_dfs = np.split(interpolator(self._dates),
+                                                              self._splits)
 
-        payment_dates = self.float_schedule.periods['payment_date'].astype('<M8[s]')
-        discount_factors = np.exp(interpolator(payment_dates.astype(np.uint64)))
-        self.float_schedule.periods['PV'] = self.float_schedule.periods['cashflow'] * discount_factors
+        forward_rates = np.exp(np.add.reduceat(initial_dfs - end_dfs,
+                                               self._float_offsets)) - 1
+        self.float_schedule.periods['cashflow'] = forward_rates * self.notional
+        self.float_schedule.periods['PV'] = self.float_schedule.periods['cashflow'] * np.exp(float_dfs)
 
         float_leg = self.float_schedule.periods['PV'].sum()
 
-        for period in self.fixed_schedule.periods:
-            forward_rate = self.rate
-            accrual_period = super(OISSwapInstrument,
-                                   self).daycount(period['accrual_start'],
-                                                  period['accrual_end'],
-                                                  self.fixed_basis)
-            period['cashflow'] = forward_rate * accrual_period * self.notional
-
-        payment_dates = self.fixed_schedule.periods['payment_date'].astype('<M8[s]')
-        discount_factors = np.exp(interpolator(payment_dates.astype(np.uint64)))
-        self.fixed_schedule.periods['PV'] = self.fixed_schedule.periods['cashflow'] * discount_factors
+        self.fixed_schedule.periods['cashflow'] = self.rate * self._fixed_accruals * self.notional
+        self.fixed_schedule.periods['PV'] = self.fixed_schedule.periods['cashflow'] * np.exp(fixed_dfs)
 
         fixed_leg = self.fixed_schedule.periods['PV'].sum()
 
         return float_leg - fixed_leg
 
-    def __forward_rate(self, interpolator, period):
-        '''Private method for calculating the compounded forward rate for an OIS
-        swap.
-
-        The compounded forward rate is calculated as the
-
-                                     DF[i]
-                                Π [ ------- ] - 1
-                                i   DF[i+1]
-
-        Note that it achieves very speedily by calculating each forward
-        rate (+ 1) for the entire date array, and then calculating the product
-        of the array. Additionally, there are 3 entries for every Friday, as
-        each friday should compound 3 times (no new rates on weekends).
-
-        Arguments:
-            interpolator (scipy.interpolate):   temporary interpolator object
-                                                that includes the current swap
-                                                maturity guess discount factor.
-            period (np.recarray)            :   1 line of the swapschedule array
-                                                must contain the accrual start
-                                                and end dates
-        '''
-        start_date = period['accrual_start'].astype('<M8[s]')
-        end_date = period['accrual_end'].astype('<M8[s]')
-        one_day = np.timedelta64(1, 'D')
-        start_day = start_date.astype(object).weekday()
-        rate = 1
-        first_dates = np.arange(start_date, end_date, one_day)
-        # replace all Saturdays and Sundays with Fridays
-        fridays = first_dates[4 - start_day::7]
-        first_dates[5 - start_day::7] = fridays[:len(first_dates[5 - start_day::7])]
-        first_dates[6 - start_day::7] = fridays[:len(first_dates[6 - start_day::7])]
-        second_dates = first_dates + one_day
-        initial_dfs = np.exp(interpolator(first_dates))
-        end_dfs = np.exp(interpolator(second_dates))
-        rates = (initial_dfs / end_dfs)
-        rate = rates.prod() - 1
-        return rate
-
 
 class LIBORSwapInstrument(SwapInstrument):
     '''LIBOR swap instrument class for use with Swap Curve bootstrapper.
@@ -696,11 +832,46 @@ class LIBORSwapInstrument(SwapInstrument):
         super(LIBORSwapInstrument, self).__init__(*args, **kwargs)
         self.instrument_type = 'LIBOR_swap'
 
+    def _set_schedules(self):
+        '''Sets the fixed and floating schedules of the swap, and precomputes
+        the date and accrual arrays used to value the swap.
+        '''
+        super(LIBORSwapInstrument, self)._set_schedules()
+        self._set_leg_arrays()
+
+    def _set_leg_arrays(self):
+        '''Precomputes the date and accrual arrays for both legs, which do
+        not depend on the discount factor guess.
+        '''
+        float_periods = self.float_schedule.periods
+        fixed_periods = self.fixed_schedule.periods
+
+        fixing_dates = float_periods['fixing_date']
+        end_dates = _shift_dates(fixing_dates, self.rate_period,
+                                 self.rate_period_length)
+        self._rate_accruals = self._daycounts(fixing_dates, end_dates,
+                                              self.rate_basis)
+        self._float_accruals = self._daycounts(float_periods['accrual_start'],
+                                               float_periods['accrual_end'],
+                                               self.float_basis)
+        self._fixed_accruals = self._daycounts(fixed_periods['accrual_start'],
+                                               fixed_periods['accrual_end'],
+                                               self.fixed_basis)
+
+        self._projection_dates = np.concatenate([fixing_dates, end_dates])
+        self._projection_dates = self._projection_dates.astype('<M8[s]').astype(np.float64)
+        self._splits = [len(float_periods)]
+        self._payment_dates = np.concatenate([float_periods['payment_date'],
+                                              fixed_periods['payment_date']])
+        self._payment_dates = self._payment_dates.astype('<M8[s]').astype(np.float64)
+        self._maturity_timestamp = time.mktime(self.maturity.timetuple())
+
     def discount_factor(self):
         '''Returns the natural log of the discount factor for the swap
-        using Newton's method root finder.
+        using Newton's method root finder, with the solver policy of the
+        curve.
         '''
-        return scipy.optimize.newton(self._swap_value, 0)
+        return self._solve(self._swap_value)
 
     def _swap_value(self, guess, args=()):
         '''Private method used for root finding discount factor
@@ -725,76 +896,34 @@ class LIBORSwapInstrument(SwapInstrument):
             # simultaneous bootstrapping sets the guess[1] as the libor guess
             guess = guess[1]
 
-        temp_curve = self.curve.curve
-        temp_curve = np.append(self.curve.curve,
-                               np.array([(np.datetime64(self.maturity.strftime('%Y-%m-%d')),
-                                          time.mktime(self.maturity.timetuple()),
-                                          guess)],
-                                        dtype=self.curve.curve.dtype))
-        
-        interpolator = scipy.interpolate.PchipInterpolator(temp_curve['timestamp'],
-                                                           temp_curve['discount_factor'])
+        interpolator = self.curve.interpolant(np.append(self.curve.curve['timestamp'],
+                                                        self._maturity_timestamp),
+                                              np.append(self.curve.curve['discount_factor'],
+                                                        guess))
 
         if self.curve.discount_curve is not False:
             discount_curve = self.curve.discount_curve.log_discount_factor
         else:
             discount_curve = interpolator
 
+        # Note that this way minimizes the number of calls to the
+        # interpolator objects
+        initial_dfs, end_dfs = np.split(interpolator(self._projection_dates), 2)
+        float_dfs, fixed_dfs = np.split(discount_curve(self._payment_dates),
+                                        self._splits)
+
         # Floating leg calculations
-        # Note that this way minimizes the number of loops
-        # and calls to the interpolator objects
-        fixing_dates = self.float_schedule.periods['fixing_date'].astype('<M8[s]')
-
-        rate_length = self._timedelta(self.rate_period, self.rate_period_length)
-
-        end_dates = np.empty_like(fixing_dates, dtype=np.uint64)
-        accrual_periods = np.empty_like(fixing_dates, dtype=np.float64)
-        rate_accrual_periods = np.empty_like(fixing_dates, dtype=np.float64)
-
-        for idx, date in enumerate(self.float_schedule.periods['fixing_date']):
-            end_date = date.astype(object) + rate_length
-            end_date = np.datetime64(end_date.isoformat())
-            end_dates[idx] = end_date.astype('<M8[s]').astype(np.uint64)
-            rate_accrual_periods[idx] = super(LIBORSwapInstrument,
-                                              self).daycount(date,
-                                                             end_date,
-                                                             self.rate_basis)
-            accrual_start = self.float_schedule.periods[idx]['accrual_start']
-            accrual_end = self.float_schedule.periods[idx]['accrual_end']
-            accrual_period = super(LIBORSwapInstrument,
-                                   self).daycount(accrual_start,
-                                                  accrual_end,
-                                                  self.float_basis)
-            accrual_periods[idx] = accrual_period
-
-        initial_dfs = np.exp(interpolator(fixing_dates))
-        end_dfs = np.exp(interpolator(end_dates))
-        rate = (initial_dfs / end_dfs - 1) / rate_accrual_periods
-        cashflows = rate * accrual_periods * self.notional
+        rate = (np.exp(initial_dfs - end_dfs) - 1) / self._rate_accruals
+        cashflows = rate * self._float_accruals * self.notional
         self.float_schedule.periods['cashflow'] = cashflows
-
-        payment_dates = self.float_schedule.periods['payment_date'].astype('<M8[s]')
-        self.float_schedule.periods['PV'] = cashflows * np.exp(discount_curve(payment_dates))
+        self.float_schedule.periods['PV'] = cashflows * np.exp(float_dfs)
 
         floating_leg = self.float_schedule.periods['PV'].sum()
 
         # Fixed leg
-        accrual_periods = np.empty(self.fixed_schedule.periods['accrual_end'].size,
-                                   dtype=np.float64)
-
-        for idx, date in enumerate(self.fixed_schedule.periods['accrual_end']):
-            accrual_start = self.fixed_schedule.periods[idx]['accrual_start']
-            accrual_period = super(LIBORSwapInstrument,
-                                   self).daycount(accrual_start,
-                                                  date,
-                                                  self.fixed_basis)
-            accrual_periods[idx] = accrual_period
-
-        cashflows = self.rate * accrual_periods * self.notional
+        cashflows = self.rate * self._fixed_accruals * self.notional
         self.fixed_schedule.periods['cashflow'] = cashflows
-
-        payment_dates = self.fixed_schedule.periods['payment_date'].astype('<M8[s]')
-        self.fixed_schedule.periods['PV'] = cashflows * np.exp(discount_curve(payment_dates))
+        self.fixed_schedule.periods['PV'] = cashflows * np.exp(fixed_dfs)
 
         fixed_leg = self.fixed_schedule.periods['PV'].sum()
 
@@ -860,6 +989,16 @@ class BasisSwapInstrument(SwapInstrument):
 
         self._set_schedules()
 
+    def get_quote(self):
+        '''Returns the leg one spread, the quoted basis of the swap
+        '''
+        return self.leg_one_spread
+
+    def set_quote(self, quote):
+        '''Sets the leg one spread, the quoted basis of the swap
+        '''
+        self.leg_one_spread = quote
+
     def _set_schedules(self):
         '''Sets the schedules of the swap.
         '''
@@ -871,7 +1010,7 @@ class BasisSwapInstrument(SwapInstrument):
                                              penultimate=self.penultimate,
                                              period_adjustment=self.leg_one_period_adjustment,
                                              payment_adjustment=self.leg_one_payment_adjustment)
-            self.leg_two_shcedule = Schedule(self.effective, self.maturity,
+            self.leg_two_schedule = Schedule(self.effective, self.maturity,
                                              self.leg_two_length,
                                              period_length=self.leg_two_period_length,
                                              second=self.second,
@@ -899,6 +1038,49 @@ class AverageIndexBasisSwapInstrument(BasisSwapInstrument):
     def __init__(self, *args, **kwargs):
         super(AverageIndexBasisSwapInstrument, self).__init__(*args, **kwargs)
         self.instrument_type = 'Average_Index_Basis_Swap'
+        self._set_leg_arrays()
+
+    def _set_leg_arrays(self):
+        '''Precomputes the date and accrual arrays for both legs, which do
+        not depend on the discount factor guesses.
+
+        The daily fixing dates for every OIS period are concatenated into a
+        single array, with the offsets of each period kept for per-period
+        averaging with np.add.reduceat.
+        '''
+        leg_one = self.leg_one_schedule.periods
+        leg_two = self.leg_two_schedule.periods
+
+        first_dates, self._leg_one_offsets = self._overnight_grid(leg_one['accrual_start'],
+                                                                  leg_one['accrual_end'])
+        second_dates = first_dates + np.timedelta64(1, 'D')
+        self._leg_one_days = np.diff(np.append(self._leg_one_offsets,
+                                               len(first_dates)))
+        self._leg_one_accruals = self._daycounts(leg_one['accrual_start'],
+                                                 leg_one['accrual_end'],
+                                                 self.leg_one_basis)
+
+        fixing_dates = leg_two['fixing_date']
+        end_dates = _shift_dates(fixing_dates, self.leg_two_rate_period,
+                                 self.leg_two_rate_period_length)
+        self._leg_two_rate_accruals = self._daycounts(fixing_dates, end_dates,
+                                                      self.leg_two_rate_basis)
+        self._leg_two_accruals = self._daycounts(leg_two['accrual_start'],
+                                                 leg_two['accrual_end'],
+                                                 self.leg_two_basis)
+
+        # All the dates that are interpolated on the discount (leg one) and
+        # projection (leg two) curves, in the order they are split
+        self._leg_one_splits = np.cumsum([len(first_dates), len(second_dates),
+                                          len(leg_one)])
+        self._discount_dates = np.concatenate([first_dates,
+                                               second_dates,
+                                               leg_one['payment_date'],
+                                               leg_two['payment_date']])
+        self._discount_dates = self._discount_dates.astype('<M8[s]').astype(np.float64)
+        self._projection_dates = np.concatenate([fixing_dates, end_dates])
+        self._projection_dates = self._projection_dates.astype('<M8[s]').astype(np.float64)
+        self._maturity_timestamp = time.mktime(self.maturity.timetuple())
 
     def discount_factor(self):
         '''Returns the natural log of each of the OIS and LIBOR discount factors
@@ -914,103 +1096,53 @@ class AverageIndexBasisSwapInstrument(BasisSwapInstrument):
         Note that this approach should only be used for a 
         SimultaneousStrippedCurve
 
+        Each curve is interpolated once per guess, on all of the dates that
+        are needed for both legs.
+
         TODO: Seperate cases for when self.curve.curve_type == 
         'Simultaneous_curve' and when not
         '''
         ois_guess = guesses[0]
         libor_guess = guesses[1]
 
-        discount_curve = np.append(self.curve.discount_curve.curve,
-                                  np.array([(np.datetime64(self.maturity.strftime('%Y-%m-%d')),
-                                             time.mktime(self.maturity.timetuple()),
-                                             ois_guess)],
-                                           dtype=self.curve.discount_curve.curve.dtype))
-
-        leg_one_interpolator = scipy.interpolate.PchipInterpolator(discount_curve['timestamp'],
-                                                                   discount_curve['discount_factor'])
-
-        projection_curve = np.append(self.curve.projection_curve.curve,
-                                  np.array([(np.datetime64(self.maturity.strftime('%Y-%m-%d')),
-                                             time.mktime(self.maturity.timetuple()),
-                                             libor_guess)],
-                                           dtype=self.curve.projection_curve.curve.dtype))
-        leg_two_interpolator = scipy.interpolate.PchipInterpolator(projection_curve['timestamp'],
-                                                                   projection_curve['discount_factor'])
-
-        discount_interpolator = leg_one_interpolator
-
-        for period in self.leg_one_schedule.periods:
-            forward_rate = self.__ois_forward_rate(leg_one_interpolator, period)
-            accrual_period = super(AverageIndexBasisSwapInstrument,
-                                   self).daycount(period['accrual_start'],
-                                                  period['accrual_end'],
-                                                  self.leg_one_basis)
-            period['cashflow'] = (forward_rate + self.leg_one_spread) * self.notional * accrual_period
-
-        payment_dates = self.leg_one_schedule.periods['payment_date'].astype('<M8[s]')
-        discount_factors = np.exp(discount_interpolator(payment_dates.astype(np.uint64)))
-        self.leg_one_schedule.periods['PV'] = self.leg_one_schedule.periods['cashflow'] * discount_factors
+        discount_curve = self.curve.discount_curve
+        leg_one_interpolator = discount_curve.interpolant(np.append(discount_curve.curve['timestamp'],
+                                                                    self._maturity_timestamp),
+                                                          np.append(discount_curve.curve['discount_factor'],
+                                                                    ois_guess))
+
+        projection_curve = self.curve.projection_curve
+        leg_two_interpolator = projection_curve.interpolant(np.append(projection_curve.curve['timestamp'],
+                                                                      self._maturity_timestamp),
+                                                            np.append(projection_curve.curve['discount_factor'],
+                                                                      libor_guess))
+
+        discount_dfs = leg_one_interpolator(self._discount_dates)
+        initial_dfs, end_dfs, leg_one_dfs, leg_two_dfs = np.split(discount_dfs,
+                                                                  self._leg_one_splits)
+
+        # OIS leg calculations, the arithmetic average of the daily rates
+        rates = (np.exp(initial_dfs - end_dfs) - 1) * 360
+        forward_rates = (np.add.reduceat(rates, self._leg_one_offsets) /
+                         self._leg_one_days)
+        cashflows = ((forward_rates + self.leg_one_spread) * self.notional *
+                     self._leg_one_accruals)
+        self.leg_one_schedule.periods['cashflow'] = cashflows
+        self.leg_one_schedule.periods['PV'] = cashflows * np.exp(leg_one_dfs)
 
         ois_leg = self.leg_one_schedule.periods['PV'].sum()
 
         # Libor leg calculations
-        # Note that this way minimizes the number of loops
-        # and calls to the interpolator objects
-        fixing_dates = self.leg_two_schedule.periods['fixing_date'].astype('<M8[s]')
-
-        rate_length = self._timedelta(self.leg_two_rate_period, self.leg_two_rate_period_length)
-
-        end_dates = np.empty_like(fixing_dates, dtype=np.uint64)
-        accrual_periods = np.empty_like(fixing_dates, dtype=np.float64)
-        rate_accrual_periods = np.empty_like(fixing_dates, dtype=np.float64)
-
-        for idx, date in enumerate(self.leg_two_schedule.periods['fixing_date']):
-            end_date = date.astype(object) + rate_length
-            end_date = np.datetime64(end_date.isoformat())
-            end_dates[idx] = end_date.astype('<M8[s]').astype(np.uint64)
-            rate_accrual_periods[idx] = super(AverageIndexBasisSwapInstrument,
-                                              self).daycount(date,
-                                                             end_date,
-                                                             self.leg_two_rate_basis)
-            accrual_start = self.leg_two_schedule.periods[idx]['accrual_start']
-            accrual_end = self.leg_one_schedule.periods[idx]['accrual_end']
-            accrual_periods[idx] = super(AverageIndexBasisSwapInstrument,
-                                         self).daycount(accrual_start,
-                                                        accrual_end,
-                                                        self.leg_two_basis)
-
-        initial_dfs = np.exp(leg_two_interpolator(fixing_dates))
-        end_dfs = np.exp(leg_two_interpolator(end_dates))
-        rate = (initial_dfs / end_dfs - 1) / rate_accrual_periods
-        cashflows = (rate + self.leg_two_spread) * accrual_periods * self.notional
+        initial_dfs, end_dfs = np.split(leg_two_interpolator(self._projection_dates), 2)
+        rate = (np.exp(initial_dfs - end_dfs) - 1) / self._leg_two_rate_accruals
+        cashflows = (rate + self.leg_two_spread) * self._leg_two_accruals * self.notional
         self.leg_two_schedule.periods['cashflow'] = cashflows
-
-        payment_dates = self.leg_two_schedule.periods['payment_date'].astype('<M8[s]')
-        self.leg_two_schedule.periods['PV'] = cashflows * np.exp(discount_interpolator(payment_dates.astype(np.uint64)))
+        self.leg_two_schedule.periods['PV'] = cashflows * np.exp(leg_two_dfs)
 
         libor_leg = self.leg_two_schedule.periods['PV'].sum()
 
         return abs(ois_leg - libor_leg)
 
-    def __ois_forward_rate(self, interpolator, period):
-        '''
-        '''
-        start_date = period['accrual_start'].astype('<M8[s]')
-        end_date = period['accrual_end'].astype('<M8[s]')
-        one_day = np.timedelta64(1, 'D')
-        start_day = start_date.astype(object).weekday()
-        first_dates = np.arange(start_date, end_date, one_day)
-        # replace all Saturdays and Sundays with Fridays
-        fridays = first_dates[4 - start_day::7]
-        first_dates[5 - start_day::7] = fridays[:len(first_dates[5 - start_day::7])]
-        first_dates[6 - start_day::7] = fridays[:len(first_dates[6 - start_day::7])]
-        second_dates = first_dates + one_day
-        initial_dfs = np.exp(interpolator(first_dates))
-        end_dfs = np.exp(interpolator(second_dates))
-        rates = ((initial_dfs / end_dfs) - 1) * 360
-        rate = rates.mean()
-        return rate
-
 
 class SimultaneousInstrument(Instrument):
     '''
@@ -1024,9 +1156,27 @@ class SimultaneousInstrument(Instrument):
         self.disp = disp
         self.instrument_type = 'Simultaneous_Instrument'
 
+    def get_quote(self):
+        '''Returns the quotes of the discount and projection instruments as
+        a tuple
+        '''
+        return (self.discount_instrument.get_quote(),
+                self.projection_instrument.get_quote())
+
+    def set_quote(self, quote):
+        '''Sets the quotes of the discount and projection instruments from a
+        tuple
+        '''
+        discount_quote, projection_quote = quote
+        self.discount_instrument.set_quote(discount_quote)
+        self.projection_instrument.set_quote(projection_quote)
+
     def discount_factor(self):
         '''
         '''
+        # imported here rather than with the module, see qbootstrapper.solvers
+        import scipy.optimize
+
         guesses = np.array([-0.000001, -0.000001])
         bounds = ((np.log(0.001), np.log(2)), (np.log(0.001), np.log(2)))
         dfs = scipy.optimize.minimize(self._swap_value,
@@ -1034,6 +1184,12 @@ class SimultaneousInstrument(Instrument):
                                       method=self.method,
                                       bounds=bounds,
                                       options={'disp':self.disp})
+        self.solver_report = {'method': self.method,
+                              'iterations': int(dfs.nit),
+                              'evaluations': int(dfs.nfev),
+                              'converged': bool(dfs.success),
+                              'residual': (float(dfs.fun) /
+                                           self.discount_instrument.notional)}
         return dfs
 
     def _swap_value(self, guesses):
@@ -0,0 +1,411 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the InstrumentSet object, a columnar representation of the
+instruments of a curve.
+
+The instruments are held as typed columns with one entry per instrument
+(the type code, effective and maturity dates, quote and convention id), and
+each distinct set of conventions is stored once. The periods of the fixed
+and floating legs of every swap are generated at once with ScheduleTable
+objects, and each swap finds its periods through its offsets into the
+shared period columns, so there is no Schedule object per swap.
+
+A curve given an InstrumentSet (see Curve.set_instruments) creates its
+instrument objects from the columns when it is built, with the periods
+generated in advance, and only creates them again once the quotes of the
+set change. The quotes are a float64 column, so that quote updates and
+scenario batches are array operations, see set_quotes, with_quotes and
+build_scenarios.
+'''
+# python libraries
+from __future__ import division
+import copy
+import datetime
+import inspect
+import numpy as np
+
+# qlib libraries
+import qbootstrapper.instruments as instruments
+from qbootstrapper.swapscheduler import ScheduleTable, _shift_dates
+
+INSTRUMENT_TYPES = ('cash', 'fra', 'futures', 'ois_swap', 'libor_swap')
+
+INSTRUMENT_CLASSES = {'cash': instruments.LIBORInstrument,
+                      'fra': instruments.FRAInstrumentByDates,
+                      'futures': instruments.FuturesInstrumentByDates,
+                      'ois_swap': instruments.OISSwapInstrument,
+                      'libor_swap': instruments.LIBORSwapInstrument}
+
+SWAP_TYPES = ('ois_swap', 'libor_swap')
+
+# Constructors whose signatures name the arguments of each instrument type,
+# the swap sub-classes taking those of SwapInstrument
+_CONSTRUCTORS = {'cash': instruments.LIBORInstrument.__init__,
+                 'fra': instruments.FRAInstrumentByDates.__init__,
+                 'futures': instruments.FuturesInstrumentByDates.__init__,
+                 'ois_swap': instruments.SwapInstrument.__init__,
+                 'libor_swap': instruments.SwapInstrument.__init__}
+
+# Arguments that are columns rather than conventions
+_QUOTES = ('rate', 'price')
+
+
+class InstrumentSet(object):
+    '''Columnar set of the instruments of a curve
+
+    Arguments:
+        columns (dict or np.recarray)       : Columns of instrument data,
+                                              with one entry per instrument.
+                                              Either a dict of arrays or a
+                                              numpy record array with the
+                                              columns below.
+
+        Required columns
+        ----------------
+        type (str)                          : Instrument type
+                                              available: cash, fra, futures,
+                                                         ois_swap, libor_swap
+        effective (datetime64[D])           : Effective date, or first
+                                              accrual start date
+        quote (float)                       : Rate, or price for futures
+
+        Optional columns
+        ----------------
+        maturity (datetime64[D])            : Maturity date, required for
+                                              every type but cash
+        length (int)                        : Term of the cash instruments,
+                                              in units of their length_type
+                                              convention
+                                              [default: 0]
+        conventions (dict)                  : Keyword arguments of the
+                                              instrument class, e.g.,
+                                              fixed_basis, either one dict
+                                              per instrument or a single dict
+                                              for every instrument
+                                              [default: {}]
+
+    The instruments are sorted by maturity, the order of the pillars of the
+    curve. Swaps with second or penultimate (stub) dates have no periods in
+    the schedule tables, and generate a Schedule when they are created, see
+    ScheduleTable.
+
+    Attributes:
+        type_code (np.array)                : int8 index of the type of each
+                                              instrument in INSTRUMENT_TYPES
+        effective (np.array)                : datetime64[D] effective dates
+        maturity (np.array)                 : datetime64[D] maturity dates
+        length (np.array)                   : int32 term of the cash
+                                              instruments (0 for the others)
+        quote (np.array)                    : float64 quotes
+        convention (np.array)               : int32 index of the conventions
+                                              of each instrument in
+                                              conventions
+        conventions (list)                  : Distinct convention dicts
+        fixed_offsets (np.array)            : int64 array of length n + 1,
+                                              the fixed periods of
+                                              instrument i being
+                                              fixed_offsets[i]:
+                                              fixed_offsets[i + 1] of the
+                                              fixed_schedule columns (empty
+                                              for all but the swaps)
+        float_offsets (np.array)            : Same, for the floating periods
+        fixed_schedule (ScheduleTable)      : Fixed periods of every swap, or
+                                              None if there are no swaps
+        float_schedule (ScheduleTable)      : Floating periods of every swap
+        version (int)                       : Incremented each time the
+                                              quotes are set
+    '''
+    def __init__(self, columns):
+        types = np.atleast_1d(np.asarray(_column(columns, 'type'))).astype(str)
+        size = len(types)
+        unknown = ~np.isin(types, INSTRUMENT_TYPES)
+        if unknown.any():
+            kind = types[unknown][0]
+            raise TypeError('Instrument type "{kind}" not '
+                            'recognized'.format(**locals()))
+
+        kinds, inverse = np.unique(types, return_inverse=True)
+        type_code = np.array([INSTRUMENT_TYPES.index(kind) for kind in kinds],
+                             dtype=np.int8)[inverse.reshape(-1)]
+        effective = _column(columns, 'effective', size).astype('datetime64[D]')
+        maturity = _column(columns, 'maturity', size,
+                           np.datetime64('NaT')).astype('datetime64[D]')
+        length = _column(columns, 'length', size, 0).astype(np.int32)
+        quote = _column(columns, 'quote', size).astype(np.float64)
+        conventions = _column(columns, 'conventions', size, {})
+
+        # conventions are referred to by integer ids into self.conventions
+        self.conventions = []
+        ids = {}
+        convention = np.empty(size, dtype=np.int32)
+        for index, item in enumerate(conventions):
+            key = repr(sorted(item.items()))
+            if key not in ids:
+                ids[key] = len(self.conventions)
+                self.conventions.append(dict(item))
+            convention[index] = ids[key]
+
+        cash = types == 'cash'
+        if cash.any():
+            length_types = [self.conventions[code].get('length_type', 'months')
+                            for code in convention[cash]]
+            maturity[cash] = _shift_dates(effective[cash], length[cash],
+                                          length_types)
+        missing = np.isnat(maturity)
+        if missing.any():
+            kind = types[missing][0]
+            raise Exception('Instruments of type "{kind}" must have a '
+                            'maturity'.format(**locals()))
+
+        order = np.argsort(maturity, kind='stable')
+        self.type_code = type_code[order]
+        self.effective = effective[order]
+        self.maturity = maturity[order]
+        self.length = length[order]
+        self.quote = quote[order]
+        self.convention = convention[order]
+        self.version = 0
+        self._set_schedules()
+
+    def __len__(self):
+        return len(self.type_code)
+
+    @classmethod
+    def from_instruments(cls, instrument_list):
+        '''Creates an InstrumentSet from instrument objects, e.g., the
+        instruments of a curve, with their current quotes. Only the
+        instrument types of INSTRUMENT_CLASSES are supported.
+        '''
+        classes = dict((value, key) for key, value in INSTRUMENT_CLASSES.items())
+        columns = dict((name, []) for name in ('type', 'effective', 'maturity',
+                                               'length', 'quote',
+                                               'conventions'))
+        for instrument in instrument_list:
+            kind = classes.get(type(instrument))
+            if kind is None:
+                name = type(instrument).__name__
+                raise TypeError('Instrument "{name}" not supported by '
+                                'InstrumentSet'.format(**locals()))
+            args, kwargs = instrument._arguments
+            arguments = inspect.signature(_CONSTRUCTORS[kind]).bind(instrument,
+                                                                    *args,
+                                                                    **kwargs)
+            arguments = dict(arguments.arguments)
+            for name in ('self', 'curve') + _QUOTES:
+                arguments.pop(name, None)
+            columns['type'].append(kind)
+            columns['effective'].append(_day(arguments.pop('effective')))
+            columns['maturity'].append(_day(arguments.pop('maturity', None)))
+            columns['length'].append(arguments.pop('term_length', 0))
+            columns['quote'].append(instrument.get_quote())
+            columns['conventions'].append(arguments)
+        return cls(columns)
+
+    def _set_schedules(self):
+        '''Private method to generate the periods of every swap without
+        stub dates, and the offsets of each instrument's periods
+        '''
+        size = len(self)
+        codes = [INSTRUMENT_TYPES.index(kind) for kind in SWAP_TYPES]
+        swaps = np.isin(self.type_code, codes)
+        for index in np.flatnonzero(swaps):
+            conventions = self.conventions[self.convention[index]]
+            if conventions.get('second') or conventions.get('penultimate'):
+                swaps[index] = False
+
+        self.fixed_offsets = np.zeros(size + 1, dtype=np.int64)
+        self.float_offsets = np.zeros(size + 1, dtype=np.int64)
+        self.fixed_schedule = self.float_schedule = None
+        if not swaps.any():
+            return
+
+        defaults = _defaults(instruments.SwapInstrument.__init__)
+        legs = {}
+        for name in ('length', 'period_length', 'period_adjustment',
+                     'payment_adjustment'):
+            for leg in ('fixed', 'float'):
+                key = leg + '_' + name
+                legs[key] = np.array([self.conventions[code].get(key,
+                                                                 defaults[key])
+                                      for code in self.convention[swaps]])
+
+        # swaps generate their schedules with the fixing lag of the
+        # Schedule class, not their own fixing_lag convention
+        for leg in ('fixed', 'float'):
+            table = ScheduleTable(self.effective[swaps], self.maturity[swaps],
+                                  legs[leg + '_length'],
+                                  period_length=legs[leg + '_period_length'],
+                                  period_adjustment=legs[leg + '_period_adjustment'],
+                                  payment_adjustment=legs[leg + '_payment_adjustment'])
+            counts = np.zeros(size, dtype=np.int64)
+            counts[swaps] = np.diff(table.offsets)
+            offsets = getattr(self, leg + '_offsets')
+            offsets[1:] = np.cumsum(counts)
+            setattr(self, leg + '_schedule', table)
+
+    @property
+    def nbytes(self):
+        '''Size of the columns and of the period columns, in bytes
+        '''
+        nbytes = sum(getattr(self, name).nbytes
+                     for name in ('type_code', 'effective', 'maturity',
+                                  'length', 'quote', 'convention',
+                                  'fixed_offsets', 'float_offsets'))
+        for table in (self.fixed_schedule, self.float_schedule):
+            if table is not None:
+                nbytes += sum(getattr(table, name).nbytes
+                              for name in ('fixing_date', 'accrual_start',
+                                           'accrual_end', 'payment_date'))
+        return nbytes
+
+    def types(self):
+        '''Returns the instrument type of each instrument, as an array
+        '''
+        return np.array(INSTRUMENT_TYPES)[self.type_code]
+
+    def set_quotes(self, quotes):
+        '''Sets the quotes of the instruments, in maturity order. Curves
+        built from the set create their instruments again on their next
+        build.
+        '''
+        quotes = np.asarray(quotes, dtype=np.float64)
+        if quotes.shape != self.quote.shape:
+            raise Exception('Expected {0} quotes, got '
+                            '{1}'.format(len(self), len(quotes)))
+        self.quote[:] = quotes
+        self.version += 1
+
+    def with_quotes(self, quotes):
+        '''Returns a copy of the set with other quotes, in maturity order.
+        Every column but the quotes, and the periods, are shared with the
+        set.
+        '''
+        instrument_set = copy.copy(self)
+        instrument_set.quote = self.quote.copy()
+        instrument_set.set_quotes(quotes)
+        return instrument_set
+
+    def instrument(self, index, curve):
+        '''Returns the instrument object of an instrument of the set, for a
+        curve, with the periods generated in advance
+        '''
+        kind = INSTRUMENT_TYPES[self.type_code[index]]
+        cls = INSTRUMENT_CLASSES[kind]
+        conventions = self.conventions[self.convention[index]]
+        effective = _datetime(self.effective[index])
+        quote = float(self.quote[index])
+        if kind == 'cash':
+            return cls(effective, quote, int(self.length[index]), curve,
+                       **conventions)
+
+        args = (effective, _datetime(self.maturity[index]), quote, curve)
+        start, end = self.fixed_offsets[index], self.fixed_offsets[index + 1]
+        if kind not in SWAP_TYPES or start == end:
+            return cls(*args, **conventions)
+        fixed = _LegSchedule(self.fixed_schedule._records(start, end))
+        start, end = self.float_offsets[index], self.float_offsets[index + 1]
+        floating = _LegSchedule(self.float_schedule._records(start, end))
+        return cls._with_schedules((fixed, floating), *args, **conventions)
+
+    def instruments(self, curve):
+        '''Returns the instrument objects of the set for a curve, in
+        maturity order, see instrument
+        '''
+        return [self.instrument(index, curve) for index in range(len(self))]
+
+
+class _LegSchedule(object):
+    '''Private class that holds the periods of a swap leg created from an
+    InstrumentSet, in place of a Schedule
+    '''
+    def __init__(self, periods):
+        self.periods = periods
+
+
+def build_scenarios(curve, quotes):
+    '''Builds a curve once for each row of a matrix of quotes, e.g.,
+    curve.quotes() plus scenario shifts, returning the pillar dates and a
+    scenario x pillar matrix of the log discount factors. The quotes of the
+    curve are restored, and the curve rebuilt, afterwards.
+
+    Arguments:
+        curve (Curve)           : Curve, built from an InstrumentSet or from
+                                  instrument objects
+        quotes (np.array)       : Scenario x instrument matrix of quotes, in
+                                  maturity order
+    '''
+    quotes = np.atleast_2d(np.asarray(quotes, dtype=np.float64))
+    base = curve.quotes()
+    log_dfs = None
+    try:
+        for row, scenario in enumerate(quotes):
+            curve.set_quotes(scenario)
+            curve.build()
+            if log_dfs is None:
+                log_dfs = np.empty((len(quotes), len(curve.curve)))
+            log_dfs[row] = curve.curve['discount_factor']
+    finally:
+        curve.set_quotes(base)
+        curve.build()
+    return curve.curve['maturity'].copy(), log_dfs
+
+
+def _column(columns, name, size=None, default=None):
+    '''Private function to return a column as an array with one entry per
+    instrument, using the default if the column is not in the columns
+    '''
+    if isinstance(columns, dict):
+        present = name in columns
+    else:
+        present = name in columns.dtype.names
+
+    if present:
+        column = columns[name]
+    elif default is not None:
+        column = default
+    else:
+        raise Exception('Instruments must have a "{name}" '
+                        'column'.format(**locals()))
+
+    if name == 'conventions':
+        # a single dict, or a sequence of dicts, as an object array
+        if isinstance(column, dict):
+            column = np.array(column, dtype=object)
+        else:
+            dicts = column
+            column = np.empty(len(dicts), dtype=object)
+            column[:] = list(dicts)
+    else:
+        column = np.asarray(column)
+
+    if column.ndim == 0 and size is not None:
+        column = np.repeat(column, size)
+    return column
+
+
+def _defaults(function):
+    '''Private function to return the keyword argument defaults of a
+    function, as a dict
+    '''
+    return dict((name, parameter.default) for name, parameter
+                in inspect.signature(function).parameters.items()
+                if parameter.default is not inspect.Parameter.empty)
+
+
+def _day(date):
+    '''Private function to return the datetime64[D] of a datetime or None
+    '''
+    if date is None:
+        return np.datetime64('NaT', 'D')
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    return np.datetime64(date, 'D')
+
+
+def _datetime(date):
+    '''Private function to return the datetime of a datetime64[D]
+    '''
+    return datetime.datetime.combine(date.astype(object), datetime.time())
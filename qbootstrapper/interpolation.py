@@ -0,0 +1,330 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the interpolation engines of the log discount factors of a curve
+against the pillar timestamps.
+
+Every engine precomputes, once, a piecewise cubic in the local coordinate
+dx = t - breakpoints[i] for each interval, held as flat arrays of
+breakpoints and coefficients (in the layout of scipy.interpolate.PPoly), and
+looks queries up with np.searchsorted, so evaluation is the same for every
+engine and costs a few array operations whatever the number of dates.
+
+    pchip           : Monotone piecewise cubic Hermite (Fritsch-Carlson) of
+                      the log discount factors, as
+                      scipy.interpolate.PchipInterpolator
+    log_linear      : Linear in the log discount factors, i.e., piecewise
+                      flat instantaneous forwards
+    linear_zero     : Linear in the continuously compounded zero rates
+    monotone_convex : Hagan-West monotone convex interpolation of the
+                      forwards
+    natural_cubic   : Natural cubic spline of the log discount factors
+
+The first timestamp is taken as the effective date of the curve by the
+linear_zero and monotone_convex engines.
+'''
+# python libraries
+from __future__ import division
+import numpy as np
+
+
+class Interpolation(object):
+    '''Base class of the interpolation engines
+
+    Arguments:
+        x (np.array)            : Increasing pillar timestamps
+        y (np.array)            : Log discount factors at the pillars
+
+        kwargs
+        ------
+        extrapolate (bool)      : Whether to extrapolate with the end
+                                  intervals, rather than return nan, outside
+                                  of the pillars
+                                  [default: True]
+
+    Attributes:
+        breakpoints (np.array)  : Breakpoints of the piecewise cubic, the
+                                  pillars and any further knots of the engine
+        coefficients (np.array) : 4 x (breakpoints - 1) array of the cubic,
+                                  quadratic, linear and constant coefficients
+                                  of each interval
+
+    Sub-classes implement _coefficients, which returns the breakpoints and
+    coefficients for the pillars.
+    '''
+    def __init__(self, x, y, extrapolate=True):
+        self.x = np.array(x, dtype=np.float64)
+        self.y = np.array(y, dtype=np.float64)
+        self.extrapolate = extrapolate
+        if self.x.shape != self.y.shape or len(self.x) < 2:
+            raise Exception('Interpolation needs at least 2 pillars, with a '
+                            'log discount factor for each')
+        self.breakpoints, self.coefficients = self._coefficients()
+
+    def __call__(self, dates):
+        '''Returns the interpolated log discount factors at a timestamp, or
+        array of timestamps
+        '''
+        return _evaluate(self.breakpoints, self.coefficients, self.extrapolate,
+                         np.asarray(dates, dtype=np.float64))
+
+    @property
+    def arrays(self):
+        '''Number of arrays held by the interpolant
+        '''
+        return 3 if self.breakpoints is self.x else 4
+
+    @property
+    def nbytes(self):
+        '''Size of the arrays held by the interpolant, in bytes
+        '''
+        nbytes = self.x.nbytes + self.y.nbytes + self.coefficients.nbytes
+        if self.breakpoints is not self.x:
+            nbytes += self.breakpoints.nbytes
+        return nbytes
+
+    def update(self, index, value):
+        '''Sets the log discount factor of a single pillar, recomputing only
+        the coefficients that depend on it where the engine allows
+        '''
+        self.y[index] = value
+        self.breakpoints, self.coefficients = self._coefficients()
+
+    def _coefficients(self):
+        '''Private method to return the breakpoints and coefficients
+        '''
+        raise NotImplementedError
+
+
+class PchipInterpolation(Interpolation):
+    '''Monotone piecewise cubic Hermite interpolation of the log discount
+    factors, with the derivatives and end conditions of
+    scipy.interpolate.PchipInterpolator
+    '''
+    def _coefficients(self):
+        x, y = self.x, self.y
+        h = np.diff(x)
+        slopes = np.diff(y) / h
+        if len(x) == 2:
+            derivatives = np.array([slopes[0], slopes[0]])
+        else:
+            derivatives = np.zeros_like(y)
+            signs = np.sign(slopes)
+            flat = ((signs[1:] != signs[:-1]) | (slopes[1:] == 0) |
+                    (slopes[:-1] == 0))
+            w1 = 2 * h[1:] + h[:-1]
+            w2 = h[1:] + 2 * h[:-1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                harmonic = (w1 / slopes[:-1] + w2 / slopes[1:]) / (w1 + w2)
+            derivatives[1:-1] = np.where(flat, 0, 1 / np.where(flat, 1, harmonic))
+            derivatives[0] = _pchip_end(h[0], h[1], slopes[0], slopes[1])
+            derivatives[-1] = _pchip_end(h[-1], h[-2], slopes[-1], slopes[-2])
+        return x, _hermite(x, y, derivatives)
+
+
+class LogLinearInterpolation(Interpolation):
+    '''Linear interpolation of the log discount factors, i.e., piecewise flat
+    instantaneous forward rates. Moving a pillar only changes the two
+    intervals next to it, so update is O(1).
+    '''
+    def _coefficients(self):
+        coefficients = np.zeros((4, len(self.x) - 1))
+        coefficients[2] = np.diff(self.y) / np.diff(self.x)
+        coefficients[3] = self.y[:-1]
+        return self.x, coefficients
+
+    def update(self, index, value):
+        self.y[index] = value
+        x, y = self.x, self.y
+        for interval in (index - 1, index):
+            if 0 <= interval < len(x) - 1:
+                self.coefficients[2, interval] = ((y[interval + 1] - y[interval]) /
+                                                  (x[interval + 1] - x[interval]))
+                self.coefficients[3, interval] = y[interval]
+
+
+class LinearZeroInterpolation(Interpolation):
+    '''Linear interpolation of the continuously compounded zero rates, where
+    the zero rate at t is -(y(t) - y[0]) / (t - x[0]). The zero rate of the
+    first interval is flat, as it is undefined at the effective date.
+    '''
+    def _coefficients(self):
+        x, y = self.x, self.y
+        tenors = x - x[0]
+        zeros = np.empty_like(y)
+        zeros[1:] = -(y[1:] - y[0]) / tenors[1:]
+        zeros[0] = zeros[1]
+        slopes = np.diff(zeros) / np.diff(x)
+
+        # y(t) = y[0] - (zero[i] + slope * dx) * (tenor[i] + dx)
+        coefficients = np.zeros((4, len(x) - 1))
+        coefficients[1] = -slopes
+        coefficients[2] = -(zeros[:-1] + slopes * tenors[:-1])
+        coefficients[3] = y[:-1]
+        return x, coefficients
+
+
+class MonotoneConvexInterpolation(Interpolation):
+    '''Hagan-West monotone convex interpolation, without the positivity
+    constraint so that negative rates are allowed
+
+    The instantaneous forward of each interval is the discrete forward plus a
+    piecewise quadratic g that integrates to 0 over the interval, so that
+    every pillar is repriced. g splits an interval in two where it is
+    flattened to keep the forwards monotone, and those splits are added to
+    the breakpoints.
+    '''
+    def _coefficients(self):
+        x, y = self.x, self.y
+        h = np.diff(x)
+        discrete = -np.diff(y) / h
+        if len(h) == 1:
+            instantaneous = np.array([discrete[0], discrete[0]])
+        else:
+            instantaneous = np.empty_like(y)
+            instantaneous[1:-1] = (h[:-1] * discrete[1:] +
+                                   h[1:] * discrete[:-1]) / (h[:-1] + h[1:])
+            instantaneous[0] = discrete[0] - (instantaneous[1] - discrete[0]) / 2
+            instantaneous[-1] = discrete[-1] - (instantaneous[-2] - discrete[-1]) / 2
+
+        g0 = instantaneous[:-1] - discrete
+        g1 = instantaneous[1:] - discrete
+        zero = (g0 == 0) & (g1 == 0)
+        one = ~zero & (((g0 < 0) & (-g0 / 2 <= g1) & (g1 <= -2 * g0)) |
+                       ((g0 > 0) & (-g0 / 2 >= g1) & (g1 >= -2 * g0)))
+        two = ~zero & ~one & (((g0 < 0) & (g1 > -2 * g0)) |
+                              ((g0 > 0) & (g1 < -2 * g0)))
+        three = ~zero & ~one & ~two & (((g0 > 0) & (0 > g1) & (g1 > -g0 / 2)) |
+                                       ((g0 < 0) & (0 < g1) & (g1 < -g0 / 2)))
+        four = ~zero & ~one & ~two & ~three
+
+        # each interval is split at eta (in [0, 1]) into two pieces, with g a
+        # quadratic p2 * u ** 2 + p1 * u + p0 of u = (t - x[i]) / h[i] on
+        # each piece
+        with np.errstate(divide='ignore', invalid='ignore'):
+            eta = np.select([two, three, four],
+                            [(g1 + 2 * g0) / (g1 - g0),
+                             3 * g1 / (g1 - g0),
+                             g1 / (g1 + g0)], 1.0)
+            eta = np.clip(np.nan_to_num(eta), 0, 1)
+            level = np.select([two, three, four],
+                              [g0, g1, -g0 * g1 / (g0 + g1)], 0.0)
+            level = np.nan_to_num(level)
+            left = (np.select([three, four], [g0 - g1, g0 - level], 0.0) /
+                    eta ** 2)
+            right = (np.select([two, four], [g1 - g0, g1 - level], 0.0) /
+                     (1 - eta) ** 2)
+        left = np.where(eta > 0, left, 0)
+        right = np.where(eta < 1, right, 0)
+
+        first = np.zeros((3, len(h)))
+        first[0] = np.where(one, 3 * (g0 + g1), left)
+        first[1] = np.where(one, -4 * g0 - 2 * g1, -2 * left * eta)
+        first[2] = np.where(one, g0, np.where(three | four,
+                                              level + left * eta ** 2, g0))
+        second = np.zeros((3, len(h)))
+        second[0] = right
+        second[1] = -2 * right * eta
+        second[2] = np.where(two | four, level + right * eta ** 2, g1)
+
+        starts = np.vstack([np.zeros_like(eta), eta]).T.ravel()
+        ends = np.vstack([eta, np.ones_like(eta)]).T.ravel()
+        pieces = np.stack([first, second], axis=2).reshape(3, -1)
+        interval = np.repeat(np.arange(len(h)), 2)
+        keep = ends > starts
+        starts, pieces, interval = starts[keep], pieces[:, keep], interval[keep]
+        width = h[interval]
+
+        # g relative to the start of the piece, and its integral from the
+        # start of the interval to the start of the piece
+        p2, p1, p0 = pieces
+        q1 = 2 * p2 * starts + p1
+        q0 = (p2 * starts + p1) * starts + p0
+        integral = np.where(starts > 0,
+                            ((first[0][interval] * starts / 3 +
+                              first[1][interval] / 2) * starts +
+                             first[2][interval]) * starts, 0)
+
+        coefficients = np.empty((4, len(starts)))
+        coefficients[0] = -p2 / (3 * width ** 2)
+        coefficients[1] = -q1 / (2 * width)
+        coefficients[2] = -(discrete[interval] + q0)
+        coefficients[3] = y[interval] - width * (discrete[interval] * starts +
+                                                 integral)
+        return np.append(x[interval] + starts * width, x[-1]), coefficients
+
+
+class NaturalCubicInterpolation(Interpolation):
+    '''Natural cubic spline of the log discount factors, with zero second
+    derivatives at the first and last pillars
+    '''
+    def _coefficients(self):
+        x, y = self.x, self.y
+        h = np.diff(x)
+        slopes = np.diff(y) / h
+        second = np.zeros_like(y)
+        if len(x) > 2:
+            size = len(x) - 2
+            matrix = np.zeros((size, size))
+            matrix[np.arange(size), np.arange(size)] = 2 * (h[:-1] + h[1:])
+            matrix[np.arange(1, size), np.arange(size - 1)] = h[1:-1]
+            matrix[np.arange(size - 1), np.arange(1, size)] = h[1:-1]
+            second[1:-1] = np.linalg.solve(matrix, 6 * np.diff(slopes))
+
+        coefficients = np.empty((4, len(h)))
+        coefficients[0] = np.diff(second) / (6 * h)
+        coefficients[1] = second[:-1] / 2
+        coefficients[2] = slopes - h * (2 * second[:-1] + second[1:]) / 6
+        coefficients[3] = y[:-1]
+        return x, coefficients
+
+
+INTERPOLATIONS = {'pchip': PchipInterpolation,
+                  'log_linear': LogLinearInterpolation,
+                  'linear_zero': LinearZeroInterpolation,
+                  'monotone_convex': MonotoneConvexInterpolation,
+                  'natural_cubic': NaturalCubicInterpolation}
+
+
+def _pchip_end(h0, h1, m0, m1):
+    '''Private function to return the one-sided, shape preserving, three
+    point derivative at an end pillar
+    '''
+    derivative = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+    if np.sign(derivative) != np.sign(m0):
+        return 0.
+    if np.sign(m0) != np.sign(m1) and abs(derivative) > 3 * abs(m0):
+        return 3 * m0
+    return derivative
+
+
+def _hermite(x, y, derivatives):
+    '''Private function to return the coefficients of the cubic Hermite
+    interpolant with the given derivatives at the pillars
+    '''
+    h = np.diff(x)
+    slopes = np.diff(y) / h
+    t = (derivatives[:-1] + derivatives[1:] - 2 * slopes) / h
+    coefficients = np.empty((4, len(h)))
+    coefficients[0] = t / h
+    coefficients[1] = (slopes - derivatives[:-1]) / h - t
+    coefficients[2] = derivatives[:-1]
+    coefficients[3] = y[:-1]
+    return coefficients
+
+
+def _evaluate(x, c, extrapolate, dates):
+    '''Private function to evaluate the piecewise cubic with breakpoints x
+    and coefficients c, summed in the order scipy.interpolate.PPoly uses so
+    that the values match it exactly
+    '''
+    interval = np.clip(np.searchsorted(x, dates, 'right') - 1, 0, len(x) - 2)
+    dx = dates - x[interval]
+    square = dx * dx
+    values = (c[3, interval] + c[2, interval] * dx + c[1, interval] * square +
+              c[0, interval] * (square * dx))
+    if not extrapolate:
+        values = np.where((dates < x[0]) | (dates > x[-1]), np.nan, values)
+    return values
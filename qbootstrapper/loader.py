@@ -0,0 +1,500 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the CurveDefinition object, a declarative description of the
+instruments and conventions of a curve, and the CurveLoader object that
+streams quote files into ready-to-build curves for each as-of date.
+
+Quote files are either CSV files with a header row, or JSON lines files with
+one object per line. Each row must contain the keys
+
+    date, curve, instrument, quote
+
+where date is the as-of date (YYYY-MM-DD), curve is the name of a curve
+definition, instrument is the id of an instrument in that definition, and
+quote is the rate (or price for futures). Rows may optionally contain
+effective and maturity dates (YYYY-MM-DD), which override the dates of the
+instrument (e.g., for futures contracts). Each file must be sorted by date,
+so that the files can be read one date at a time.
+'''
+# python libraries
+import csv
+import datetime
+import heapq
+import itertools
+import json
+import numpy as np
+
+# qlib libraries
+import qbootstrapper.curves as curves
+import qbootstrapper.instruments as instruments
+from qbootstrapper.instrumentset import INSTRUMENT_TYPES, InstrumentSet
+
+
+CURVE_TYPES = {'Curve': curves.Curve,
+               'OISCurve': curves.OISCurve,
+               'LIBORCurve': curves.LIBORCurve}
+
+TENOR_UNITS = {'D': ('days', 1),
+               'W': ('weeks', 1),
+               'M': ('months', 1),
+               'Y': ('months', 12)}
+
+
+class CurveDefinition(object):
+    '''Declarative definition of a curve
+
+    The CurveDefinition class holds everything that is needed to create a
+    curve for any as-of date, other than the quotes. The definition can be
+    read from, and written to, a JSON-compatible dict.
+
+    Arguments:
+        name (str)                  : Name of the curve, which is matched
+                                      against the curve column of the quotes
+        instruments (list)          : List of dicts, one per instrument, with
+                                      keys
+                                        id (str)      : instrument id, matched
+                                                        against the instrument
+                                                        column of the quotes
+                                        type (str)    : instrument type
+                                                        available: cash, fra,
+                                                                   futures,
+                                                                   ois_swap,
+                                                                   libor_swap
+                                        tenor (str)   : tenor from the start
+                                                        date, e.g., 5D, 1W,
+                                                        3M, 10Y
+                                      and optionally
+                                        forward_tenor : tenor of the start of
+                                                        the accrual period for
+                                                        fra and futures
+                                        start (str)   : today or spot
+                                                        [default: today for
+                                                         cash, otherwise spot]
+                                        effective,
+                                        maturity (str): fixed dates, instead of
+                                                        tenors
+                                        conventions   : instrument conventions,
+                                                        overriding the curve
+                                                        conventions
+
+        kwargs
+        ------
+        curve_type (str)            : Type of curve
+                                      available: Curve, OISCurve, LIBORCurve
+                                      [default: Curve]
+        discount_curve (str)        : Name of the discount curve for a dual
+                                      curve bootstrap
+                                      [default: None]
+        conventions (dict)          : Conventions for each instrument type,
+                                      keyed by the instrument type, passed to
+                                      the instrument as keyword arguments
+                                      [default: {}]
+        spot_lag (int)              : Business days from the as-of date to
+                                      the spot date
+                                      [default: 2]
+        holidays (list)             : Holiday dates (YYYY-MM-DD) that are not
+                                      business days for the spot date
+                                      [default: []]
+        allow_extrapolation (bool)  : Passed to the curve
+                                      [default: True]
+        interpolation (str)         : Passed to the curve
+                                      [default: pchip]
+        daily_grid (bool)           : Passed to the curve
+                                      [default: False]
+        solver (str)                : Name of the solver policy, passed to
+                                      the curve
+                                      available: default, fast
+                                      [default: default]
+    '''
+    def __init__(self, name, instruments, curve_type='Curve',
+                 discount_curve=None, conventions=None, spot_lag=2,
+                 holidays=None, allow_extrapolation=True,
+                 interpolation='pchip', daily_grid=False, solver='default'):
+        if curve_type not in CURVE_TYPES:
+            raise TypeError('Curve type "{curve_type}" not '
+                            'recognized'.format(**locals()))
+
+        self.name = name
+        self.curve_type = curve_type
+        self.discount_curve = discount_curve
+        self.conventions = conventions or {}
+        self.spot_lag = spot_lag
+        self.holidays = holidays or []
+        self.allow_extrapolation = allow_extrapolation
+        self.interpolation = interpolation
+        self.daily_grid = daily_grid
+        self.solver = solver
+
+        self.instruments = []
+        for spec in instruments:
+            if spec['type'] not in INSTRUMENT_TYPES:
+                raise TypeError('Instrument type "{type}" not '
+                                'recognized'.format(**spec))
+            self.instruments.append(dict(spec))
+        self._instruments = dict((spec['id'], spec) for spec in self.instruments)
+
+    @classmethod
+    def from_dict(cls, data):
+        '''Creates a CurveDefinition from a JSON-compatible dict
+        '''
+        data = dict(data)
+        return cls(data.pop('name'), data.pop('instruments'), **data)
+
+    def to_dict(self):
+        '''Returns the definition as a JSON-compatible dict
+        '''
+        return {'name': self.name,
+                'instruments': [dict(spec) for spec in self.instruments],
+                'curve_type': self.curve_type,
+                'discount_curve': self.discount_curve,
+                'conventions': self.conventions,
+                'spot_lag': self.spot_lag,
+                'holidays': self.holidays,
+                'allow_extrapolation': self.allow_extrapolation,
+                'interpolation': self.interpolation,
+                'daily_grid': self.daily_grid,
+                'solver': self.solver}
+
+    def spot_date(self, as_of):
+        '''Returns the spot date for an as-of date
+        '''
+        spot = np.busday_offset(np.datetime64(as_of.date()), self.spot_lag,
+                                roll='following',
+                                holidays=np.array(self.holidays,
+                                                  dtype='datetime64[D]'))
+        return datetime.datetime.combine(spot.astype(object), datetime.time())
+
+    def curve(self, as_of, quotes, discount_curve=False):
+        '''Returns an unbuilt curve for an as-of date with an instrument for
+        each quote
+
+        Instruments without a quote are left out of the curve.
+
+        Arguments:
+            as_of (datetime)        : As-of (effective) date of the curve
+            quotes (list)           : Quote rows for this curve, each a dict
+                                      with instrument and quote keys, and
+                                      optionally effective and maturity keys
+            discount_curve (Curve)  : Discount curve for a dual curve
+                                      bootstrap
+                                      [default: False]
+        '''
+        curve = self._curve(as_of, discount_curve)
+        spot = self.spot_date(as_of)
+        for row in quotes:
+            spec = self._spec(row)
+            curve.add_instrument(self._instrument(spec, row, as_of, spot, curve))
+        return curve
+
+    def instrument_set(self, as_of, quotes):
+        '''Returns an InstrumentSet for an as-of date with an instrument for
+        each quote, see curve
+        '''
+        spot = self.spot_date(as_of)
+        columns = dict((name, []) for name in ('type', 'effective', 'maturity',
+                                               'length', 'quote',
+                                               'conventions'))
+        for row in quotes:
+            arguments = self._arguments(self._spec(row), row, as_of, spot)
+            for name in columns:
+                columns[name].append(arguments[name])
+        columns['effective'] = np.array(columns['effective'],
+                                        dtype='datetime64[D]')
+        columns['maturity'] = np.array(columns['maturity'],
+                                       dtype='datetime64[D]')
+        return InstrumentSet(columns)
+
+    def columnar_curve(self, as_of, quotes, discount_curve=False):
+        '''Returns an unbuilt curve for an as-of date, as curve, with the
+        instruments set from an InstrumentSet, see Curve.set_instruments
+        '''
+        curve = self._curve(as_of, discount_curve)
+        curve.set_instruments(self.instrument_set(as_of, quotes))
+        return curve
+
+    def _curve(self, as_of, discount_curve):
+        '''Private method to create an empty curve of the definition
+        '''
+        return CURVE_TYPES[self.curve_type](as_of,
+                                            discount_curve=discount_curve,
+                                            allow_extrapolation=self.allow_extrapolation,
+                                            interpolation=self.interpolation,
+                                            daily_grid=self.daily_grid,
+                                            solver=self.solver)
+
+    def _spec(self, row):
+        '''Private method to return the specification of the instrument of
+        a quote row
+        '''
+        try:
+            return self._instruments[row['instrument']]
+        except KeyError:
+            raise Exception('Instrument "{instrument}" not in curve '
+                            'definition "{curve}"'.format(**row))
+
+    def _instrument(self, spec, row, as_of, spot, curve):
+        '''Private method to create a single instrument from its
+        specification and quote
+        '''
+        arguments = self._arguments(spec, row, as_of, spot)
+        kind, quote = arguments['type'], arguments['quote']
+        effective, conventions = arguments['effective'], arguments['conventions']
+        if kind == 'cash':
+            return instruments.LIBORInstrument(effective, quote,
+                                               arguments['length'], curve,
+                                               **conventions)
+
+        maturity = arguments['maturity']
+        if kind == 'fra':
+            return instruments.FRAInstrumentByDates(effective, maturity, quote,
+                                                    curve, **conventions)
+        elif kind == 'futures':
+            return instruments.FuturesInstrumentByDates(effective, maturity,
+                                                        quote, curve,
+                                                        **conventions)
+        elif kind == 'ois_swap':
+            return instruments.OISSwapInstrument(effective, maturity, quote,
+                                                 curve, **conventions)
+        else:
+            return instruments.LIBORSwapInstrument(effective, maturity, quote,
+                                                   curve, **conventions)
+
+    def _arguments(self, spec, row, as_of, spot):
+        '''Private method to return the type, dates, cash length, quote and
+        conventions of a single instrument from its specification and quote,
+        as a dict
+        '''
+        kind = spec['type']
+        conventions = dict(self.conventions.get(kind, {}))
+        conventions.update(spec.get('conventions', {}))
+        quote = float(row['quote'])
+
+        start = spec.get('start', 'today' if kind == 'cash' else 'spot')
+        if start == 'today':
+            start = as_of
+        elif start == 'spot':
+            start = spot
+        else:
+            raise Exception('Start "{start}" not recognized'.format(**locals()))
+
+        arguments = {'type': kind, 'quote': quote, 'conventions': conventions,
+                     'effective': start, 'maturity': None, 'length': 0}
+        if kind == 'cash':
+            length, length_type = parse_tenor(spec['tenor'])
+            conventions.setdefault('length_type', length_type)
+            arguments['length'] = length
+            return arguments
+
+        effective = _date(row.get('effective') or spec.get('effective'))
+        maturity = _date(row.get('maturity') or spec.get('maturity'))
+        if effective is None:
+            effective = start
+            if 'forward_tenor' in spec:
+                effective = start + _timedelta(spec['forward_tenor'])
+        if maturity is None:
+            maturity = start + _timedelta(spec['tenor'])
+        arguments['effective'] = effective
+        arguments['maturity'] = maturity
+        return arguments
+
+
+class CurveLoader(object):
+    '''Streams quote files into ready-to-build curves for each as-of date
+
+    The CurveLoader class reads the quote files lazily, one as-of date at a
+    time, so that histories can be processed without loading them into
+    memory. Iterating over the loader yields tuples of
+
+        (as_of (datetime), curves (dict of name: Curve))
+
+    where the curves are unbuilt, and LIBOR curves are linked to their
+    discount curves for the same date.
+
+    Arguments:
+        definitions (list)  : List of CurveDefinition objects
+        paths (list)        : List of quote files (.csv or .jsonl/.json),
+                              each sorted by date
+
+        kwargs
+        ------
+        start (datetime)    : First as-of date to load
+                              [default: None]
+        end (datetime)      : Last as-of date to load
+                              [default: None]
+    '''
+    def __init__(self, definitions, paths, start=None, end=None):
+        self.definitions = order_definitions(definitions)
+        self.paths = list(paths)
+        self.start = start
+        self.end = end
+
+    def __iter__(self):
+        for as_of, rows in self.dates():
+            yield as_of, build_curve_set(self.definitions, as_of, rows)
+
+    def dates(self):
+        '''Generator of (as_of, quote rows) for each as-of date in the
+        quote files, without creating any curves
+        '''
+        names = set(definition.name for definition in self.definitions)
+        for as_of, rows in iter_quote_dates(self.paths):
+            if self.start is not None and as_of < self.start:
+                continue
+            if self.end is not None and as_of > self.end:
+                break
+            yield as_of, [row for row in rows if row['curve'] in names]
+
+
+def parse_tenor(tenor):
+    '''Converts a tenor string (e.g., 5D, 1W, 3M, 10Y) to a tuple of the
+    length and the length type, e.g., (120, 'months') for 10Y
+    '''
+    tenor = tenor.strip().upper()
+    try:
+        length_type, multiplier = TENOR_UNITS[tenor[-1]]
+        length = int(tenor[:-1])
+    except (KeyError, ValueError, IndexError):
+        raise Exception('Tenor "{tenor}" not recognized'.format(**locals()))
+    return length * multiplier, length_type
+
+
+def _timedelta(tenor):
+    '''Private function to convert a tenor string to a relativedelta
+    '''
+    return instruments.Instrument._timedelta(*parse_tenor(tenor))
+
+
+def _date(value):
+    '''Private function to parse a YYYY-MM-DD string to a datetime
+    '''
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.strptime(str(value)[:10], '%Y-%m-%d')
+
+
+def load_definitions(path):
+    '''Reads a JSON file with a list of curve definitions, returning a list
+    of CurveDefinition objects
+    '''
+    with open(path) as definitions:
+        return [CurveDefinition.from_dict(data) for data in json.load(definitions)]
+
+
+def order_definitions(definitions):
+    '''Returns the curve definitions ordered so that every discount curve
+    comes before the curves that are discounted on it
+    '''
+    remaining = dict((definition.name, definition) for definition in definitions)
+    ordered = []
+    while remaining:
+        ready = [definition for definition in remaining.values()
+                 if definition.discount_curve not in remaining]
+        if not ready:
+            raise Exception('Curve definitions have circular discount curve '
+                            'dependencies')
+        for definition in sorted(ready, key=lambda definition: definition.name):
+            ordered.append(definition)
+            del remaining[definition.name]
+    return ordered
+
+
+def build_curve_set(definitions, as_of, rows, columnar=False, failures=None):
+    '''Returns a dict of unbuilt curves for an as-of date from the quote
+    rows of that date, with LIBOR curves linked to their discount curves
+
+    Curves without quotes on the date are left out. A curve with quotes
+    whose discount curve has none cannot be created: an Exception is raised,
+    or if a failures dict is passed, the curve is added to it with the
+    error message and left out.
+
+    Arguments:
+        definitions (list)  : List of CurveDefinition objects, ordered as by
+                              order_definitions
+        as_of (datetime)    : As-of date of the curves
+        rows (list)         : Quote rows for the date
+
+        kwargs
+        ------
+        columnar (bool)     : Create the curves with InstrumentSets (see
+                              CurveDefinition.columnar_curve) rather than
+                              instrument objects, which is faster for curves
+                              that are only built
+                              [default: False]
+        failures (dict)     : Dict of curve name to error message to add the
+                              curves that cannot be created to
+                              [default: None]
+    '''
+    quotes = dict((definition.name, []) for definition in definitions)
+    for row in rows:
+        if row['curve'] in quotes:
+            quotes[row['curve']].append(row)
+
+    curve_set = {}
+    for definition in definitions:
+        if not quotes[definition.name]:
+            continue
+        discount_curve = False
+        if definition.discount_curve is not None:
+            if definition.discount_curve not in curve_set:
+                error = _missing_discount_curve(definition, as_of, failures)
+                if failures is None:
+                    raise Exception(error)
+                failures[definition.name] = error
+                continue
+            discount_curve = curve_set[definition.discount_curve]
+        create = definition.columnar_curve if columnar else definition.curve
+        curve_set[definition.name] = create(as_of, quotes[definition.name],
+                                            discount_curve=discount_curve)
+    return curve_set
+
+
+def _missing_discount_curve(definition, as_of, failures):
+    '''Private function to return the error message for a curve whose
+    discount curve was not created
+    '''
+    name = definition.name
+    discount_curve = definition.discount_curve
+    date = as_of.strftime('%Y-%m-%d')
+    if failures is not None and discount_curve in failures:
+        return ('Discount curve "{discount_curve}" of curve "{name}" could '
+                'not be created on {date}'.format(**locals()))
+    return ('Discount curve "{discount_curve}" of curve "{name}" has no '
+            'quotes on {date}'.format(**locals()))
+
+
+def read_quotes(path):
+    '''Generator of quote rows (dicts) from a CSV or JSON lines quote file,
+    with the date parsed to a datetime
+    '''
+    with open(path) as quote_file:
+        if path.endswith('.csv'):
+            rows = csv.DictReader(quote_file)
+        else:
+            rows = (json.loads(line) for line in quote_file if line.strip())
+        last = None
+        for row in rows:
+            row['date'] = _date(row['date'])
+            if last is not None and row['date'] < last:
+                raise Exception('Quote file "{path}" is not sorted by '
+                                'date'.format(**locals()))
+            last = row['date']
+            yield row
+
+
+def iter_quote_dates(paths):
+    '''Generator of (as_of, quote rows) for each date in a set of quote files,
+    merging the files by date
+    '''
+    def keyed(index, path):
+        for position, row in enumerate(read_quotes(path)):
+            yield row['date'], index, position, row
+
+    merged = heapq.merge(*[keyed(index, path)
+                           for index, path in enumerate(paths)])
+    for as_of, group in itertools.groupby(merged, key=lambda entry: entry[0]):
+        yield as_of, [entry[-1] for entry in group]
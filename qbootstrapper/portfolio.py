@@ -0,0 +1,540 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the SwapPortfolio object that values many fixed/float interest
+rate swaps at once over a set of built curves.
+
+The trades are held as columns (one entry per trade) and the periods of all
+of the swaps are generated with ScheduleTable objects, so there is no
+Instrument or Schedule object per trade. The floating rates are projected
+with the same formulas as the OISSwapInstrument and LIBORSwapInstrument
+objects, and each curve is interpolated in a single call per valuation.
+'''
+# python libraries
+from __future__ import division
+import numpy as np
+
+# qlib libraries
+from qbootstrapper.instruments import Instrument
+from qbootstrapper.swapscheduler import ScheduleTable, _shift_dates
+
+
+TRADE_DEFAULTS = {'notional': 100,
+                  'spread': 0,
+                  'index': 'LIBOR',
+                  'discount_curve': None,
+                  'fixed_basis': '30360',
+                  'float_basis': 'Act360',
+                  'fixed_length': 6,
+                  'float_length': 6,
+                  'fixed_period_length': 'months',
+                  'float_period_length': 'months',
+                  'fixed_period_adjustment': 'unadjusted',
+                  'float_period_adjustment': 'unadjusted',
+                  'fixed_payment_adjustment': 'unadjusted',
+                  'float_payment_adjustment': 'unadjusted',
+                  'fixing_lag': 2,
+                  'rate_period': 6,
+                  'rate_period_length': 'months',
+                  'rate_basis': 'Act360'}
+
+LEG_DTYPE = [('swap', np.int64),
+             ('fixing_date', 'datetime64[D]'),
+             ('accrual_start', 'datetime64[D]'),
+             ('accrual_end', 'datetime64[D]'),
+             ('payment_date', 'datetime64[D]'),
+             ('accrual_period', np.float64),
+             ('rate', np.float64),
+             ('cashflow', np.float64),
+             ('discount_factor', np.float64),
+             ('PV', np.float64)]
+
+
+class SwapPortfolio(object):
+    '''Columnar portfolio of pay fixed interest rate swaps
+
+    The SwapPortfolio class holds the trades and precomputes their schedules
+    and accrual periods once, so that the portfolio can be valued repeatedly
+    (e.g., over many curve sets) with the price method.
+
+    Arguments:
+        trades (dict or np.recarray)        : Columns of trade data, with one
+                                              entry per trade. Either a dict
+                                              of arrays or a numpy record
+                                              array with the columns below.
+
+        Required columns
+        ----------------
+        effective (datetime64[D])           : First accrual start date
+        maturity (datetime64[D])            : Last accrual end date
+        rate (float)                        : Fixed rate
+        projection_curve (string)           : Name of the curve used to
+                                              project the floating rates
+
+        Optional columns
+        ----------------
+        notional (float)                    : Notional of the swap, use a
+                                              negative notional for receive
+                                              fixed swaps
+                                              [default: 100]
+        spread (float)                      : Spread over the floating rate
+                                              [default: 0]
+        index (string)                      : Floating rate index type
+                                              available: OIS, LIBOR
+                                              [default: LIBOR]
+        discount_curve (string)             : Name of the curve used to
+                                              discount the cashflows
+                                              [default: the projection_curve]
+        fixed_basis, float_basis,
+        fixed_length, float_length,
+        fixed_period_length, float_period_length,
+        fixed_period_adjustment, float_period_adjustment,
+        fixed_payment_adjustment, float_payment_adjustment,
+        rate_period, rate_period_length,
+        rate_basis                          : Swap conventions, as for the
+                                              SwapInstrument class. Note that
+                                              the rate_period defaults to
+                                              6 months, for 6M LIBOR
+        fixing_lag (int)                    : Fixing lag for the floating
+                                              fixing dates, as for the
+                                              Schedule class
+                                              [default: 2]
+
+    Attributes:
+        fixed_schedule (ScheduleTable)      : Periods of the fixed legs
+        float_schedule (ScheduleTable)      : Periods of the floating legs
+    '''
+    def __init__(self, trades):
+        self.size = len(np.atleast_1d(trades['maturity']))
+        columns = {}
+        for name in ('effective', 'maturity', 'rate', 'projection_curve'):
+            columns[name] = self._column(trades, name)
+        for name, default in TRADE_DEFAULTS.items():
+            columns[name] = self._column(trades, name, default)
+
+        self.effective = columns['effective'].astype('datetime64[D]')
+        self.maturity = columns['maturity'].astype('datetime64[D]')
+        self.rate = columns['rate'].astype(np.float64)
+        self.notional = columns['notional'].astype(np.float64)
+        self.spread = columns['spread'].astype(np.float64)
+        self.index = np.char.upper(columns['index'].astype(str))
+        self.projection_curve = columns['projection_curve'].astype(str)
+        discount_curve = columns['discount_curve']
+        missing = np.equal(discount_curve, None)
+        self.discount_curve = np.where(missing, self.projection_curve,
+                                       discount_curve).astype(str)
+
+        # curves are referred to by integer codes into curve_names
+        self.curve_names, codes = np.unique(np.append(self.projection_curve,
+                                                      self.discount_curve),
+                                            return_inverse=True)
+        self._projection_codes = codes[:self.size]
+        self._discount_codes = codes[self.size:]
+
+        unknown = ~np.isin(self.index, ['OIS', 'LIBOR'])
+        if unknown.any():
+            index = self.index[unknown][0]
+            raise Exception('Index "{index}" not recognized'.format(**locals()))
+
+        self._set_schedules(columns)
+
+    def __len__(self):
+        return self.size
+
+    def _column(self, trades, name, default=None):
+        '''Private method to return a trade column as an array with one entry
+        per trade, using the default if the column is not in the trades
+        '''
+        if isinstance(trades, dict):
+            present = name in trades
+        else:
+            present = name in trades.dtype.names
+
+        if present:
+            column = np.asarray(trades[name])
+        elif default is not None or name in TRADE_DEFAULTS:
+            column = np.asarray(default, dtype=object if default is None else None)
+        else:
+            raise Exception('Trades must have a "{name}" column'.format(**locals()))
+
+        if column.ndim == 0:
+            column = np.repeat(column, self.size)
+        return column
+
+    @staticmethod
+    def _daycounts(starts, ends, bases, swap):
+        '''Private method to calculate the accrual periods for arrays of
+        periods, with the basis of each trade and the trade of each period
+        '''
+        accruals = np.empty(len(starts), dtype=np.float64)
+        for basis in np.unique(bases):
+            mask = (bases == basis)[swap]
+            accruals[mask] = Instrument._daycounts(starts[mask], ends[mask],
+                                                   basis)
+        return accruals
+
+    def _set_schedules(self, columns):
+        '''Private method to generate the schedules of both legs and
+        precompute the accrual periods and rate end dates
+        '''
+        self.fixed_schedule = ScheduleTable(self.effective, self.maturity,
+                                            columns['fixed_length'],
+                                            period_length=columns['fixed_period_length'],
+                                            period_adjustment=columns['fixed_period_adjustment'],
+                                            payment_adjustment=columns['fixed_payment_adjustment'],
+                                            fixing_lag=columns['fixing_lag'])
+        self.float_schedule = ScheduleTable(self.effective, self.maturity,
+                                            columns['float_length'],
+                                            period_length=columns['float_period_length'],
+                                            period_adjustment=columns['float_period_adjustment'],
+                                            payment_adjustment=columns['float_payment_adjustment'],
+                                            fixing_lag=columns['fixing_lag'])
+
+        fixed, floating = self.fixed_schedule, self.float_schedule
+        self._fixed_accruals = self._daycounts(fixed.accrual_start,
+                                               fixed.accrual_end,
+                                               columns['fixed_basis'],
+                                               fixed.swap)
+        self._float_accruals = self._daycounts(floating.accrual_start,
+                                               floating.accrual_end,
+                                               columns['float_basis'],
+                                               floating.swap)
+
+        # LIBOR periods fix on the fixing date for the rate period, OIS
+        # periods compound daily over the accrual period
+        self._ois_periods = (self.index == 'OIS')[floating.swap]
+        libor = ~self._ois_periods
+        swap = floating.swap[libor]
+        self._rate_ends = _shift_dates(floating.fixing_date[libor],
+                                       columns['rate_period'][swap],
+                                       columns['rate_period_length'][swap])
+        self._rate_accruals = self._daycounts(floating.fixing_date[libor],
+                                              self._rate_ends,
+                                              columns['rate_basis'],
+                                              swap)
+
+    def price(self, curves):
+        '''Values every swap in the portfolio, returning a PortfolioValuation
+
+        Arguments:
+            curves (dict)   : Curves (built or not) keyed by the names used
+                              in the projection_curve and discount_curve
+                              columns
+        '''
+        fixed, floating = self.fixed_schedule, self.float_schedule
+        lookup = _CurveLookup(self.curve_names)
+
+        # Floating rate projections
+        projection_curves = self._projection_codes[floating.swap]
+        libor = ~self._ois_periods
+        fixing_handles = lookup.add(projection_curves[libor],
+                                    floating.fixing_date[libor])
+        end_handles = lookup.add(projection_curves[libor], self._rate_ends)
+        ois_handles = lookup.add_overnight(projection_curves[self._ois_periods],
+                                           floating.accrual_start[self._ois_periods],
+                                           floating.accrual_end[self._ois_periods])
+
+        # Discounting
+        float_handles = lookup.add(self._discount_codes[floating.swap],
+                                   floating.payment_date)
+        fixed_handles = lookup.add(self._discount_codes[fixed.swap],
+                                   fixed.payment_date)
+
+        lookup.evaluate(curves)
+
+        float_rates = np.empty(len(floating.swap), dtype=np.float64)
+        initial_dfs = lookup.get(fixing_handles)
+        end_dfs = lookup.get(end_handles)
+        float_rates[libor] = (np.exp(initial_dfs - end_dfs) - 1) / self._rate_accruals
+        float_rates[self._ois_periods] = (lookup.get(ois_handles) /
+                                          self._float_accruals[self._ois_periods])
+
+        float_leg = self._leg(floating, self._float_accruals,
+                              float_rates + self.spread[floating.swap],
+                              np.exp(lookup.get(float_handles)))
+        fixed_leg = self._leg(fixed, self._fixed_accruals,
+                              self.rate[fixed.swap],
+                              np.exp(lookup.get(fixed_handles)))
+        return PortfolioValuation(self, fixed_leg, float_leg)
+
+    def pillar_sensitivities(self, curves, bump=1e-6, valuation=None):
+        '''Returns the sensitivity of the PV of each swap to the pillar log
+        discount factors of each curve, as a dict of swaps x pillars arrays
+        keyed by curve name. The pillar at the effective date of each curve,
+        which is fixed, is left out.
+
+        The sensitivities to the interpolated log discount factors are
+        calculated analytically from the valuation, and mapped to the
+        pillars with the Jacobian of the interpolant on a daily grid.
+
+        Arguments:
+            curves (dict)   : Built Curve objects keyed by name, as for price
+
+            kwargs
+            ------
+            bump (float)    : Size of the pillar log discount factor bumps
+                              used to calculate the Jacobian of the
+                              interpolant by central differences
+                              [default: 1e-6]
+            valuation (PortfolioValuation)
+                            : Valuation of the portfolio on the curves, to
+                              save pricing it again
+                              [default: None]
+        '''
+        # imported here rather than with the module, see qbootstrapper.solvers
+        import scipy.sparse
+
+        if valuation is None:
+            valuation = self.price(curves)
+        fixed, floating = self.fixed_schedule, self.float_schedule
+        fixed_leg, float_leg = valuation.fixed_leg, valuation.float_leg
+        libor, ois = ~self._ois_periods, self._ois_periods
+        projection_codes = self._projection_codes[floating.swap]
+
+        # (curve codes, swaps, dates, end dates, weights) of each term, with
+        # the weight the sensitivity to the log discount factor at the date,
+        # or for overnight terms to the log discount factors compounded
+        # between the dates
+        rates = float_leg['rate'] - self.spread[floating.swap]
+        libor_weights = (float_leg['accrual_period'] * float_leg['discount_factor'] *
+                         self.notional[floating.swap])[libor]
+        libor_weights *= (1 + rates[libor] * self._rate_accruals) / self._rate_accruals
+        ois_weights = (self.notional[floating.swap] * float_leg['discount_factor'] *
+                       (1 + rates * float_leg['accrual_period']))[ois]
+        terms = [(self._discount_codes[fixed.swap], fixed.swap,
+                  fixed.payment_date, None, -fixed_leg['PV']),
+                 (self._discount_codes[floating.swap], floating.swap,
+                  floating.payment_date, None, float_leg['PV']),
+                 (projection_codes[libor], floating.swap[libor],
+                  floating.fixing_date[libor], None, libor_weights),
+                 (projection_codes[libor], floating.swap[libor],
+                  self._rate_ends, None, -libor_weights),
+                 (projection_codes[ois], floating.swap[ois],
+                  floating.accrual_start[ois], floating.accrual_end[ois],
+                  ois_weights)]
+
+        sensitivities = {}
+        for code, name in enumerate(self.curve_names):
+            masks = [term[0] == code for term in terms]
+            dates = []
+            for mask, (_, _, starts, ends, _) in zip(masks, terms):
+                dates.append(starts[mask])
+                if ends is not None:
+                    dates.append(ends[mask])
+            dates = np.concatenate(dates)
+            if not len(dates):
+                continue
+            curve = curves[name]
+            first = dates.min() - np.timedelta64(2, 'D')
+            grid = np.arange(first, dates.max() + np.timedelta64(2, 'D'))
+            jacobian = _interpolation_jacobian(curve, grid, bump)
+
+            # cumulative sensitivities of the overnight compounding, with
+            # Saturdays and Sundays taking the preceding Friday's rate
+            fixings = _fixing_rows(grid[2], grid[-1], first)
+            cumulative = np.zeros((len(fixings) + 1, jacobian.shape[1]))
+            np.cumsum(jacobian[fixings] - jacobian[fixings + 1], axis=0,
+                      out=cumulative[1:])
+
+            # swaps x dates weights, for the Jacobian and cumulative rows
+            swaps, rows, weights = [[], []], [[], []], [[], []]
+            for mask, (_, term_swaps, starts, ends, term_weights) in zip(masks, terms):
+                if ends is None:
+                    swaps[0].append(term_swaps[mask])
+                    rows[0].append((starts[mask] - first).astype(np.int64))
+                    weights[0].append(term_weights[mask])
+                else:
+                    swaps[1].extend([term_swaps[mask]] * 2)
+                    rows[1].extend([(ends[mask] - first).astype(np.int64) - 2,
+                                    (starts[mask] - first).astype(np.int64) - 2])
+                    weights[1].extend([term_weights[mask], -term_weights[mask]])
+            result = np.zeros((self.size, jacobian.shape[1]))
+            for matrix, term_swaps, term_rows, term_weights in zip((jacobian, cumulative),
+                                                                   swaps, rows, weights):
+                if term_swaps:
+                    matrix_weights = scipy.sparse.csr_matrix((np.concatenate(term_weights),
+                                                              (np.concatenate(term_swaps),
+                                                               np.concatenate(term_rows))),
+                                                             shape=(self.size, len(matrix)))
+                    result += matrix_weights.dot(matrix)
+            sensitivities[name] = result
+        return sensitivities
+
+    def _leg(self, schedule, accruals, rates, discount_factors):
+        '''Private method to return the flat leg detail record array
+        '''
+        leg = np.recarray(len(schedule.swap), dtype=LEG_DTYPE)
+        leg['swap'] = schedule.swap
+        leg['fixing_date'] = schedule.fixing_date
+        leg['accrual_start'] = schedule.accrual_start
+        leg['accrual_end'] = schedule.accrual_end
+        leg['payment_date'] = schedule.payment_date
+        leg['accrual_period'] = accruals
+        leg['rate'] = rates
+        leg['cashflow'] = rates * accruals * self.notional[schedule.swap]
+        leg['discount_factor'] = discount_factors
+        leg['PV'] = leg['cashflow'] * discount_factors
+        return leg
+
+
+class PortfolioValuation(object):
+    '''Results of the valuation of a SwapPortfolio
+
+    Attributes:
+        pv (np.array)           : PV of each pay fixed swap
+        fixed_pv (np.array)     : PV of the fixed leg of each swap
+        float_pv (np.array)     : PV of the floating leg of each swap
+        annuity (np.array)      : PV of a 1 (i.e., 100%) fixed rate on the
+                                  fixed leg of each swap
+        par_rate (np.array)     : Fixed rate that sets the PV of each swap
+                                  to 0
+        fixed_leg (np.recarray) : Period detail of every fixed leg, with
+                                  the swap column indexing the trades
+        float_leg (np.recarray) : Period detail of every floating leg, with
+                                  the swap column indexing the trades
+    '''
+    def __init__(self, portfolio, fixed_leg, float_leg):
+        size = len(portfolio)
+        self.fixed_leg = fixed_leg
+        self.float_leg = float_leg
+        self.fixed_pv = np.bincount(fixed_leg['swap'], fixed_leg['PV'],
+                                    minlength=size)
+        self.float_pv = np.bincount(float_leg['swap'], float_leg['PV'],
+                                    minlength=size)
+        self.pv = self.float_pv - self.fixed_pv
+        self.annuity = np.bincount(fixed_leg['swap'],
+                                   (fixed_leg['accrual_period'] *
+                                    fixed_leg['discount_factor'] *
+                                    portfolio.notional[fixed_leg['swap']]),
+                                   minlength=size)
+        spread_pv = np.bincount(float_leg['swap'],
+                                (float_leg['accrual_period'] *
+                                 float_leg['discount_factor'] *
+                                 portfolio.notional[float_leg['swap']]),
+                                minlength=size) * portfolio.spread
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.par_rate = (self.float_pv - spread_pv) / self.annuity
+
+
+def _interpolation_jacobian(curve, dates, bump):
+    '''Private function to return the dates x pillars Jacobian of the
+    interpolated log discount factors of a built curve to its pillar log
+    discount factors (excluding the effective date), by central differences
+
+    A single interpolant is bumped in place with Interpolation.update, which
+    is O(1) per pillar for the local engines.
+    '''
+    timestamps = dates.astype('<M8[s]').astype(np.float64)
+    log_dfs = curve.curve['discount_factor']
+    interpolant = curve.interpolant(curve.curve['timestamp'], log_dfs,
+                                    extrapolate=curve.allow_extrapolation)
+    jacobian = np.empty((len(dates), len(log_dfs) - 1))
+    for pillar in range(1, len(log_dfs)):
+        interpolant.update(pillar, log_dfs[pillar] + bump)
+        up = interpolant(timestamps)
+        interpolant.update(pillar, log_dfs[pillar] - bump)
+        down = interpolant(timestamps)
+        interpolant.update(pillar, log_dfs[pillar])
+        jacobian[:, pillar - 1] = (up - down) / (2 * bump)
+    return jacobian
+
+
+def _fixing_rows(first, last, origin):
+    '''Private function to return the rows, on a daily grid starting at
+    origin, of the overnight fixings of every day from first up to (not
+    including) last, see Instrument._overnight_grid
+    '''
+    fixings, _ = Instrument._overnight_grid([first], [last])
+    return (fixings - origin).astype(np.int64)
+
+
+class _CurveLookup(object):
+    '''Private helper that collects all of the dates that are needed from
+    each curve, so that each curve is interpolated in a single call.
+
+    Overnight (OIS) compounding is calculated from a daily grid of log
+    discount factors for each curve, with the compounded rate of each period
+    taken as a difference of the cumulative sums of the daily log forward
+    discount factors. Saturdays and Sundays take the preceding Friday's rate,
+    as with Instrument._overnight_grid.
+    '''
+    def __init__(self, names):
+        self.names = names
+        self._dates = {}
+        self._sizes = {}
+        self._values = {}
+        self._overnight = []
+
+    def _register(self, name, dates):
+        '''Private method to queue dates on a curve, returning their slice
+        '''
+        start = self._sizes.get(name, 0)
+        self._dates.setdefault(name, []).append(dates)
+        self._sizes[name] = start + len(dates)
+        return slice(start, self._sizes[name])
+
+    def add(self, codes, dates):
+        '''Queues an array of dates, each on the curve with the same index
+        in codes. Returns a handle for the get method
+        '''
+        handles = []
+        for code, name in enumerate(self.names):
+            mask = codes == code
+            if mask.any():
+                handles.append((name, mask, self._register(name, dates[mask])))
+        return (len(codes), handles)
+
+    def add_overnight(self, codes, starts, ends):
+        '''Queues overnight compounding periods, each on the curve with the
+        same index in codes. Returns a handle for the get method, which
+        will return the compounded rate (not annualized) of each period
+        '''
+        handles = []
+        for code, name in enumerate(self.names):
+            mask = codes == code
+            if not mask.any():
+                continue
+            first, last = starts[mask].min(), ends[mask].max()
+            grid = np.arange(first - np.timedelta64(2, 'D'),
+                             last + np.timedelta64(1, 'D'))
+            handle = (name, mask, self._register(name, grid),
+                      first, starts[mask], ends[mask])
+            handles.append(handle)
+            self._overnight.append(handle)
+        return (len(codes), handles)
+
+    def evaluate(self, curves):
+        '''Interpolates every queued date on its curve
+        '''
+        for name, dates in self._dates.items():
+            curve = curves[name]
+            if not curve._built:
+                curve.build()
+            timestamps = np.concatenate(dates).astype('<M8[s]').astype(np.float64)
+            self._values[name] = curve.log_discount_factor(timestamps)
+
+        for (name, mask, grid, first, starts, ends) in self._overnight:
+            log_dfs = self._values[name][grid]
+            fixings = _fixing_rows(first, ends.max(), first - np.timedelta64(2, 'D'))
+            cumulative = np.zeros(len(fixings) + 1, dtype=np.float64)
+            np.cumsum(log_dfs[fixings] - log_dfs[fixings + 1], out=cumulative[1:])
+            start_index = (starts - first).astype(np.int64)
+            end_index = (ends - first).astype(np.int64)
+            self._values[(name, grid.start)] = np.exp(cumulative[end_index] -
+                                                      cumulative[start_index]) - 1
+
+    def get(self, handle):
+        '''Returns the interpolated log discount factors (or compounded
+        rates, for overnight handles) in the order they were added
+        '''
+        size, handles = handle
+        values = np.empty(size, dtype=np.float64)
+        for entry in handles:
+            name, mask, location = entry[:3]
+            if len(entry) > 3:
+                values[mask] = self._values[(name, location.start)]
+            else:
+                values[mask] = self._values[name][location]
+        return values
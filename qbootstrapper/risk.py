@@ -0,0 +1,432 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the BucketedRiskRunner object, which computes the sensitivities
+of a curve's pillars, and optionally of a portfolio, to each of the curve's
+quotes by bumping each quote and rebuilding the curve.
+
+The rebuilds are spread across a pool of worker processes. The curve, with
+its schedules and precomputed leg arrays, and the portfolio are sent to
+each worker once when the pool starts, and each task is only the index and
+direction of a bump. This works for every curve type, including the
+SimultaneousStrippedCurve, which has no analytic Jacobian.
+'''
+# python libraries
+from __future__ import division
+import multiprocessing
+import numpy as np
+import time
+
+# qlib libraries
+from qbootstrapper.curves import SimultaneousStrippedCurve
+from qbootstrapper.environment import _instruments
+
+
+class BucketedRiskRunner(object):
+    '''Bucketed bump-and-rebuild risk of a curve
+
+    Arguments:
+        curve (Curve)           : Curve, of any type
+
+        kwargs
+        ------
+        bump (float)            : Size of the quote bumps, as a rate (futures
+                                  prices are bumped by 100 times the size)
+                                  [default: 0.0001]
+        two_sided (bool)        : Bump each quote up and down, for central
+                                  differences, rather than only up
+                                  [default: False]
+        processes (int)         : Number of worker processes, 1 rebuilds in
+                                  this process
+                                  [default: multiprocessing.cpu_count()]
+        portfolio (SwapPortfolio)
+                                : Portfolio to compute the DV01s of
+                                  [default: None]
+        names (str or tuple)    : Name of the curve in the portfolio, or for
+                                  a SimultaneousStrippedCurve the names of
+                                  its (discount, projection) curves
+                                  [default: None]
+        curves (dict)           : Further curves used by the portfolio,
+                                  keyed by name, which are not bumped
+                                  [default: None]
+
+    Note that only the quotes of the curve itself are bumped: the discount
+    curve of a LIBORCurve is held fixed, while both curves of a
+    SimultaneousStrippedCurve are bumped.
+    '''
+    def __init__(self, curve, bump=0.0001, two_sided=False, processes=None,
+                 portfolio=None, names=None, curves=None):
+        self.curve = curve
+        self.bump = bump
+        self.two_sided = two_sided
+        self.processes = processes or multiprocessing.cpu_count()
+        self.portfolio = portfolio
+        self.names = names
+        self.curves = curves or {}
+        if portfolio is not None and names is None:
+            raise Exception('The curve names are required to price a '
+                            'portfolio')
+
+    def run(self):
+        '''Builds the curve, bumps each quote, and returns a BucketedRisk
+        '''
+        started = time.time()
+        if not self.curve._built:
+            self.curve.build()
+        state = (self.curve, self.portfolio, self.names, self.curves)
+        _init_worker(state)
+        maturities, base = _pillars(self.curve)
+        base_pv = _price()
+        instruments = _worker['instruments']
+
+        signs = (1, -1) if self.two_sided else (1,)
+        tasks = [(index, sign, self.bump * instruments[index].quote_scale)
+                 for index in range(len(instruments)) for sign in signs]
+        shifted = {}
+        for index, sign, pillars, pv in self._results(state, tasks):
+            if len(pillars) != len(base):
+                raise Exception('Bumping quote {0} changed the number of '
+                                'pillars from {1} to {2}'.format(index,
+                                                                 len(base),
+                                                                 len(pillars)))
+            shifted[(index, sign)] = (pillars, pv)
+
+        _worker.clear()
+
+        quotes = np.array([instrument.get_quote() for instrument in instruments],
+                          dtype=np.float64)
+        sensitivities = np.empty((len(base), len(instruments)))
+        dv01 = None if base_pv is None else np.empty((len(base_pv), len(instruments)))
+        for index in range(len(instruments)):
+            up, up_pv = shifted[(index, 1)]
+            if self.two_sided:
+                down, down_pv = shifted[(index, -1)]
+                width = 2 * self.bump
+            else:
+                down, down_pv = base, base_pv
+                width = self.bump
+            scale = instruments[index].quote_scale
+            sensitivities[:, index] = (up - down) / (width * scale)
+            if dv01 is not None:
+                dv01[:, index] = (up_pv - down_pv) / width * 0.0001
+
+        return BucketedRisk(instruments, quotes, maturities, base,
+                            sensitivities, base_pv, dv01,
+                            time.time() - started)
+
+    def _results(self, state, tasks):
+        '''Private generator of the bumped pillars and portfolio values for
+        each task, in any order
+        '''
+        if self.processes == 1:
+            try:
+                for task in tasks:
+                    yield _bump(task)
+            finally:
+                # restore the unbumped pillars
+                self.curve.build()
+            return
+
+        pool = multiprocessing.Pool(self.processes, initializer=_init_worker,
+                                    initargs=(state,))
+        try:
+            for result in pool.imap_unordered(_bump, tasks):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+class BucketedRisk(object):
+    '''Result of a BucketedRiskRunner
+
+    Attributes:
+        instruments (list)      : Bumped instruments, in the order of the
+                                  quote columns
+        quotes (np.array)       : Quotes of the instruments
+        maturities (np.array)   : Pillar dates (datetime64[D]), for a
+                                  SimultaneousStrippedCurve those of the
+                                  discount curve then the projection curve
+        pillars (np.array)      : Pillar log discount factors
+        sensitivities (np.array): Pillar x quote matrix of the change in the
+                                  pillar log discount factors per unit
+                                  change in each quote, as in
+                                  Curve.sensitivities
+        pv (np.array)           : Portfolio values, if priced
+        dv01 (np.array)         : Trade x quote matrix of the change in
+                                  value of each trade for a 1bp move up in
+                                  each quote (0.01 in futures prices), if
+                                  priced
+        elapsed (float)         : Seconds taken
+    '''
+    def __init__(self, instruments, quotes, maturities, pillars,
+                 sensitivities, pv, dv01, elapsed):
+        self.instruments = instruments
+        self.quotes = quotes
+        self.maturities = maturities
+        self.pillars = pillars
+        self.sensitivities = sensitivities
+        self.pv = pv
+        self.dv01 = dv01
+        self.elapsed = elapsed
+
+    def total_dv01(self):
+        '''Returns the DV01 of the whole portfolio to each quote
+        '''
+        if self.dv01 is None:
+            raise Exception('No portfolio was priced')
+        return self.dv01.sum(axis=0)
+
+
+class AdjointRiskEngine(object):
+    '''Bucketed risk of portfolios through the Jacobian of the curves
+
+    The Jacobian of each curve's pillar log discount factors to the quotes
+    is derived from the bootstrap with the implicit function theorem: the
+    instrument repricing residuals R(P, q) are zero on the built curve, so
+
+        dP/dq = -(dR/dP)^-1 dR/dq
+
+    where the partial derivatives are calculated by central differences of
+    single instrument valuations, rather than rebuilds. For a curve with a
+    discount curve in the set, dR/dq includes the dependence on the quotes
+    of the discount curve through its pillars.
+
+    The DV01s of a portfolio are then its analytic pillar sensitivities (see
+    SwapPortfolio.pillar_sensitivities) times the Jacobians, at about the
+    cost of one valuation of the portfolio.
+
+    Arguments:
+        curves (dict)           : Curve objects (not SimultaneousStrippedCurve)
+                                  keyed by name, including the discount
+                                  curve of each LIBORCurve
+
+        kwargs
+        ------
+        bump (float)            : Size of the pillar log discount factor and
+                                  quote (as a rate) bumps
+                                  [default: 1e-6]
+
+    Attributes:
+        names (list)            : Curve names, discount curves first
+        quotes (list)           : (curve name, instrument) of each quote
+                                  column
+        jacobians (dict)        : Pillar x quote matrix of the change in the
+                                  pillar log discount factors (excluding the
+                                  effective date) per unit change in each
+                                  quote, keyed by curve name
+    '''
+    def __init__(self, curves, bump=1e-6):
+        self.curves = curves
+        self.bump = bump
+        self.names = _curve_order(curves)
+        for name in self.names:
+            curve = curves[name]
+            if isinstance(curve, SimultaneousStrippedCurve):
+                raise TypeError('SimultaneousStrippedCurve risk is not '
+                                'supported, see BucketedRiskRunner')
+            if not curve._built:
+                curve.build()
+
+        self.quotes = []
+        columns = {}
+        for name in self.names:
+            curve = self.curves[name]
+            columns[name] = len(self.quotes)
+            curve.quotes()  # sorts the instruments into pillar order
+            self.quotes.extend((name, instrument) for instrument in curve.instruments)
+
+        self.jacobians = {}
+        for name in self.names:
+            self.jacobians[name] = self._jacobian(name, columns[name])
+
+    def _jacobian(self, name, column):
+        '''Private method to derive the Jacobian of a curve's pillars to all
+        of the quotes
+        '''
+        curve = self.curves[name]
+        size = len(curve.instruments)
+        dr_dq = np.zeros((size, len(self.quotes)))
+        for index, instrument in enumerate(curve.instruments):
+            quote = instrument.get_quote()
+            step = self.bump * instrument.quote_scale
+            try:
+                instrument.set_quote(quote + step)
+                up = curve._residual(index)
+                instrument.set_quote(quote - step)
+                down = curve._residual(index)
+            finally:
+                instrument.set_quote(quote)
+            dr_dq[index, column + index] = (up - down) / (2 * step)
+
+        discount = _discount_name(self.curves, name)
+        if discount is not None:
+            dr_dp = _residual_jacobian(curve, self.curves[discount], self.bump)
+            dr_dq += dr_dp.dot(self.jacobians[discount])
+
+        dr_dp = _residual_jacobian(curve, curve, self.bump)
+        return -np.linalg.solve(dr_dp, dr_dq)
+
+    def risk(self, portfolio):
+        '''Returns an AdjointRisk of a SwapPortfolio priced on the curves
+        '''
+        started = time.time()
+        valuation = portfolio.price(self.curves)
+        pillar_sensitivities = portfolio.pillar_sensitivities(self.curves,
+                                                              bump=self.bump,
+                                                              valuation=valuation)
+        dv01 = np.zeros((len(portfolio), len(self.quotes)))
+        for name, sensitivities in pillar_sensitivities.items():
+            dv01 += sensitivities.dot(self.jacobians[name])
+        dv01 *= 0.0001
+        for column, (_, instrument) in enumerate(self.quotes):
+            dv01[:, column] *= instrument.quote_scale
+        return AdjointRisk(self.quotes, valuation.pv, dv01, pillar_sensitivities,
+                           time.time() - started)
+
+
+class AdjointRisk(object):
+    '''Result of AdjointRiskEngine.risk
+
+    Attributes:
+        quotes (list)           : (curve name, instrument) of each quote
+                                  column
+        pv (np.array)           : Portfolio values
+        dv01 (np.array)         : Trade x quote matrix of the change in
+                                  value of each trade for a 1bp move up in
+                                  each quote (0.01 in futures prices)
+        pillar_sensitivities (dict)
+                                : Trade x pillar sensitivities to the
+                                  pillar log discount factors, keyed by
+                                  curve name
+        elapsed (float)         : Seconds taken
+    '''
+    def __init__(self, quotes, pv, dv01, pillar_sensitivities, elapsed):
+        self.quotes = quotes
+        self.pv = pv
+        self.dv01 = dv01
+        self.pillar_sensitivities = pillar_sensitivities
+        self.elapsed = elapsed
+
+    def total_dv01(self):
+        '''Returns the DV01 of the whole portfolio to each quote
+        '''
+        return self.dv01.sum(axis=0)
+
+
+def _discount_name(curves, name):
+    '''Private function to return the name of the discount curve of a curve
+    in a dict of curves, or None
+    '''
+    discount_curve = curves[name].discount_curve
+    for other, curve in curves.items():
+        if discount_curve is curve and other != name:
+            return other
+    return None
+
+
+def _curve_order(curves):
+    '''Private function to return the curve names with each discount curve
+    before the curves discounted on it
+    '''
+    order = []
+
+    def visit(name):
+        discount = _discount_name(curves, name)
+        if discount is not None and discount not in order:
+            visit(discount)
+        if name not in order:
+            order.append(name)
+
+    for name in sorted(curves):
+        visit(name)
+    return order
+
+
+def _residual_jacobian(curve, pillar_curve, bump):
+    '''Private function to return the instruments x pillars Jacobian of the
+    repricing residuals of a curve to the pillar log discount factors
+    (excluding the effective date) of pillar_curve, which is either the
+    curve or its discount curve, by central differences
+    '''
+    own = pillar_curve is curve
+    original, built = pillar_curve.curve, pillar_curve._built
+    size = len(original) - 1
+    jacobian = np.zeros((len(curve.instruments), size))
+    try:
+        # the bumped pillars are evaluated through interpolator() rather
+        # than a daily grid, see Curve._residual
+        pillar_curve._built = False
+        for pillar in range(1, size + 1):
+            # a residual only depends on its own and the earlier pillars
+            rows = range(pillar - 1 if own else 0, len(curve.instruments))
+            values = []
+            for sign in (1, -1):
+                bumped = original.copy()
+                bumped['discount_factor'][pillar] += sign * bump
+                pillar_curve.curve = bumped
+                values.append(np.array([curve._residual(row) for row in rows]))
+            jacobian[rows.start:, pillar - 1] = (values[0] - values[1]) / (2 * bump)
+    finally:
+        pillar_curve.curve, pillar_curve._built = original, built
+    return jacobian
+
+
+_worker = {}
+
+
+def _init_worker(state):
+    '''Private function to hold the curve and portfolio in each worker
+    process, so they are only sent to each worker once
+    '''
+    curve, portfolio, names, other_curves = state
+    _worker.update(curve=curve, portfolio=portfolio, names=names,
+                   curves=other_curves, instruments=_instruments(curve))
+
+
+def _bump(task):
+    '''Private function to bump a single quote, rebuild the curve and price
+    the portfolio, restoring the quote afterwards
+    '''
+    index, sign, size = task
+    curve = _worker['curve']
+    instrument = _worker['instruments'][index]
+    quote = instrument.get_quote()
+    try:
+        instrument.set_quote(quote + sign * size)
+        curve.build(use_cache=False)
+        pillars = _pillars(curve)[1]
+        pv = _price()
+    finally:
+        instrument.set_quote(quote)
+    return index, sign, pillars, pv
+
+
+def _price():
+    '''Private function to price the worker's portfolio on its curve
+    '''
+    portfolio = _worker['portfolio']
+    if portfolio is None:
+        return None
+    curve, names = _worker['curve'], _worker['names']
+    priced = dict(_worker['curves'])
+    if isinstance(curve, SimultaneousStrippedCurve):
+        priced[names[0]] = curve.discount_curve
+        priced[names[1]] = curve.projection_curve
+    else:
+        priced[names] = curve
+    return portfolio.price(priced).pv
+
+
+def _pillars(curve):
+    '''Private function to return the pillar dates and log discount factors
+    of a built curve, excluding the effective date
+    '''
+    if isinstance(curve, SimultaneousStrippedCurve):
+        parts = [curve.discount_curve.curve[1:], curve.projection_curve.curve[1:]]
+    else:
+        parts = [curve.curve[1:]]
+    return (np.concatenate([part['maturity'] for part in parts]),
+            np.concatenate([part['discount_factor'] for part in parts]))
@@ -0,0 +1,289 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements scenario views of curves: shifted and bumped curves that are
+evaluated on the fly from a base curve, without copying or rebuilding it.
+
+A view has the same discount_factor and log_discount_factor methods as a
+Curve, so it can be used anywhere a built curve is queried, e.g., in
+SwapPortfolio.price. Views can be stacked on other views, and the
+evaluate_views function queries many views of the same base curve at once.
+
+Shifts are continuously compounded zero rate shifts on an Act365 basis, so a
+shift s at a tenor of t years changes the log discount factor by -s * t.
+'''
+# python libraries
+from __future__ import division
+import datetime
+import numpy as np
+import time
+
+# qlib libraries
+from qbootstrapper.curves import _timestamps
+
+SECONDS_PER_YEAR = 365 * 86400
+
+
+class CurveView(object):
+    '''Base class of the scenario views
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the view is over
+
+    Sub-classes implement _log_shift, the change in log discount factor at
+    an array of timestamps.
+    '''
+    def __init__(self, base):
+        self.base = base
+
+    @property
+    def _built(self):
+        '''Whether the base curve is built
+        '''
+        return self.root()._built
+
+    def build(self):
+        '''Builds the base curve
+        '''
+        self.root().build()
+
+    def root(self):
+        '''Returns the Curve at the bottom of a stack of views
+        '''
+        base = self.base
+        while isinstance(base, CurveView):
+            base = base.base
+        return base
+
+    def effective_timestamp(self):
+        '''Returns the timestamp of the effective date of the base curve
+        '''
+        root = self.root()
+        if not root._built:
+            root.build()
+        return root.curve['timestamp'][0]
+
+    def tenors(self, timestamps):
+        '''Returns the tenors, in years from the effective date of the base
+        curve, of an array of timestamps
+        '''
+        return (timestamps - self.effective_timestamp()) / SECONDS_PER_YEAR
+
+    def discount_factor(self, date):
+        '''Returns the interpolated discount factor for an arbitrary date
+        '''
+        if type(date) is not datetime.datetime and type(date) is not np.datetime64:
+            raise TypeError('Date must be a datetime.datetime or np.datetime64')
+        if type(date) == datetime.datetime:
+            date = time.mktime(date.timetuple())
+
+        return np.exp(self.log_discount_factor(date))
+
+    def log_discount_factor(self, date):
+        '''Returns the natural log of the discount factor for an arbitrary
+        date, or array of timestamps
+        '''
+        if type(date) == datetime.datetime:
+            date = time.mktime(date.timetuple())
+        if not self._built:
+            self.build()
+        timestamps = np.asarray(date, dtype=np.float64)
+        return self.base.log_discount_factor(timestamps) + self._log_shift(timestamps)
+
+    def total_log_shift(self, timestamps):
+        '''Returns the change in log discount factor of the whole stack of
+        views over the base curve
+        '''
+        shift = self._log_shift(timestamps)
+        if isinstance(self.base, CurveView):
+            shift = shift + self.base.total_log_shift(timestamps)
+        return shift
+
+    def _log_shift(self, timestamps):
+        '''Private method to return the change in log discount factor of
+        this view at an array of timestamps
+        '''
+        raise NotImplementedError
+
+
+class ZeroShift(CurveView):
+    '''Piecewise linear zero rate shift over a base curve
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the view is over
+        tenors (list)       : Tenors of the shift pillars in years, sorted
+        shifts (list)       : Zero rate shifts at the pillars, e.g., 0.0001
+                              for 1bp
+
+    The shift is interpolated linearly between the pillars and is flat
+    before the first and after the last pillar.
+    '''
+    def __init__(self, base, tenors, shifts):
+        super(ZeroShift, self).__init__(base)
+        self.shift_tenors = np.asarray(tenors, dtype=np.float64)
+        self.shifts = np.asarray(shifts, dtype=np.float64)
+        if self.shift_tenors.shape != self.shifts.shape or not len(self.shifts):
+            raise Exception('Tenors and shifts must be non-empty and of the '
+                            'same length')
+        if np.any(np.diff(self.shift_tenors) <= 0):
+            raise Exception('Tenors must be increasing')
+
+    def _log_shift(self, timestamps):
+        tenors = self.tenors(timestamps)
+        return -np.interp(tenors, self.shift_tenors, self.shifts) * tenors
+
+
+class ParallelShift(ZeroShift):
+    '''Parallel zero rate shift over a base curve
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the view is over
+        shift (float)       : Zero rate shift, e.g., 0.0001 for 1bp
+    '''
+    def __init__(self, base, shift):
+        super(ParallelShift, self).__init__(base, [0], [shift])
+
+    def _log_shift(self, timestamps):
+        return -self.shifts[0] * self.tenors(timestamps)
+
+
+class KeyRateShift(ZeroShift):
+    '''Key rate (triangular) zero rate shift over a base curve
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the view is over
+        tenor (float)       : Key rate tenor in years
+        shift (float)       : Zero rate shift at the key rate tenor
+
+        kwargs
+        ------
+        previous_tenor (float)  : Previous key rate tenor, where the shift
+                                  falls to zero, None for a flat shift
+                                  before the key rate tenor
+                                  [default: None]
+        next_tenor (float)      : Next key rate tenor, where the shift falls
+                                  to zero, None for a flat shift after the
+                                  key rate tenor
+                                  [default: None]
+
+    The shifts of a full set of key rates (see key_rate_shifts) sum to a
+    parallel shift.
+    '''
+    def __init__(self, base, tenor, shift, previous_tenor=None,
+                 next_tenor=None):
+        tenors, shifts = [tenor], [shift]
+        if previous_tenor is not None:
+            tenors, shifts = [previous_tenor] + tenors, [0] + shifts
+        if next_tenor is not None:
+            tenors, shifts = tenors + [next_tenor], shifts + [0]
+        super(KeyRateShift, self).__init__(base, tenors, shifts)
+        self.tenor = tenor
+
+
+class Twist(ZeroShift):
+    '''Twist of the zero curve over a base curve, shifting the short end by
+    short_shift and the long end by long_shift, linearly in between
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the view is over
+        short_shift (float) : Zero rate shift at and before the short tenor
+        long_shift (float)  : Zero rate shift at and after the long tenor
+
+        kwargs
+        ------
+        short_tenor (float) : Short pivot tenor in years [default: 2]
+        long_tenor (float)  : Long pivot tenor in years [default: 10]
+    '''
+    def __init__(self, base, short_shift, long_shift, short_tenor=2,
+                 long_tenor=10):
+        super(Twist, self).__init__(base, [short_tenor, long_tenor],
+                                    [short_shift, long_shift])
+
+
+class Butterfly(ZeroShift):
+    '''Butterfly of the zero curve over a base curve, shifting the wings by
+    wing_shift and the belly by belly_shift, linearly in between
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the view is over
+        wing_shift (float)  : Zero rate shift at and outside the short and
+                              long tenors
+        belly_shift (float) : Zero rate shift at the belly tenor
+
+        kwargs
+        ------
+        short_tenor (float) : Short wing tenor in years [default: 2]
+        belly_tenor (float) : Belly tenor in years [default: 5]
+        long_tenor (float)  : Long wing tenor in years [default: 10]
+    '''
+    def __init__(self, base, wing_shift, belly_shift, short_tenor=2,
+                 belly_tenor=5, long_tenor=10):
+        super(Butterfly, self).__init__(base,
+                                        [short_tenor, belly_tenor, long_tenor],
+                                        [wing_shift, belly_shift, wing_shift])
+
+
+class SpreadCurve(CurveView):
+    '''Curve at a spread over a base curve, e.g., a projection curve as a
+    basis spread curve over a discount curve
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the view is over
+        spread (Curve)      : Curve, or CurveView, whose log discount
+                              factors are added to those of the base curve
+    '''
+    def __init__(self, base, spread):
+        super(SpreadCurve, self).__init__(base)
+        self.spread = spread
+
+    def _log_shift(self, timestamps):
+        return self.spread.log_discount_factor(timestamps)
+
+
+def key_rate_shifts(base, tenors, shift):
+    '''Returns a list of KeyRateShift views of a base curve, one for each of
+    a list of key rate tenors, with flat shifts before the first and after
+    the last key rate tenor
+
+    Arguments:
+        base (Curve)        : Curve, or CurveView, that the views are over
+        tenors (list)       : Key rate tenors in years, sorted
+        shift (float)       : Zero rate shift at each key rate tenor
+    '''
+    views = []
+    for i, tenor in enumerate(tenors):
+        previous_tenor = tenors[i - 1] if i > 0 else None
+        next_tenor = tenors[i + 1] if i + 1 < len(tenors) else None
+        views.append(KeyRateShift(base, tenor, shift, previous_tenor,
+                                  next_tenor))
+    return views
+
+
+def evaluate_views(views, dates):
+    '''Returns the log discount factors of many views at an array of dates,
+    as a views x dates array. The base curve of each distinct root is only
+    evaluated once.
+
+    Arguments:
+        views (list)        : List of CurveView objects (or Curves)
+        dates (np.array)    : Timestamps, or datetime64 dates
+    '''
+    dates = np.asarray(dates)
+    if np.issubdtype(dates.dtype, np.datetime64):
+        dates = _timestamps(dates)
+    dates = dates.astype(np.float64)
+
+    values = np.empty((len(views), len(dates)))
+    roots = {}
+    for i, view in enumerate(views):
+        root = view.root() if isinstance(view, CurveView) else view
+        if id(root) not in roots:
+            if not root._built:
+                root.build()
+            roots[id(root)] = root.log_discount_factor(dates)
+        values[i] = roots[id(root)]
+        if isinstance(view, CurveView):
+            values[i] += view.total_log_shift(dates)
+    return values
@@ -0,0 +1,277 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the CurveService object, an asyncio service that keeps a set of
+curves up to date with a stream of quote updates.
+
+Quote updates are coalesced per curve: the latest quote for each instrument
+wins, and a curve is rebuilt at most once per debounce interval however many
+quotes arrive. Rebuilds run in an executor so the event loop is never
+blocked, curves are rebuilt after the curves they are discounted on, and
+every new version of a curve is published to the subscribers.
+
+Note that this module requires python 3.
+'''
+# python libraries
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import json
+import time
+
+# qlib libraries
+import qbootstrapper.loader as loader
+
+
+CurveVersion = collections.namedtuple('CurveVersion',
+                                      ['name', 'version', 'curve', 'quotes',
+                                       'built_at', 'build_time'])
+
+
+class CurveService(object):
+    '''Asyncio curve service with quote coalescing
+
+    Arguments:
+        definitions (list)      : List of CurveDefinition objects
+        as_of (datetime)        : As-of date of the curves
+
+        kwargs
+        ------
+        debounce (float)        : Seconds to wait after a quote update before
+                                  rebuilding, so that bursts of updates are
+                                  coalesced into a single rebuild
+                                  [default: 0.05]
+        executor (Executor)     : concurrent.futures executor that the builds
+                                  run in
+                                  [default: a single worker
+                                   ThreadPoolExecutor]
+
+    Attributes:
+        errors (dict)           : Latest build error for each curve name,
+                                  cleared when the curve next builds
+    '''
+    def __init__(self, definitions, as_of, debounce=0.05, executor=None):
+        self.definitions = dict((definition.name, definition)
+                                for definition in loader.order_definitions(definitions))
+        self.as_of = as_of
+        self.debounce = debounce
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(1)
+        self.errors = {}
+
+        self._quotes = dict((name, {}) for name in self.definitions)
+        self._versions = {}
+        self._dirty = set()
+        self._tasks = {}
+        self._subscribers = []
+        self._dependents = collections.defaultdict(list)
+        for definition in self.definitions.values():
+            if definition.discount_curve is not None:
+                self._dependents[definition.discount_curve].append(definition.name)
+
+    def update(self, name, quotes):
+        '''Applies quote updates to a curve and schedules a rebuild
+
+        Arguments:
+            name (str)      : Name of the curve
+            quotes (dict)   : Quotes keyed by instrument id
+        '''
+        if name not in self.definitions:
+            raise KeyError('Curve "{name}" not in service'.format(**locals()))
+        self._quotes[name].update(quotes)
+        self._schedule(name)
+
+    def subscribe(self, names=None):
+        '''Returns an asyncio.Queue that receives a CurveVersion for every new
+        version of the curves (or only of the named curves)
+        '''
+        queue = asyncio.Queue()
+        self._subscribers.append((None if names is None else set(names), queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        '''Stops publishing curve versions to a subscriber queue
+        '''
+        self._subscribers = [(names, subscriber)
+                             for names, subscriber in self._subscribers
+                             if subscriber is not queue]
+
+    def latest(self, name):
+        '''Returns the latest CurveVersion of a curve, or None if it has not
+        been built
+        '''
+        return self._versions.get(name)
+
+    async def consume(self, feed):
+        '''Applies every quote tick from an async iterable feed, see
+        LocalQuoteFeed and StreamQuoteFeed
+        '''
+        async for tick in feed:
+            if tick['curve'] in self.definitions:
+                self.update(tick['curve'], {tick['instrument']: tick['quote']})
+
+    async def wait(self):
+        '''Waits until every scheduled rebuild has finished
+        '''
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()),
+                                 return_exceptions=True)
+
+    async def close(self):
+        '''Cancels the scheduled rebuilds and shuts down the executor
+        '''
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+        self.executor.shutdown(wait=False)
+
+    def _schedule(self, name):
+        '''Private method to mark a curve dirty and start its rebuild task if
+        it is not already running
+        '''
+        self._dirty.add(name)
+        if name not in self._tasks:
+            task = asyncio.ensure_future(self._rebuild(name))
+            self._tasks[name] = task
+            task.add_done_callback(functools.partial(self._finished, name))
+
+    def _finished(self, name, task):
+        '''Private done callback of a rebuild task. A tick that arrives after
+        the task's last check of the dirty set, but before this callback,
+        finds the task still registered and does not start one, so the
+        rebuild is restarted here
+        '''
+        if self._tasks.get(name) is not task:
+            return
+        del self._tasks[name]
+        if name in self._dirty and not task.cancelled():
+            self._schedule(name)
+
+    def _pending(self, name):
+        '''Private method to return whether a curve, or any curve it is
+        discounted on, is waiting to be rebuilt
+        '''
+        while name is not None:
+            if name in self._dirty or name in self._tasks:
+                return True
+            name = self.definitions[name].discount_curve
+        return False
+
+    async def _rebuild(self, name):
+        '''Private coroutine that rebuilds a curve until it is no longer
+        dirty, publishing each new version
+        '''
+        definition = self.definitions[name]
+        loop = asyncio.get_running_loop()
+        while name in self._dirty:
+            await asyncio.sleep(self.debounce)
+
+            # rebuild only after the discount curve is up to date
+            upstream = definition.discount_curve
+            if upstream is not None:
+                if self._pending(upstream):
+                    await asyncio.sleep(self.debounce)
+                    continue
+                if upstream not in self._versions:
+                    # the curve is rebuilt when its discount curve publishes
+                    self._dirty.discard(name)
+                    return
+                discount_curve = self._versions[upstream].curve
+            else:
+                discount_curve = False
+
+            self._dirty.discard(name)
+            quotes = dict(self._quotes[name])
+            if not quotes:
+                return
+            started = time.time()
+            try:
+                curve = await loop.run_in_executor(self.executor, _build,
+                                                   definition, self.as_of,
+                                                   quotes, discount_curve)
+            except Exception as error:
+                self.errors[name] = error
+                continue
+            self.errors.pop(name, None)
+            self._publish(name, curve, quotes, time.time() - started)
+
+    def _publish(self, name, curve, quotes, build_time):
+        '''Private method to store a new curve version, send it to the
+        subscribers, and schedule the rebuild of the dependent curves
+        '''
+        previous = self._versions.get(name)
+        version = CurveVersion(name, 1 if previous is None else previous.version + 1,
+                               curve, quotes, time.time(), build_time)
+        self._versions[name] = version
+        for names, queue in self._subscribers:
+            if names is None or name in names:
+                queue.put_nowait(version)
+        for dependent in self._dependents[name]:
+            if self._quotes[dependent]:
+                self._schedule(dependent)
+
+
+class LocalQuoteFeed(object):
+    '''In-process quote feed for use with CurveService.consume
+
+    Quote ticks are published with the publish method, and the feed is
+    iterated asynchronously until it is closed.
+    '''
+    def __init__(self):
+        self._queue = asyncio.Queue()
+
+    def publish(self, curve, instrument, quote):
+        '''Publishes a single quote tick
+        '''
+        self._queue.put_nowait({'curve': curve,
+                                'instrument': instrument,
+                                'quote': quote})
+
+    def close(self):
+        '''Ends the iteration of the feed
+        '''
+        self._queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        tick = await self._queue.get()
+        if tick is None:
+            raise StopAsyncIteration
+        return tick
+
+
+class StreamQuoteFeed(object):
+    '''Socket quote feed for use with CurveService.consume
+
+    Reads JSON lines quote ticks, with curve, instrument and quote keys, from
+    an asyncio.StreamReader (e.g., from asyncio.open_connection) until the
+    end of the stream.
+    '''
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise StopAsyncIteration
+            if line.strip():
+                return json.loads(line.decode('utf-8'))
+
+
+def _build(definition, as_of, quotes, discount_curve):
+    '''Private function that creates and builds a curve from its definition
+    and quotes, run in the executor
+    '''
+    rows = [{'curve': definition.name, 'instrument': instrument, 'quote': quote}
+            for instrument, quote in quotes.items()]
+    curve = definition.curve(as_of, rows, discount_curve=discount_curve)
+    curve.build()
+    return curve
@@ -0,0 +1,259 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the CurvePublisher and SharedCurve objects, which publish built
+curves to shared memory so that many reader processes can use the latest
+curves without rebuilding or unpickling them.
+
+Each curve is held in its own shared memory segment, named by the prefix of
+the publisher and the name of the curve, with the layout
+
+    header          : int64[5] of sequence, pillars, breakpoints, capacity,
+                      extrapolate
+    timestamps      : float64[capacity] pillar timestamps
+    log_dfs         : float64[capacity] pillar log discount factors
+    breakpoints     : float64[2 * capacity] breakpoints of the interpolant
+    coefficients    : float64[4, 2 * capacity] coefficients of each interval
+                      between breakpoints
+
+The publisher computes the interpolant of the curve once, with the
+interpolation of the curve, and the readers evaluate it directly from views
+of the segment. An interpolant can have more breakpoints than pillars (see
+MonotoneConvexInterpolation), hence the room for twice as many.
+
+Publishing is guarded by a seqlock: the sequence is odd while the publisher
+writes, and a reader retries any read that overlaps a write, so readers
+always see a consistent curve. The sequence is a plain int64 of the header,
+written and read through numpy without atomics or memory barriers, so the
+seqlock relies on the memory ordering of the processor: aligned 8 byte
+stores are not torn, and neither the stores of the publisher nor the loads
+of a reader are reordered with each other. Both hold on x86 (and x86-64),
+but not on weakly ordered processors, e.g., ARM, where a reader could see
+the new sequence before the new pillars.
+
+Note that this module requires python 3.8 or later.
+'''
+# python libraries
+from __future__ import division
+import datetime
+import numpy as np
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+# qlib libraries
+from qbootstrapper.interpolation import _evaluate
+
+HEADER = 5
+
+
+class CurvePublisher(object):
+    '''Publishes built curves to shared memory
+
+    Arguments:
+        prefix (str)        : Prefix of the shared memory segment names
+
+        kwargs
+        ------
+        capacity (int)      : Maximum number of pillars of each curve
+                              [default: 512]
+
+    The segments are created on the first publication of each curve, and
+    removed by unlink.
+    '''
+    def __init__(self, prefix, capacity=512):
+        self.prefix = prefix
+        self.capacity = capacity
+        self._segments = {}
+
+    def publish(self, name, curve):
+        '''Publishes a new version of a curve, building it if necessary, and
+        returns the version number
+        '''
+        if not curve._built:
+            curve.build()
+        timestamps = curve.curve['timestamp']
+        log_dfs = curve.curve['discount_factor']
+        pillars = len(timestamps)
+        if pillars < 2:
+            raise Exception('Curve "{name}" must have at least 2 pillars to '
+                            'be published'.format(**locals()))
+
+        if name not in self._segments:
+            segment = shared_memory.SharedMemory(name=self.prefix + name,
+                                                 create=True,
+                                                 size=_size(self.capacity))
+            self._segments[name] = (segment, _views(segment.buf, self.capacity))
+        segment, (header, x, y, b, c) = self._segments[name]
+        capacity = header[3] or self.capacity
+        interpolant = curve.interpolator()
+        breakpoints = len(interpolant.breakpoints)
+        if pillars > capacity or breakpoints > 2 * capacity:
+            raise Exception('Curve "{name}" has {pillars} pillars, more than '
+                            'the capacity of {capacity}'.format(**locals()))
+
+        header[0] += 1
+        header[1] = pillars
+        header[2] = breakpoints
+        header[3] = capacity
+        header[4] = curve.allow_extrapolation
+        x[:pillars] = timestamps
+        y[:pillars] = log_dfs
+        b[:breakpoints] = interpolant.breakpoints
+        c[:, :breakpoints - 1] = interpolant.coefficients
+        header[0] += 1
+        return int(header[0] // 2)
+
+    def names(self):
+        '''Returns the names of the published curves
+        '''
+        return sorted(self._segments)
+
+    def close(self):
+        '''Closes the segments in this process, leaving them to the readers
+        '''
+        for segment, views in self._segments.values():
+            del views
+            segment.close()
+        self._segments = {}
+
+    def unlink(self):
+        '''Closes and removes the segments
+        '''
+        segments = [segment for segment, _ in self._segments.values()]
+        self.close()
+        for segment in segments:
+            segment.unlink()
+
+
+class SharedCurve(object):
+    '''Read-only curve that interpolates from a shared memory segment
+
+    Arguments:
+        prefix (str)        : Prefix of the shared memory segment names
+        name (str)          : Name of the curve
+
+        kwargs
+        ------
+        retries (int)       : Number of reads overlapping a publication to
+                              retry before raising an Exception
+                              [default: 10000]
+
+    The discount_factor and log_discount_factor methods match those of the
+    Curve object, and always use the latest published version.
+    '''
+    def __init__(self, prefix, name, retries=10000):
+        self.name = name
+        self.retries = retries
+        self._segment = _attach(prefix + name)
+        capacity = np.ndarray((HEADER,), dtype=np.int64,
+                              buffer=self._segment.buf)[3]
+        (self._header, self._x, self._y, self._b,
+         self._c) = _views(self._segment.buf, capacity)
+
+    @property
+    def version(self):
+        '''Version number of the published curve, 0 if not yet published
+        '''
+        return int(self._header[0] // 2)
+
+    def discount_factor(self, date):
+        '''Returns the interpolated discount factor for an arbitrary date
+        '''
+        if type(date) is not datetime.datetime and type(date) is not np.datetime64:
+            raise TypeError('Date must be a datetime.datetime or np.datetime64')
+        if type(date) == datetime.datetime:
+            date = time.mktime(date.timetuple())
+
+        return np.exp(self.log_discount_factor(date))
+
+    def log_discount_factor(self, date):
+        '''Returns the natural log of the discount factor for an arbitrary
+        date, or array of timestamps
+        '''
+        if type(date) == datetime.datetime:
+            date = time.mktime(date.timetuple())
+        date = np.asarray(date, dtype=np.float64)
+        return self._read(lambda x, y, b, c, extrapolate, version:
+                          _evaluate(b, c, extrapolate, date))
+
+    def snapshot(self):
+        '''Returns a consistent copy of the published pillars as a tuple of
+        (version, timestamps, log discount factors)
+        '''
+        return self._read(lambda x, y, b, c, extrapolate, version:
+                          (version, x.copy(), y.copy()))
+
+    def _read(self, function):
+        '''Private method to call function with views of the published
+        timestamps, log discount factors, breakpoints and coefficients, the
+        extrapolate flag and the version, retrying until no publication
+        overlapped the call
+        '''
+        header = self._header
+        for _ in range(self.retries):
+            sequence = int(header[0])
+            if sequence & 1:
+                time.sleep(0)
+                continue
+            if sequence == 0:
+                raise Exception('Curve "{0}" has not been '
+                                'published'.format(self.name))
+            pillars, breakpoints = int(header[1]), int(header[2])
+            with np.errstate(all='ignore'):
+                result = function(self._x[:pillars], self._y[:pillars],
+                                  self._b[:breakpoints],
+                                  self._c[:, :breakpoints - 1],
+                                  bool(header[4]), sequence // 2)
+            if int(header[0]) == sequence:
+                return result
+        raise Exception('Curve "{0}" could not be read after {1} '
+                        'retries'.format(self.name, self.retries))
+
+    def close(self):
+        '''Closes the segment in this process
+        '''
+        self._header = self._x = self._y = self._b = self._c = None
+        self._segment.close()
+
+
+def _size(capacity):
+    '''Private function to return the size in bytes of a segment
+    '''
+    return 8 * (HEADER + 12 * capacity)
+
+
+def _views(buffer, capacity):
+    '''Private function to return the header, timestamp, log discount
+    factor, breakpoint and coefficient views of a segment
+    '''
+    header = np.ndarray((HEADER,), dtype=np.int64, buffer=buffer)
+    offset = 8 * HEADER
+    x = np.ndarray((capacity,), dtype=np.float64, buffer=buffer, offset=offset)
+    offset += 8 * capacity
+    y = np.ndarray((capacity,), dtype=np.float64, buffer=buffer, offset=offset)
+    offset += 8 * capacity
+    b = np.ndarray((2 * capacity,), dtype=np.float64, buffer=buffer,
+                   offset=offset)
+    offset += 16 * capacity
+    c = np.ndarray((4, 2 * capacity), dtype=np.float64, buffer=buffer,
+                   offset=offset)
+    return header, x, y, b, c
+
+
+def _attach(name):
+    '''Private function to attach to an existing segment without registering
+    it with the resource tracker, which would otherwise remove the segment
+    when the reader exits
+    '''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
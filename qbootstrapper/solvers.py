@@ -0,0 +1,169 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the SolverPolicy object, which root finds the log discount
+factor of each swap pillar while bootstrapping.
+
+The pillar is first solved with Newton's (secant) method from a log
+discount factor of 0. The secant iteration can diverge, e.g., for negative
+rate or very long dated swaps, so when it fails to converge, or converges
+to a log discount factor that implies implausible forwards, the pillar is
+solved again with a bracketing method (Brent or bisection). The bracket is
+taken from the last pillar of the curve, with forwards of at most
+max_forward in either direction up to the new pillar, and is widened until
+it brackets a root.
+
+scipy.optimize is only imported the first time that a pillar is solved,
+as it is by far the slowest import of the package, and many processes only
+read curves.
+
+A curve holds the policy used for its pillars, see Curve. The policies can
+also be given by name:
+
+    default : scipy's default tolerances, giving the same curves as the
+              plain Newton's method where it converges
+    fast    : looser tolerance and fewer iterations, e.g., for scenarios
+'''
+# python libraries
+from __future__ import division
+import numpy as np
+
+_FALLBACKS = ['brentq', 'bisect']
+
+
+class SolverPolicy(object):
+    '''Root finding policy of the swap pillars of a curve
+
+    kwargs
+    ------
+        tolerance (float)       : Absolute tolerance of the log discount
+                                  factor
+                                  [default: 1.48e-8]
+        max_iterations (int)    : Maximum iterations of Newton's method
+                                  [default: 50]
+        fallback (str)          : Bracketing method used when Newton's
+                                  method fails, or None for Newton's
+                                  method alone
+                                  available: brentq, bisect
+                                  [default: brentq]
+        max_forward (float)     : Largest absolute continuously compounded
+                                  forward rate between the last pillar and
+                                  the new pillar, setting the initial
+                                  bracket of the fallback
+                                  [default: 0.25]
+        expansions (int)        : Number of times the bracket is doubled
+                                  before giving up
+                                  [default: 8]
+        fallback_iterations (int): Maximum iterations of the bracketing
+                                  method
+                                  [default: 100]
+    '''
+    def __init__(self, tolerance=1.48e-8, max_iterations=50, fallback='brentq',
+                 max_forward=0.25, expansions=8, fallback_iterations=100):
+        if fallback is not None and fallback not in _FALLBACKS:
+            raise TypeError('Fallback "{fallback}" not '
+                            'recognized'.format(**locals()))
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.fallback = fallback
+        self.max_forward = max_forward
+        self.expansions = expansions
+        self.fallback_iterations = fallback_iterations
+
+    def solve(self, function, last_log_df, years):
+        '''Returns the root of function and a dict of the solver statistics:
+        method, iterations, evaluations, converged and residual (the smallest
+        absolute value of function evaluated)
+
+        Arguments:
+            function (function) : Value of the instrument for a log
+                                  discount factor of the new pillar
+            last_log_df (float) : Log discount factor of the last pillar
+            years (float)       : Years from the last pillar to the new one
+        '''
+        import scipy.optimize
+
+        evaluations = [0, float('inf')]
+
+        def counted(guess):
+            value = function(guess)
+            evaluations[0] += 1
+            evaluations[1] = min(evaluations[1], float(abs(value)))
+            return value
+
+        lower, upper = self._bracket(last_log_df, years)
+        try:
+            root, result = scipy.optimize.newton(counted, 0,
+                                                 tol=self.tolerance,
+                                                 maxiter=self.max_iterations,
+                                                 full_output=True)
+        except (RuntimeError, ZeroDivisionError, OverflowError) as error:
+            if self.fallback is None:
+                raise
+            failure = str(error)
+            iterations = evaluations[0] - 1
+        else:
+            if self.fallback is None or (np.isfinite(root) and
+                                         lower <= root <= upper):
+                return root, self._report('secant', result.iterations,
+                                          evaluations, result.converged)
+            failure = ('Newton\'s method converged to {root}, outside of '
+                       '[{lower}, {upper}]'.format(**locals()))
+            iterations = result.iterations
+
+        method = 'secant+{0}'.format(self.fallback)
+        f_lower, f_upper = counted(lower), counted(upper)
+        expansions = 0
+        while np.sign(f_lower) == np.sign(f_upper):
+            if expansions == self.expansions:
+                raise Exception('Could not bracket the pillar after "{failure}": '
+                                'no sign change in '
+                                '[{lower}, {upper}]'.format(**locals()))
+            width = upper - lower
+            lower, upper = lower - width / 2, upper + width / 2
+            f_lower, f_upper = counted(lower), counted(upper)
+            expansions += 1
+
+        fallback = getattr(scipy.optimize, self.fallback)
+        root, result = fallback(counted, lower, upper, xtol=self.tolerance,
+                                maxiter=self.fallback_iterations,
+                                full_output=True)
+        return root, self._report(method, iterations + result.iterations,
+                                  evaluations, result.converged)
+
+    def _bracket(self, last_log_df, years):
+        '''Private method to return the initial bracket of the log discount
+        factor of the new pillar
+        '''
+        width = self.max_forward * max(years, 1 / 365)
+        return last_log_df - width, last_log_df + width
+
+    def _report(self, method, iterations, evaluations, converged):
+        '''Private method to return the dict of the solver statistics
+        '''
+        return {'method': method,
+                'iterations': iterations,
+                'evaluations': evaluations[0],
+                'converged': converged,
+                'residual': evaluations[1]}
+
+    def __repr__(self):
+        return ('SolverPolicy(tolerance={0}, max_iterations={1}, '
+                'fallback={2!r})'.format(self.tolerance, self.max_iterations,
+                                         self.fallback))
+
+
+POLICIES = {'default': SolverPolicy(),
+            'fast': SolverPolicy(tolerance=1e-6, max_iterations=20)}
+
+
+def _policy(solver):
+    '''Private function to return the SolverPolicy of a policy or policy name
+    '''
+    if isinstance(solver, SolverPolicy):
+        return solver
+    if solver not in POLICIES:
+        raise TypeError('Solver "{solver}" not recognized'.format(**locals()))
+    return POLICIES[solver]
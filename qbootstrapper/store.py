@@ -0,0 +1,339 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the CurveStore object, an on-disk history of built curves indexed
+by curve name and as-of date.
+
+The store is a directory with one directory per curve name, holding chunks
+of as-of dates. Each chunk is a directory of .npy files
+
+    dates.npy       : int64 as-of dates, as days since 1970-01-01, sorted
+    counts.npy      : int64 number of pillars of each curve
+    pillars.npy     : int64 date x pillar matrix of pillar dates, as days
+                      since 1970-01-01 (padded with 0)
+    log_dfs.npy     : float64 (or float32) date x pillar matrix of the log
+                      discount factors (padded with NaN)
+    interpolation.npy : name of the interpolation of the curves, see
+                      INTERPOLATIONS (chunks without it are pchip)
+
+The files are memory-mapped when read, so a query only reads the pages of
+the as-of dates that it needs.
+'''
+# python libraries
+from __future__ import division
+import datetime
+import numpy as np
+import os
+import shutil
+
+# qlib libraries
+import qbootstrapper.curves as curves
+from qbootstrapper.interpolation import INTERPOLATIONS
+from qbootstrapper.swapscheduler import _shift_dates
+
+COLUMNS = ('dates', 'counts', 'pillars', 'log_dfs')
+
+
+class CurveStore(object):
+    '''History of built curves on disk
+
+    Arguments:
+        root (str)      : Directory of the store, created if necessary
+
+        kwargs
+        ------
+        dtype (str)     : Type of the stored log discount factors, float32
+                          halves the size of the store at the cost of
+                          ~1e-7 relative precision
+                          [default: float64]
+
+    Curves are returned as built Curve objects, so that they can be queried
+    with the same methods as any other curve.
+    '''
+    def __init__(self, root, dtype='float64'):
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        self._chunks = {}
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def names(self):
+        '''Returns the names of the curves in the store
+        '''
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def next_chunk(self):
+        '''Returns the next unused chunk number across all of the curves
+        '''
+        chunk = 0
+        for name in self.names():
+            for filename in os.listdir(os.path.join(self.root, name)):
+                if filename.startswith('chunk-') and len(filename) == 12:
+                    chunk = max(chunk, int(filename[6:]) + 1)
+        return chunk
+
+    def remove_chunk(self, chunk):
+        '''Removes a chunk number from every curve, e.g., a chunk that was
+        only partly written when a backfill was interrupted
+        '''
+        for name in self.names():
+            path = os.path.join(self.root, name, 'chunk-{0:06d}'.format(chunk))
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            self._chunks.pop(name, None)
+
+    def append(self, name, entries, chunk=None, interpolation='pchip'):
+        '''Writes a chunk of built curves for a curve name. The chunk is
+        written to a temporary directory and renamed, so a chunk is either
+        complete or not present. Raises an Exception if an as-of date is
+        repeated or is already in another chunk of the curve.
+
+        Arguments:
+            name (str)      : Name of the curve
+            entries (list)  : List of (as_of, pillar dates, log discount
+                              factors) tuples, with the as-of date as a
+                              datetime and the pillar dates as datetime64[D]
+
+            kwargs
+            ------
+            chunk (int)         : Chunk number [default: next_chunk()]
+            interpolation (str) : Interpolation of the curves, which the
+                                  stored curves are returned with
+                                  [default: pchip]
+        '''
+        if interpolation not in INTERPOLATIONS:
+            raise TypeError('Interpolation "{interpolation}" not '
+                            'recognized'.format(**locals()))
+        if chunk is None:
+            chunk = self.next_chunk()
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self._check_dates(name, chunk, [_day(entry[0]) for entry in entries])
+        width = max(len(entry[1]) for entry in entries)
+        columns = {'dates': np.array([np.datetime64(_day(entry[0]))
+                                      for entry in entries],
+                                     dtype='datetime64[D]').astype(np.int64),
+                   'counts': np.array([len(entry[1]) for entry in entries],
+                                      dtype=np.int64),
+                   'pillars': np.zeros((len(entries), width), dtype=np.int64),
+                   'log_dfs': np.full((len(entries), width), np.nan,
+                                      dtype=self.dtype),
+                   'interpolation': np.array(interpolation)}
+        for row, (_, maturities, values) in enumerate(entries):
+            maturities = np.asarray(maturities, dtype='datetime64[D]')
+            columns['pillars'][row, :len(maturities)] = maturities.astype(np.int64)
+            columns['log_dfs'][row, :len(values)] = values
+        self._write(name, chunk, columns)
+
+    def _check_dates(self, name, chunk, dates):
+        '''Private method to raise an Exception if any of the as-of dates of
+        a chunk is repeated, or is in any other chunk of the curve
+        '''
+        dates = np.array([np.datetime64(date) for date in dates],
+                         dtype='datetime64[D]').astype(np.int64)
+        repeated = dates[1:][dates[1:] == dates[:-1]]
+        if not len(repeated) and os.path.isdir(os.path.join(self.root, name)):
+            chunk_path = os.path.join(self.root, name, 'chunk-{0:06d}'.format(chunk))
+            for first, last, path in self.chunks(name):
+                if path == chunk_path or last < dates[0] or first > dates[-1]:
+                    continue
+                stored = self._column(path, 'dates')
+                repeated = dates[np.isin(dates, stored)]
+                if len(repeated):
+                    break
+        if len(repeated):
+            date = repeated[0].astype('datetime64[D]')
+            raise Exception('Curve "{name}" already has as-of date '
+                            '{date} in the store'.format(**locals()))
+
+    def _write(self, name, chunk, columns):
+        '''Private method to write the columns of a chunk atomically
+        '''
+        directory = os.path.join(self.root, name)
+        path = os.path.join(directory, 'chunk-{0:06d}'.format(chunk))
+        temporary = path + '.tmp'
+        if os.path.isdir(temporary):
+            shutil.rmtree(temporary)
+        os.makedirs(temporary)
+        for column in COLUMNS + ('interpolation',):
+            np.save(os.path.join(temporary, column + '.npy'), columns[column])
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(temporary, path)
+        self._chunks.pop(name, None)
+
+    def chunks(self, name):
+        '''Returns a list of (first date, last date, path) for the chunks of
+        a curve, sorted by the first date. Only the dates column is read.
+        '''
+        if name not in self._chunks:
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                raise KeyError('Curve "{name}" not in store'.format(**locals()))
+            chunks = []
+            for filename in sorted(os.listdir(directory)):
+                if not filename.startswith('chunk-') or len(filename) != 12:
+                    continue
+                path = os.path.join(directory, filename)
+                dates = self._column(path, 'dates')
+                if len(dates):
+                    chunks.append((dates[0], dates[-1], path))
+            self._chunks[name] = sorted(chunks, key=lambda chunk: chunk[0])
+        return self._chunks[name]
+
+    @staticmethod
+    def _column(path, column):
+        '''Private method to memory-map a single column of a chunk
+        '''
+        return np.load(os.path.join(path, column + '.npy'), mmap_mode='r')
+
+    @staticmethod
+    def _interpolation(path):
+        '''Private method to return the interpolation of a chunk
+        '''
+        filename = os.path.join(path, 'interpolation.npy')
+        if not os.path.exists(filename):
+            return 'pchip'
+        return str(np.load(filename))
+
+    def dates(self, name, start=None, end=None):
+        '''Returns the as-of dates of a curve as a datetime64[D] array
+        '''
+        dates = [np.asarray(self._column(path, 'dates')[rows])
+                 for path, rows in self._rows(name, start, end)]
+        if not dates:
+            return np.array([], dtype='datetime64[D]')
+        return np.concatenate(dates).astype('datetime64[D]')
+
+    def _rows(self, name, start=None, end=None):
+        '''Private generator of (chunk path, row slice) for the as-of dates of
+        a curve between start and end (inclusive)
+        '''
+        start = None if start is None else np.datetime64(_day(start)).astype(np.int64)
+        end = None if end is None else np.datetime64(_day(end)).astype(np.int64)
+        for first, last, path in self.chunks(name):
+            if (start is not None and last < start) or (end is not None and first > end):
+                continue
+            dates = self._column(path, 'dates')
+            lower = 0 if start is None else np.searchsorted(dates, start, 'left')
+            upper = len(dates) if end is None else np.searchsorted(dates, end, 'right')
+            if upper > lower:
+                yield path, slice(lower, upper)
+
+    def pillars(self, name, start=None, end=None):
+        '''Generator of (as_of, pillar dates, log discount factors) for the
+        as-of dates of a curve between start and end (inclusive), with the
+        dates as datetime64[D] and the log discount factors as float64
+        '''
+        for _, as_of, maturities, log_dfs in self._pillars(name, start, end):
+            yield as_of, maturities, log_dfs
+
+    def _pillars(self, name, start=None, end=None):
+        '''Private generator of (chunk path, as_of, pillar dates, log
+        discount factors), see pillars
+        '''
+        for path, rows in self._rows(name, start, end):
+            dates = self._column(path, 'dates')[rows]
+            counts = self._column(path, 'counts')[rows]
+            pillars = self._column(path, 'pillars')[rows]
+            log_dfs = self._column(path, 'log_dfs')[rows]
+            for row in range(len(dates)):
+                count = counts[row]
+                yield (path, np.datetime64(int(dates[row]), 'D'),
+                       pillars[row, :count].astype('datetime64[D]'),
+                       log_dfs[row, :count].astype(np.float64))
+
+    def curve(self, name, as_of):
+        '''Returns the stored curve for an as-of date as a built Curve, with
+        the interpolation that it was stored with
+
+        Raises a KeyError if the date is not in the store
+        '''
+        for path, as_of, maturities, log_dfs in self._pillars(name, as_of, as_of):
+            return _curve(as_of, maturities, log_dfs, self._interpolation(path))
+        raise KeyError('Curve "{name}" not in store for {as_of}'.format(**locals()))
+
+    def curves(self, name, start=None, end=None):
+        '''Generator of (as_of, Curve) for the as-of dates of a curve between
+        start and end (inclusive)
+        '''
+        interpolations = {}
+        for path, as_of, maturities, log_dfs in self._pillars(name, start, end):
+            if path not in interpolations:
+                interpolations[path] = self._interpolation(path)
+            yield as_of, _curve(as_of, maturities, log_dfs, interpolations[path])
+
+    def log_discount_factors(self, name, tenor, start=None, end=None):
+        '''Returns the as-of dates and the log discount factor at a tenor
+        from each as-of date, for every curve between start and end
+
+        Arguments:
+            name (str)      : Name of the curve
+            tenor (tuple)   : Tenor as a (length, length type) tuple, e.g.,
+                              (5, 'years') or (6, 'months')
+        '''
+        length, length_type = tenor
+        if length_type == 'years':
+            length, length_type = length * 12, 'months'
+
+        dates, values = [], []
+        for as_of, as_of_curve in self.curves(name, start, end):
+            date = _shift_dates(as_of, length, length_type)
+            dates.append(as_of)
+            values.append(as_of_curve.log_discount_factor(curves._timestamps(date)))
+        return (np.array(dates, dtype='datetime64[D]'),
+                np.array(values, dtype=np.float64))
+
+    def zero_rates(self, name, tenor, start=None, end=None):
+        '''Returns the as-of dates and the continuously compounded zero rate
+        (Act365) at a tenor from each as-of date, for every curve between
+        start and end, e.g., the 5y zero rate from every EONIA curve in 2016:
+
+            store.zero_rates('EONIA', (5, 'years'),
+                             datetime.datetime(2016, 1, 1),
+                             datetime.datetime(2016, 12, 31))
+        '''
+        dates, log_dfs = self.log_discount_factors(name, tenor, start, end)
+        length, length_type = tenor
+        if length_type == 'years':
+            length, length_type = length * 12, 'months'
+        days = (_shift_dates(dates, length, length_type) - dates).astype(np.float64)
+        return dates, -log_dfs / (days / 365)
+
+    def compact(self, name, dtype='float32'):
+        '''Rewrites every chunk of a curve with the log discount factors
+        stored as dtype
+        '''
+        for _, _, path in self.chunks(name):
+            columns = dict((column, np.array(self._column(path, column)))
+                           for column in COLUMNS)
+            columns['log_dfs'] = columns['log_dfs'].astype(dtype)
+            columns['interpolation'] = np.array(self._interpolation(path))
+            self._write(name, int(os.path.basename(path)[6:]), columns)
+
+
+def _day(date):
+    '''Private function to return the date of a datetime, date or
+    datetime64
+    '''
+    if isinstance(date, datetime.datetime):
+        return date.date()
+    if isinstance(date, np.datetime64):
+        return date.astype('datetime64[D]')
+    return date
+
+
+def _curve(as_of, maturities, log_dfs, interpolation='pchip'):
+    '''Private function to create a built Curve from stored pillars
+    '''
+    effective = datetime.datetime.combine(as_of.astype(object), datetime.time())
+    curve = curves.Curve(effective, interpolation=interpolation)
+    array = np.empty(len(maturities), dtype=curve.curve.dtype)
+    array['maturity'] = maturities
+    array['timestamp'] = curves._timestamps(maturities)
+    array['discount_factor'] = log_dfs
+    curve.curve = array
+    curve._built = True
+    return curve
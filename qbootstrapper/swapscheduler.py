@@ -220,3 +220,255 @@ class Schedule:
         for arg in args:
             arrays.append(np.asarray([np.datetime64(date.strftime(fmt)) for date in arg]))
         return tuple(arrays)
+
+
+class ScheduleTable(object):
+    '''Swap fixing, accrual, and payment dates for many swaps at once
+
+    The ScheduleTable class generates the same periods as the Schedule class
+    for arrays of swaps, without creating a Schedule object per swap. The
+    periods of all of the swaps are stored in flat datetime64[D] columns,
+    with the periods of swap i held in offsets[i]:offsets[i + 1]. Month
+    periods are generated with month arithmetic on datetime64[M] arrays.
+
+    Note that second and penultimate (stub) dates are not supported, swaps
+    with stubs should use the Schedule class.
+
+    Arguments:
+        effective (np.array)              : effective dates of the swaps
+        maturity (np.array)               : maturity dates of the swaps
+        length (np.array or int)          : length of the periods that the
+                                            accruals last
+
+        kwargs
+        ------
+        period_adjustment (str or array)  : date adjustment type for the
+                                            accrual dates, see Schedule
+                                            [default: unadjusted]
+        payment_adjustment (str or array) : date adjustment type for the
+                                            payment dates, see Schedule
+                                            [default: unadjusted]
+        fixing_lag (int or array)         : fixing lag for fixing dates
+                                            [default: 2]
+        period_length (str or array)      : period type for the length
+                                            available: months, weeks, days
+                                            [default: months]
+
+        Each argument can either be an array with one entry per swap, or a
+        scalar that applies to every swap.
+
+    Attributes:
+        offsets (np.array)                : int64 array of length n + 1 of
+                                            the start of each swap's periods
+                                            in the period columns
+        fixing_date (np.array)            : datetime64[D] fixing dates
+        accrual_start (np.array)          : datetime64[D] accrual start dates
+        accrual_end (np.array)            : datetime64[D] accrual end dates
+        payment_date (np.array)           : datetime64[D] payment dates
+        swap (np.array)                   : int64 array of the index of the
+                                            swap that each period belongs to
+    '''
+    def __init__(self, effective, maturity, length,
+                 period_adjustment='unadjusted',
+                 payment_adjustment='unadjusted',
+                 fixing_lag=2, period_length='months'):
+
+        # variable assignment
+        self.effective = np.atleast_1d(np.asarray(effective, dtype='datetime64[D]'))
+        size = len(self.effective)
+        self.maturity = self._broadcast(np.asarray(maturity, dtype='datetime64[D]'), size)
+        self.length = self._broadcast(np.asarray(length, dtype=np.int64), size)
+        self.period_adjustment = self._broadcast(np.asarray(period_adjustment), size)
+        self.payment_adjustment = self._broadcast(np.asarray(payment_adjustment), size)
+        self.fixing_lag = self._broadcast(np.asarray(fixing_lag, dtype=np.int64), size)
+        self.period_length = self._broadcast(np.asarray(period_length), size)
+
+        # date generation routine
+        self._gen_periods()
+
+    def __len__(self):
+        return len(self.effective)
+
+    @staticmethod
+    def _broadcast(array, size):
+        '''Private function to broadcast a scalar or array argument to one
+        entry per swap
+        '''
+        if array.ndim == 0:
+            return np.repeat(array, size)
+        if len(array) != size:
+            raise Exception('Schedule arguments must be scalars or have one '
+                            'entry per swap')
+        return array
+
+    def _gen_periods(self):
+        '''Private method to generate the period columns
+        '''
+        period_ends, swap = self._gen_dates()
+
+        counts = np.bincount(swap, minlength=len(self))
+        self.offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(counts)
+        self.swap = swap
+        first = self.offsets[:-1][counts > 0]
+
+        adjusted_period_ends = np.empty_like(period_ends)
+        self.payment_date = np.empty_like(period_ends)
+        for adjustment in np.unique(self.period_adjustment):
+            mask = (self.period_adjustment == adjustment)[swap]
+            adjusted_period_ends[mask] = _adjust_dates(period_ends[mask],
+                                                       adjustment)
+        for adjustment in np.unique(self.payment_adjustment):
+            mask = (self.payment_adjustment == adjustment)[swap]
+            self.payment_date[mask] = _adjust_dates(period_ends[mask],
+                                                    adjustment)
+
+        self.accrual_end = adjusted_period_ends
+        self.accrual_start = np.empty_like(period_ends)
+        self.accrual_start[1:] = adjusted_period_ends[:-1]
+        self.accrual_start[first] = self.effective[counts > 0]
+
+        lags = self.fixing_lag[swap].astype('timedelta64[D]')
+        self.fixing_date = _adjust_dates(self.accrual_start - lags, 'preceding')
+
+    def _gen_dates(self):
+        '''Private function to backward generate the unadjusted period end
+        dates of every swap, starting from the maturity to the effective.
+
+        Note that the effective date is not returned. Returns the period end
+        dates, in ascending order for each swap, and the index of the swap
+        that each date belongs to.
+        '''
+        months = self.period_length == 'months'
+        weeks = self.period_length == 'weeks'
+        days = self.period_length == 'days'
+        unknown = ~(months | weeks | days)
+        if unknown.any():
+            period_length = self.period_length[unknown][0]
+            raise Exception('Period length "{period_length}" not '
+                            'recognized'.format(**locals()))
+
+        step_days = np.where(weeks, 7, 1) * self.length
+        maturity_months = self.maturity.astype('datetime64[M]')
+        effective_months = self.effective.astype('datetime64[M]')
+        month_span = (maturity_months - effective_months).astype(np.int64)
+        day_span = (self.maturity - self.effective).astype(np.int64)
+
+        # upper bound on the number of periods of each swap
+        candidates = np.where(months,
+                              month_span // np.maximum(self.length, 1),
+                              day_span // np.maximum(step_days, 1)) + 2
+        candidates = np.maximum(candidates, 0)
+        offsets = np.zeros(len(self), dtype=np.int64)
+        offsets[1:] = np.cumsum(candidates)[:-1]
+        swap = np.repeat(np.arange(len(self)), candidates)
+        counter = np.arange(candidates.sum()) - offsets[swap]
+
+        dates = _shift_dates(self.maturity[swap],
+                             -counter * self.length[swap],
+                             self.period_length[swap])
+
+        mask = dates > self.effective[swap]
+        dates, swap, counter = dates[mask], swap[mask], counter[mask]
+
+        # reverse the dates of each swap into ascending order
+        counts = np.bincount(swap, minlength=len(self))
+        starts = np.zeros(len(self), dtype=np.int64)
+        starts[1:] = np.cumsum(counts)[:-1]
+        order = np.empty_like(dates)
+        order[starts[swap] + counts[swap] - 1 - counter] = dates
+        return order, swap
+
+    def periods(self, index):
+        '''Returns the periods of a single swap as a numpy record array, in
+        the same form as Schedule.periods
+        '''
+        return self._records(self.offsets[index], self.offsets[index + 1])
+
+    def _records(self, start, end):
+        '''Private method to return the periods start:end of the period
+        columns as a numpy record array, see periods
+        '''
+        size = end - start
+        return np.rec.fromarrays((self.fixing_date[start:end],
+                                  self.accrual_start[start:end],
+                                  self.accrual_end[start:end],
+                                  self.payment_date[start:end],
+                                  np.zeros(size, dtype=np.float64),
+                                  np.zeros(size, dtype=np.float64)),
+                                 dtype=[('fixing_date', 'datetime64[D]'),
+                                        ('accrual_start', 'datetime64[D]'),
+                                        ('accrual_end', 'datetime64[D]'),
+                                        ('payment_date', 'datetime64[D]'),
+                                        ('cashflow', np.float64),
+                                        ('PV', np.float64)])
+
+
+def _shift_dates(dates, lengths, period_lengths):
+    '''Function to return an array of dates shifted by a number of periods.
+    Vectorized equivalent of adding a dateutil relativedelta, so month
+    shifts keep the day of the month, clamped to the end of the month.
+
+    Arguments:
+        dates (np.array)            : datetime64[D] dates to be shifted
+        lengths (np.array or int)   : number of periods to shift each date by
+        period_lengths (np.array or str)
+                                    : period type for the lengths
+                                      available: months, weeks, days
+    '''
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    lengths = np.asarray(lengths, dtype=np.int64)
+    period_lengths = np.asarray(period_lengths)
+    months = period_lengths == 'months'
+    weeks = period_lengths == 'weeks'
+    days = period_lengths == 'days'
+    unknown = ~(months | weeks | days)
+    if unknown.any():
+        period_length = np.atleast_1d(period_lengths[unknown])[0]
+        raise Exception('Period length "{period_length}" not '
+                        'recognized'.format(**locals()))
+
+    month_starts = dates.astype('datetime64[M]')
+    target_months = month_starts + lengths.astype('timedelta64[M]')
+    month_days = dates - month_starts.astype('datetime64[D]')
+    month_ends = (target_months + 1).astype('datetime64[D]')
+    month_dates = np.minimum(target_months.astype('datetime64[D]') + month_days,
+                             month_ends - 1)
+
+    day_dates = dates + (np.where(weeks, 7, 1) * lengths).astype('timedelta64[D]')
+    return np.where(months, month_dates, day_dates)
+
+
+def _adjust_dates(dates, adjustment):
+    '''Function to return an array of dates that are adjusted according to
+    the adjustment convention method defined. Vectorized equivalent of the
+    Schedule._date_adjust method.
+
+    Arguments:
+        dates (np.array)    : datetime64[D] dates to be adjusted
+        adjustment (str)    : Adjustment type
+                              available: unadjusted,
+                                         following,
+                                         preceding,
+                                         modified following
+    '''
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    # 1970-01-01 is a Thursday, so Monday is 0 and Sunday is 6
+    weekdays = (dates.astype(np.int64) + 3) % 7
+    weekend = weekdays >= 5
+    if adjustment == 'unadjusted':
+        return dates
+    elif adjustment == 'following':
+        shift = np.where(weekend, 7 - weekdays, 0)
+        return dates + shift.astype('timedelta64[D]')
+    elif adjustment == 'preceding':
+        shift = np.where(weekend, np.maximum(0, weekdays - 5), 0)
+        return dates - shift.astype('timedelta64[D]')
+    elif adjustment == 'modified following':
+        following = _adjust_dates(dates, 'following')
+        same_month = (following.astype('datetime64[M]') ==
+                      dates.astype('datetime64[M]'))
+        preceding = dates - (7 - weekdays).astype('timedelta64[D]')
+        return np.where(same_month, following, preceding)
+    else:
+        raise Exception('Adjustment period not recognized')
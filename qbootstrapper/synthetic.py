@@ -0,0 +1,500 @@
+#! /usr/bin/env python
+# vim: set fileencoding=utf-8
+'''
+Copyright (c) Kevin Keogh 2016
+
+Implements the SyntheticMarket object, a generator of synthetic, but
+internally consistent, markets for load testing and benchmarking: curve
+definitions, quotes and quote histories, swap portfolios, quote tick streams
+and simultaneous basis curves, at any scale.
+
+Each market has an OIS curve and a LIBOR curve discounted on it. The quotes
+are priced off smooth random Nelson-Siegel term structures, the OIS zero
+curve and the LIBOR/OIS basis, so every curve builds. The quotes are
+approximate par rates (e.g., 30360 accruals are taken as Act365), which is
+all that is needed for the curves to be realistic.
+
+Everything is deterministic for a given seed: each method draws from its
+own numpy RandomState, seeded by the market seed and the method arguments,
+so the results do not depend on the order the methods are called in.
+'''
+# python libraries
+from __future__ import division
+import csv
+import dateutil.relativedelta
+import json
+import numpy as np
+
+# qlib libraries
+import qbootstrapper.curves as curves
+import qbootstrapper.instruments as instruments
+import qbootstrapper.loader as loader
+
+MARKET_NAMES = ['USD', 'EUR', 'GBP', 'JPY', 'CHF', 'CAD', 'AUD', 'SEK',
+                'NOK', 'NZD']
+
+OIS_CONVENTIONS = {'fixed_length': 12,
+                   'float_length': 12,
+                   'fixed_basis': 'Act360',
+                   'float_basis': 'Act360',
+                   'fixed_period_adjustment': 'following',
+                   'float_period_adjustment': 'following',
+                   'fixed_payment_adjustment': 'following',
+                   'float_payment_adjustment': 'following'}
+
+LIBOR_CONVENTIONS = {'fixed_length': 6,
+                     'float_length': 3,
+                     'fixed_basis': '30360',
+                     'float_basis': 'Act360',
+                     'fixed_period_adjustment': 'following',
+                     'float_period_adjustment': 'following',
+                     'fixed_payment_adjustment': 'following',
+                     'float_payment_adjustment': 'following',
+                     'rate_period': 3,
+                     'rate_period_length': 'months'}
+
+PORTFOLIO_TENORS = [1, 2, 3, 5, 7, 10, 12, 15, 20, 25, 30]
+
+# salts of the random states of each method
+_HISTORY, _PORTFOLIO, _TICKS, _STRUCTURES = 1, 2, 3, 4
+
+
+class TermStructure(object):
+    '''Nelson-Siegel term structure of continuously compounded zero rates,
+
+        zero(t) = level + slope * (1 - exp(-t / decay)) / (t / decay) +
+                  curvature * ((1 - exp(-t / decay)) / (t / decay) -
+                               exp(-t / decay))
+
+    with t in years.
+
+    Arguments:
+        level (float)       : Long end zero rate
+        slope (float)       : Short end zero rate less the long end
+        curvature (float)   : Hump of the medium term zero rates
+
+        kwargs
+        ------
+        decay (float)       : Decay of the slope and curvature, in years
+                              [default: 2.0]
+    '''
+    def __init__(self, level, slope, curvature, decay=2.0):
+        self.level = level
+        self.slope = slope
+        self.curvature = curvature
+        self.decay = decay
+
+    @classmethod
+    def random(cls, random_state, level=0.025):
+        '''Returns a random upward sloping term structure around a level
+        '''
+        return cls(level + random_state.normal(0, 0.005),
+                   -abs(random_state.normal(0.015, 0.005)),
+                   random_state.normal(0, 0.01),
+                   random_state.uniform(1.0, 4.0))
+
+    def zero(self, years):
+        '''Returns the zero rates of a tenor, or array of tenors, in years
+        '''
+        years = np.maximum(np.asarray(years, dtype=np.float64), 1e-6)
+        scaled = years / self.decay
+        loading = (1 - np.exp(-scaled)) / scaled
+        return (self.level + self.slope * loading +
+                self.curvature * (loading - np.exp(-scaled)))
+
+    def discount_factor(self, years):
+        '''Returns the discount factors of a tenor, or array of tenors
+        '''
+        return np.exp(-self.zero(years) * np.asarray(years, dtype=np.float64))
+
+    def shocked(self, shocks):
+        '''Returns the term structure with the level, slope and curvature
+        shifted by a sequence of 3 shocks
+        '''
+        level, slope, curvature = shocks
+        return TermStructure(self.level + level, self.slope + slope,
+                             self.curvature + curvature, self.decay)
+
+
+class SyntheticMarket(object):
+    '''Generator of synthetic markets of OIS and LIBOR curves
+
+    kwargs
+    ------
+    seed (int)              : Seed of every random draw [default: 0]
+    markets (int)           : Number of markets, each with an OIS and a
+                              LIBOR curve [default: 1]
+    ois_pillars (int)       : Maximum number of OIS swaps in each OIS curve,
+                              spread geometrically from 1 month to 50 years
+                              [default: 30]
+    libor_pillars (int)     : Maximum number of LIBOR swaps in each LIBOR
+                              curve, spread geometrically from the end of
+                              the futures strip to 50 years
+                              [default: 20]
+    futures (int)           : Number of quarterly futures in the strip of
+                              each LIBOR curve [default: 8]
+    volatility (float)      : Daily volatility of the level of the term
+                              structures in the quote histories and tick
+                              streams, with half of it for the slope and
+                              curvature
+                              [default: 0.0005]
+
+    Attributes:
+        definitions (list)  : CurveDefinition of each curve, OIS curves
+                              first
+        structures (dict)   : (OIS, basis) TermStructure tuples, keyed by
+                              market name
+    '''
+    def __init__(self, seed=0, markets=1, ois_pillars=30, libor_pillars=20,
+                 futures=8, volatility=0.0005):
+        self.seed = seed
+        self.volatility = volatility
+        self.names = [MARKET_NAMES[i] if i < len(MARKET_NAMES) else
+                      'M{0}'.format(i) for i in range(markets)]
+
+        random_state = self._random_state(_STRUCTURES)
+        self.structures = {}
+        for name in self.names:
+            ois = TermStructure.random(random_state)
+            basis = TermStructure(abs(random_state.normal(0.002, 0.0005)),
+                                  abs(random_state.normal(0.002, 0.001)),
+                                  0.0, 1.0)
+            self.structures[name] = (ois, basis)
+
+        self.definitions = []
+        self._markets = {}
+        for name in self.names:
+            self.definitions.append(self._ois_definition(name, ois_pillars))
+            self._markets[name + '_OIS'] = name
+        for name in self.names:
+            self.definitions.append(self._libor_definition(name, libor_pillars,
+                                                           futures))
+            self._markets[name + '_LIBOR'] = name
+        self._definitions = dict((definition.name, definition)
+                                 for definition in self.definitions)
+
+    def quotes(self, as_of, structures=None):
+        '''Returns the quote rows of every curve for an as-of date, as dicts
+        with date, curve, instrument and quote keys
+
+        kwargs
+        ------
+        structures (dict)   : Term structures to price the quotes off, as
+                              the structures attribute
+                              [default: the structures attribute]
+        '''
+        structures = structures or self.structures
+        rows = []
+        for definition in self.definitions:
+            ois, basis = structures[self._markets[definition.name]]
+            for spec in definition.instruments:
+                rows.append({'date': as_of.strftime('%Y-%m-%d'),
+                             'curve': definition.name,
+                             'instrument': spec['id'],
+                             'quote': self._quote(definition, spec, ois, basis)})
+        return rows
+
+    def history(self, start, days):
+        '''Returns the quote rows of a number of business days from a start
+        date, with the term structures following a random walk, sorted by
+        date as the loader requires
+        '''
+        random_state = self._random_state(_HISTORY, start.toordinal(), days)
+        structures = dict(self.structures)
+        dates = np.busday_offset(np.datetime64(start.date()),
+                                 np.arange(days), roll='following')
+        rows = []
+        for date in dates:
+            rows.extend(self.quotes(date.astype(object), structures))
+            structures = self._walk(structures, random_state)
+        return rows
+
+    def curves(self, as_of):
+        '''Returns the unbuilt curves for an as-of date, keyed by name, with
+        the LIBOR curves linked to their OIS curves
+        '''
+        return loader.build_curve_set(loader.order_definitions(self.definitions),
+                                      as_of, self.quotes(as_of))
+
+    def portfolio(self, size, as_of):
+        '''Returns the columns of a synthetic portfolio of swaps for use with
+        SwapPortfolio: LIBOR and OIS swaps of every market, pay and receive
+        fixed, spot and forward starting, struck around par
+
+        Arguments:
+            size (int)          : Number of swaps
+            as_of (datetime)    : As-of date of the portfolio
+        '''
+        random_state = self._random_state(_PORTFOLIO, size, as_of.toordinal())
+        market = random_state.randint(0, len(self.names), size)
+        ois = random_state.rand(size) < 0.3
+        tenor = np.array(PORTFOLIO_TENORS)[random_state.randint(0, len(PORTFOLIO_TENORS), size)]
+        # SwapPortfolio values every cashflow, so the swaps start on or
+        # after the as-of date: spot, or forward starting within a year
+        start = np.where(random_state.rand(size) < 0.7, 2,
+                         random_state.randint(2, 366, size))
+        effective = np.datetime64(as_of.date()) + start
+        months = effective.astype('datetime64[M]')
+        maturity = ((months + 12 * tenor).astype('datetime64[D]') +
+                    (effective - months.astype('datetime64[D]')))
+
+        years = np.maximum(start / 365 + tenor / 2, 0.1)
+        rate = np.empty(size)
+        for code, name in enumerate(self.names):
+            mask = market == code
+            rate[mask] = (self.structures[name][0].zero(years[mask]) +
+                          ~ois[mask] * self.structures[name][1].zero(years[mask]))
+        rate += random_state.normal(0, 0.0025, size)
+
+        names = np.array(self.names)[market]
+        index = np.where(ois, 'OIS', 'LIBOR')
+        return {'effective': effective,
+                'maturity': maturity,
+                'rate': np.round(rate, 6),
+                'notional': np.round(random_state.lognormal(np.log(1e7), 1, size) *
+                                     np.where(random_state.rand(size) < 0.5, 1, -1), -3),
+                'projection_curve': np.char.add(names, np.where(ois, '_OIS', '_LIBOR')),
+                'discount_curve': np.char.add(names, '_OIS'),
+                'index': index,
+                'fixed_length': np.where(ois, 12, 6),
+                'fixed_basis': np.where(ois, 'Act360', '30360'),
+                'float_length': np.where(ois, 12, 3),
+                'rate_period': 3,
+                'spread': 0.0}
+
+    def ticks(self, count, as_of):
+        '''Generator of count quote ticks, as dicts with curve, instrument and
+        quote keys (see service.LocalQuoteFeed), each moving the quote of a
+        random instrument by a random amount from its last tick
+        '''
+        random_state = self._random_state(_TICKS, count, as_of.toordinal())
+        rows = self.quotes(as_of)
+        last = [row['quote'] for row in rows]
+        scales = np.array([100 if self._spec(row)['type'] == 'futures' else 1
+                           for row in rows])
+        for _ in range(count):
+            position = random_state.randint(len(rows))
+            move = random_state.normal(0, self.volatility) * scales[position]
+            last[position] = float(round(last[position] - move if scales[position] > 1
+                                         else last[position] + move, 7))
+            yield {'curve': rows[position]['curve'],
+                   'instrument': rows[position]['instrument'],
+                   'quote': last[position]}
+
+    def basis_curve(self, as_of, market=None, tenors=(7, 10, 15, 20, 30)):
+        '''Returns an unbuilt SimultaneousStrippedCurve for a market, with
+        the OIS and LIBOR instruments shorter than the first basis tenor,
+        and a pair of an average index basis swap and a LIBOR swap for each
+        basis tenor
+
+        Arguments:
+            as_of (datetime)    : As-of date of the curve
+
+            kwargs
+            ------
+            market (str)        : Name of the market
+                                  [default: the first market]
+            tenors (tuple)      : Basis swap tenors in years
+                                  [default: (7, 10, 15, 20, 30)]
+        '''
+        market = market or self.names[0]
+        ois, basis = self.structures[market]
+        cutoff = as_of + _years(tenors[0] - 0.5)
+        short = self.curves(as_of)
+        ois_curve = short[market + '_OIS']
+        libor_curve = short[market + '_LIBOR']
+        for curve in (ois_curve, libor_curve):
+            curve.instruments = [instrument for instrument in curve.instruments
+                                 if instrument.maturity < cutoff]
+
+        curve = curves.SimultaneousStrippedCurve(as_of, ois_curve, libor_curve)
+        spot = self._definitions[market + '_LIBOR'].spot_date(as_of)
+        for tenor in tenors:
+            maturity = spot + _years(tenor)
+            end = _year_fraction(as_of, maturity)
+            start = _year_fraction(as_of, spot)
+            spread = _average_basis(ois, basis, start, end)
+            libor_rate = _libor_par_rate(ois, basis, start, end, LIBOR_CONVENTIONS)
+            pair = instruments.SimultaneousInstrument(
+                instruments.AverageIndexBasisSwapInstrument(spot, maturity, curve,
+                                                            leg_one_spread=spread),
+                instruments.LIBORSwapInstrument(spot, maturity, libor_rate,
+                                                libor_curve, **LIBOR_CONVENTIONS),
+                curve)
+            curve.add_instrument(pair)
+        return curve
+
+    def _random_state(self, *salt):
+        '''Private method to return a RandomState seeded by the market seed
+        and a salt
+        '''
+        return np.random.RandomState([self.seed % 2 ** 32] +
+                                     [value % 2 ** 32 for value in salt])
+
+    def _walk(self, structures, random_state):
+        '''Private method to return the term structures moved by one day of
+        the random walk
+        '''
+        scale = self.volatility * np.array([1, 0.5, 0.5])
+        return dict((name, (ois.shocked(random_state.normal(0, scale)), basis))
+                    for name, (ois, basis) in sorted(structures.items()))
+
+    def _spec(self, row):
+        '''Private method to return the instrument specification of a row
+        '''
+        return self._definitions[row['curve']]._instruments[row['instrument']]
+
+    def _ois_definition(self, name, pillars):
+        '''Private method to return the OIS curve definition of a market
+        '''
+        specs = [{'id': 'ON', 'type': 'cash', 'tenor': '1D'}]
+        for months in _months(1, 600, pillars):
+            spec = {'id': '{0}M'.format(months), 'type': 'ois_swap',
+                    'tenor': '{0}M'.format(months)}
+            if months < 12:
+                spec['conventions'] = {'fixed_length': months,
+                                       'float_length': months}
+            specs.append(spec)
+        return loader.CurveDefinition(name + '_OIS', specs,
+                                      curve_type='OISCurve',
+                                      conventions={'ois_swap': OIS_CONVENTIONS})
+
+    def _libor_definition(self, name, pillars, futures):
+        '''Private method to return the LIBOR curve definition of a market
+        '''
+        specs = [{'id': tenor, 'type': 'cash', 'tenor': tenor}
+                 for tenor in ('1W', '1M', '2M', '3M')]
+        for i in range(futures):
+            specs.append({'id': 'F{0}'.format(i + 1), 'type': 'futures',
+                          'forward_tenor': '{0}M'.format(3 * (i + 1)),
+                          'tenor': '{0}M'.format(3 * (i + 2))})
+        first = max(24, 12 * ((3 * (futures + 1)) // 12 + 1))
+        for months in _months(first, 600, pillars):
+            specs.append({'id': '{0}M'.format(months), 'type': 'libor_swap',
+                          'tenor': '{0}M'.format(months)})
+        return loader.CurveDefinition(name + '_LIBOR', specs,
+                                      curve_type='LIBORCurve',
+                                      discount_curve=name + '_OIS',
+                                      conventions={'libor_swap': LIBOR_CONVENTIONS})
+
+    def _quote(self, definition, spec, ois, basis):
+        '''Private method to price the quote of an instrument off the term
+        structures
+        '''
+        kind = spec['type']
+        start = 0 if spec.get('start', 'today' if kind == 'cash' else 'spot') == 'today' else 2 / 365
+        if 'forward_tenor' in spec:
+            start += _tenor_years(spec['forward_tenor'])
+        end = start + _tenor_years(spec['tenor'])
+
+        libor = definition.discount_curve is not None
+        if kind in ('cash', 'fra', 'futures'):
+            rate = _simple_rate(ois, basis if libor else None, start, end)
+            return float(round(100 * (1 - rate), 5) if kind == 'futures'
+                         else round(rate, 6))
+        conventions = dict(definition.conventions.get(kind, {}))
+        conventions.update(spec.get('conventions', {}))
+        if kind == 'ois_swap':
+            return float(round(_ois_par_rate(ois, start, end, conventions), 6))
+        return float(round(_libor_par_rate(ois, basis, start, end, conventions), 6))
+
+
+def write_quotes(path, rows):
+    '''Writes quote rows to a CSV (.csv) or JSON lines file, in the format
+    read by loader.read_quotes
+    '''
+    with open(path, 'w') as quote_file:
+        if path.endswith('.csv'):
+            writer = csv.DictWriter(quote_file,
+                                    ['date', 'curve', 'instrument', 'quote'])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+        else:
+            for row in rows:
+                quote_file.write(json.dumps(row, sort_keys=True) + '\n')
+
+
+def _months(first, last, count):
+    '''Private function to return up to count distinct month tenors spread
+    geometrically from first to last
+    '''
+    if count < 1:
+        return []
+    return [int(months) for months in
+            np.unique(np.round(np.geomspace(first, last, count)).astype(int))]
+
+
+def _tenor_years(tenor):
+    '''Private function to return a tenor string in years
+    '''
+    length, length_type = loader.parse_tenor(tenor)
+    return length * {'days': 1 / 365, 'weeks': 7 / 365, 'months': 1 / 12}[length_type]
+
+
+def _years(years):
+    '''Private function to return a relativedelta of a number of years
+    '''
+    return dateutil.relativedelta.relativedelta(months=int(round(12 * years)))
+
+
+def _year_fraction(start, end):
+    '''Private function to return the Act365 years between two datetimes
+    '''
+    return (end - start).days / 365
+
+
+def _simple_rate(ois, basis, start, end):
+    '''Private function to return the Act360 simple forward rate between two
+    tenors, projected off the OIS curve plus the basis, if any
+    '''
+    log_df = np.log(ois.discount_factor(start) / ois.discount_factor(end))
+    if basis is not None:
+        log_df += np.log(basis.discount_factor(start) / basis.discount_factor(end))
+    return (np.exp(log_df) - 1) / ((end - start) * 365 / 360)
+
+
+def _accrual_dates(start, end, months):
+    '''Private function to return the period end tenors of a schedule of
+    periods of a number of months, rolled back from the end
+    '''
+    step = months / 12
+    periods = max(1, int(round((end - start) / step)))
+    return end - step * np.arange(periods)[::-1]
+
+
+def _ois_par_rate(ois, start, end, conventions):
+    '''Private function to return the approximate par rate of an OIS swap
+    '''
+    dates = _accrual_dates(start, end, conventions['fixed_length'])
+    accruals = np.diff(np.append(start, dates)) * 365 / 360
+    annuity = (accruals * ois.discount_factor(dates)).sum()
+    return (ois.discount_factor(start) - ois.discount_factor(end)) / annuity
+
+
+def _libor_par_rate(ois, basis, start, end, conventions):
+    '''Private function to return the approximate par rate of a LIBOR swap,
+    projected off the OIS curve plus the basis and discounted on the OIS
+    curve
+    '''
+    fixed = _accrual_dates(start, end, conventions['fixed_length'])
+    fixed_accruals = np.diff(np.append(start, fixed))
+    annuity = (fixed_accruals * ois.discount_factor(fixed)).sum()
+
+    floating = _accrual_dates(start, end, conventions['float_length'])
+    starts = np.append(start, floating[:-1])
+    rates = _simple_rate(ois, basis, starts, floating)
+    accruals = (floating - starts) * 365 / 360
+    return (rates * accruals * ois.discount_factor(floating)).sum() / annuity
+
+
+def _average_basis(ois, basis, start, end):
+    '''Private function to return the approximate spread over the average
+    OIS rate of an average index basis swap against 3 month LIBOR, the
+    average 3 month LIBOR/OIS spread
+    '''
+    floating = _accrual_dates(start, end, 3)
+    starts = np.append(start, floating[:-1])
+    spreads = (_simple_rate(ois, basis, starts, floating) -
+               _simple_rate(ois, None, starts, floating))
+    return round(float(spreads.mean()), 6)
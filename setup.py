@@ -1,4 +1,9 @@
-from distutils.core import setup
+try:
+    from setuptools import setup
+except ImportError:
+    # distutils installs the package without the console command, run it
+    # with python -m qbootstrapper instead
+    from distutils.core import setup
 
 VERSION = '0.1'
 LICENSE = 'MIT'
@@ -8,9 +13,15 @@ setup(
         packages=['qbootstrapper'],
         version=VERSION,
         license=LICENSE,
+        python_requires='>=3.8',
         install_requires=[
-            'scipy',
-            'numpy',
-            'python-dateutil',
+            'scipy>=1.2.0',
+            'numpy>=1.15.0',
+            'python-dateutil>=2.6.0',
             ],
+        entry_points={
+            'console_scripts': [
+                'qbootstrapper = qbootstrapper.cli:main',
+                ],
+            },
      )
@@ -0,0 +1,61 @@
+'''
+Copyright (c) Kevin Keogh 2016
+
+Fixtures of the example curves of examples.py. The curves are created
+(unbuilt) from a fresh run of examples.py for every test module that uses
+them, so that a test that changes its curves does not affect other modules.
+'''
+import contextlib
+import os
+import runpy
+import time
+
+import pytest
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        'examples.py')
+
+
+def run_examples():
+    '''Returns the namespace of a run of examples.py
+    '''
+    return runpy.run_path(EXAMPLES)
+
+
+@contextlib.contextmanager
+def local_timezone(name):
+    '''Context manager that sets the local timezone, e.g., Asia/Tokyo
+    '''
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset is not available')
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = name
+    time.tzset()
+    try:
+        yield
+    finally:
+        if previous is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = previous
+        time.tzset()
+
+
+@pytest.fixture(scope='module')
+def examples():
+    return run_examples()
+
+
+@pytest.fixture
+def timezone(monkeypatch):
+    '''Sets the local timezone for the test, e.g., timezone('Asia/Tokyo')
+    '''
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset is not available')
+
+    def set_timezone(name):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+    yield set_timezone
+    monkeypatch.undo()
+    time.tzset()
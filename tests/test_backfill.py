@@ -0,0 +1,118 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import builtins
+import datetime
+import json
+import os
+
+import numpy as np
+import pytest
+
+import qbootstrapper.backfill as backfill
+from qbootstrapper.backfill import BackfillRunner, read_checkpoint
+from qbootstrapper.store import CurveStore
+from qbootstrapper.synthetic import SyntheticMarket, write_quotes
+
+
+@pytest.fixture
+def market(tmp_path):
+    '''Returns a small synthetic market, the path of six business days of its
+    quotes and the as-of dates
+    '''
+    market = SyntheticMarket(seed=5, ois_pillars=8, libor_pillars=6, futures=2)
+    rows = market.history(datetime.datetime(2016, 6, 27), 6)
+    # no OIS quotes on the fourth date, so its LIBOR curve fails
+    fourth = sorted(set(row['date'] for row in rows))[3]
+    rows = [row for row in rows
+            if not (row['date'] == fourth and row['curve'] == 'USD_OIS')]
+    path = str(tmp_path / 'quotes.csv')
+    write_quotes(path, rows)
+    dates = sorted(set(datetime.datetime.strptime(row['date'], '%Y-%m-%d')
+                       for row in rows))
+    return market, path, dates
+
+
+def test_skipped_counts_only_the_dates_of_the_run(tmp_path, market):
+    market, path, dates = market
+    output = str(tmp_path / 'backfill')
+    first = BackfillRunner(market.definitions, [path], output, processes=1,
+                           chunk_size=2, end=dates[2]).run()
+    assert (first.dates, first.skipped) == (3, 0)
+
+    second = BackfillRunner(market.definitions, [path], output, processes=1,
+                            chunk_size=2, start=dates[2], end=dates[4]).run()
+    assert (second.dates, second.skipped) == (2, 1)
+    assert read_checkpoint(output) == set(dates[:5])
+
+
+def chunk_numbers(output):
+    store = CurveStore(output)
+    return dict((name, sorted(int(path[-6:]) for _, _, path in store.chunks(name)))
+                for name in store.names())
+
+
+def resume_after(tmp_path, market, monkeypatch, interrupt):
+    '''Runs a backfill in chunks of two dates, which interrupt(monkeypatch,
+    output) interrupts while the second chunk is written, resumes it, and
+    checks the output against an uninterrupted backfill
+    '''
+    market, path, dates = market
+    output = str(tmp_path / 'backfill')
+    with monkeypatch.context() as patch:
+        interrupt(patch, output)
+        with pytest.raises(KeyboardInterrupt):
+            BackfillRunner(market.definitions, [path], output, processes=1,
+                           chunk_size=2).run()
+    # the second chunk is reserved, with no failures before it
+    with open(os.path.join(output, backfill.CHECKPOINT)) as checkpoint:
+        assert checkpoint.readlines()[-1] == 'chunk 1 0\n'
+
+    report = BackfillRunner(market.definitions, [path], output, processes=1,
+                            chunk_size=2).run()
+    assert (report.dates, report.skipped) == (4, 2)
+    assert read_checkpoint(output) == set(dates)
+    with open(os.path.join(output, backfill.CHECKPOINT)) as checkpoint:
+        reserved = [line for line in checkpoint if line.startswith('chunk ')]
+    assert [line.split()[1] for line in reserved] == ['0', '1', '2']
+
+    # the interrupted chunk is written again under its own number
+    assert chunk_numbers(output) == {'USD_LIBOR': [0, 1, 2], 'USD_OIS': [0, 1, 2]}
+    store = CurveStore(output)
+    np.testing.assert_array_equal(store.dates('USD_LIBOR'),
+                                  np.array([date.date() for date in dates
+                                            if date != dates[3]],
+                                           dtype='datetime64[D]'))
+    with open(os.path.join(output, backfill.FAILURES)) as failures:
+        failed = [json.loads(line) for line in failures]
+    assert [(failure['date'], failure['curve']) for failure in failed] == [
+        (dates[3].strftime('%Y-%m-%d'), 'USD_LIBOR')]
+
+
+def test_resume_rewrites_a_partly_written_chunk(tmp_path, market, monkeypatch):
+    def interrupt_append(patch, output):
+        # the first curve of the second chunk is written, the second not
+        append = CurveStore.append
+
+        def interrupted(store, name, entries, chunk=None, **kwargs):
+            if chunk == 1 and store.next_chunk() == 2:
+                raise KeyboardInterrupt
+            return append(store, name, entries, chunk=chunk, **kwargs)
+        patch.setattr(CurveStore, 'append', interrupted)
+    resume_after(tmp_path, market, monkeypatch, interrupt_append)
+
+
+def test_resume_removes_the_failures_of_an_unfinished_chunk(tmp_path, market,
+                                                            monkeypatch):
+    def interrupt_checkpoint(patch, output):
+        # the second chunk and its failures are written, but not its dates
+        opened = []
+
+        def interrupted(path, *args, **kwargs):
+            if path == os.path.join(output, backfill.CHECKPOINT) and args[:1] == ('a',):
+                opened.append(path)
+                if len(opened) == 4:
+                    raise KeyboardInterrupt
+            return builtins.open(path, *args, **kwargs)
+        patch.setattr(backfill, 'open', interrupted, raising=False)
+    resume_after(tmp_path, market, monkeypatch, interrupt_checkpoint)
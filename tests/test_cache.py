@@ -0,0 +1,37 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import numpy as np
+
+from qbootstrapper.cache import BuildCache
+from qbootstrapper.risk import BucketedRiskRunner
+
+from conftest import run_examples
+
+
+def test_bumped_rebuilds_are_not_cached(tmp_path):
+    eonia = run_examples()['eonia']
+    eonia.cache = BuildCache(str(tmp_path))
+    eonia.enable_fast_update()
+    BucketedRiskRunner(eonia, processes=1).run()
+    assert len(eonia.cache._entries()) == 1
+
+    pillars = eonia.curve.copy()
+    eonia.set_quotes(eonia.quotes())
+    eonia.build()
+    np.testing.assert_array_equal(eonia.curve, pillars)
+    assert eonia.build_report.cached
+
+
+def test_use_cache_false_skips_the_cache(tmp_path):
+    fedfunds_libor = run_examples()['fedfunds_libor']
+    fedfunds_libor.cache = BuildCache(str(tmp_path))
+    fedfunds_libor.build(use_cache=False)
+    assert fedfunds_libor.cache.hits == fedfunds_libor.cache.misses == 0
+    assert not fedfunds_libor.cache._entries()
+
+    pillars = fedfunds_libor.projection_curve.curve.copy()
+    fedfunds_libor.build()
+    fedfunds_libor.build()
+    assert (fedfunds_libor.cache.hits, fedfunds_libor.cache.misses) == (1, 1)
+    np.testing.assert_array_equal(fedfunds_libor.projection_curve.curve, pillars)
@@ -0,0 +1,38 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import json
+
+import numpy as np
+import pytest
+
+import qbootstrapper.capture as capture
+from qbootstrapper.instrumentset import InstrumentSet
+
+
+def round_trip(curve):
+    '''Returns the restored curve of the JSON capture of a curve
+    '''
+    return capture.restore(json.loads(json.dumps(capture.capture(curve))))
+
+
+@pytest.mark.parametrize('name', ['eonia', 'usdlibor', 'fedfunds_libor'])
+def test_replay_matches_captured_pillars(examples, name):
+    curve = examples[name]
+    curve.build()
+    document = json.loads(json.dumps(capture.capture(curve)))
+    replayed, _ = capture.replay(document, profile=False)
+    assert all(difference == 0
+               for difference in capture.compare(replayed, document).values())
+
+
+def test_capture_of_unbuilt_instrument_set_curve(examples):
+    eonia = examples['eonia']
+    eonia.build()
+    columnar = type(eonia)(examples['curve_effective'])
+    columnar.set_instruments(InstrumentSet.from_instruments(eonia.instruments))
+
+    restored = round_trip(columnar)
+    assert len(restored.instruments) == len(eonia.instruments)
+    restored.build()
+    np.testing.assert_array_equal(restored.curve, eonia.curve)
@@ -0,0 +1,115 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+import json
+
+import numpy as np
+import pytest
+
+import qbootstrapper.capture as capture
+from qbootstrapper import cli, loader
+from qbootstrapper.synthetic import SyntheticMarket, write_quotes
+
+START = datetime.datetime(2016, 6, 28)
+DATES = ['2016-06-28', '2016-06-29', '2016-06-30']
+
+
+def small_market():
+    return SyntheticMarket(seed=3, ois_pillars=8, libor_pillars=6, futures=2)
+
+
+def write_market(tmp_path, rows):
+    '''Writes the definitions and the quote rows of the small synthetic
+    market, returns the build arguments that read them
+    '''
+    definitions = tmp_path / 'curves.json'
+    definitions.write_text(json.dumps([definition.to_dict()
+                                       for definition in small_market().definitions]))
+    quotes = tmp_path / 'quotes.csv'
+    write_quotes(str(quotes), rows)
+    return ['build', '--definitions', str(definitions), '--quotes', str(quotes)]
+
+
+@pytest.fixture
+def market_files(tmp_path):
+    '''Writes the definitions and three days of quotes of a small synthetic
+    market, returns the build arguments that read them
+    '''
+    return write_market(tmp_path, small_market().history(START, 3))
+
+
+def test_unknown_curve_is_a_usage_error(market_files, capsys):
+    assert cli.main(market_files + ['--curves', 'USD_OIS', 'NOPE']) == 2
+    captured = capsys.readouterr()
+    assert captured.err == 'qbootstrapper: curve "NOPE" not in the definitions\n'
+    assert captured.out == ''
+
+
+def timing_rows(output):
+    '''Returns the builds and failures of each curve in the printed timings
+    '''
+    lines = output.splitlines()
+    header = lines.index(next(line for line in lines if line.startswith('curve ')))
+    return dict((line.split()[0], tuple(int(value) for value in line.split()[1:3]))
+                for line in lines[header + 1:-1])
+
+
+def test_build_writes_the_pillars_of_every_date(tmp_path, market_files, capsys):
+    path = str(tmp_path / 'pillars.npz')
+    assert cli.main(market_files + ['--output', path]) == 0
+    captured = capsys.readouterr()
+    assert captured.err == ''
+    assert timing_rows(captured.out) == {'USD_OIS': (3, 0), 'USD_LIBOR': (3, 0)}
+    assert captured.out.splitlines()[-1].startswith('6 curves in ')
+
+    with np.load(path, allow_pickle=False) as columns:
+        columns = dict(columns)
+    assert sorted(set(columns['as_of'].astype(str))) == DATES
+
+    market = small_market()
+    for date in DATES:
+        as_of = loader._date(date)
+        curves = loader.build_curve_set(loader.order_definitions(market.definitions),
+                                        as_of, [row for row in market.history(START, 3)
+                                                if row['date'] == date])
+        for name, curve in curves.items():
+            curve.build()
+            rows = (columns['as_of'].astype(str) == date) & (columns['curve'] == name)
+            np.testing.assert_array_equal(columns['maturity'][rows],
+                                          curve.curve['maturity'])
+            np.testing.assert_array_equal(columns['log_discount_factor'][rows],
+                                          curve.curve['discount_factor'])
+
+
+def test_build_of_selected_curves_and_dates(market_files, capsys):
+    # the LIBOR curve is built with its discount curve
+    assert cli.main(market_files + ['--curves', 'USD_LIBOR', '--start', DATES[1],
+                                    '--end', DATES[1], '--verbose']) == 0
+    output = capsys.readouterr().out
+    assert timing_rows(output) == {'USD_OIS': (1, 0), 'USD_LIBOR': (1, 0)}
+    verbose = [line.split()[:2] for line in output.splitlines()
+               if line.startswith('2016-')]
+    assert verbose == [[DATES[1], 'USD_OIS'], [DATES[1], 'USD_LIBOR']]
+
+
+def test_failed_build_exits_with_status_1(tmp_path, capsys):
+    # no OIS quotes on the second date, so its LIBOR curve fails
+    rows = [row for row in small_market().history(START, 3)
+            if not (row['date'] == DATES[1] and row['curve'] == 'USD_OIS')]
+    assert cli.main(write_market(tmp_path, rows)) == 1
+    captured = capsys.readouterr()
+    assert captured.err.startswith('{0} USD_LIBOR failed: '.format(DATES[1]))
+    assert len(captured.err.splitlines()) == 1
+    assert timing_rows(captured.out) == {'USD_OIS': (2, 0), 'USD_LIBOR': (2, 1)}
+
+
+def test_replay_of_a_capture(tmp_path, examples, capsys):
+    eonia = examples['eonia']
+    eonia.build()
+    path = str(tmp_path / 'eonia.json')
+    capture.write_capture(eonia, path)
+    assert cli.main(['replay', path, '--no-profile']) == 0
+    output = capsys.readouterr().out
+    assert output.splitlines()[0].startswith('BuildReport(')
+    assert ': largest log discount factor difference 0.000e+00' in output
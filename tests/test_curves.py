@@ -0,0 +1,98 @@
+'''
+Copyright (c) Kevin Keogh 2016
+
+Regression tests of the example curves of examples.py, against the pillars
+in data/example_curves.json. After a change that is meant to move the
+curves, regenerate the pillars with
+
+    PYTHONPATH=. python tests/test_curves.py
+'''
+import json
+import os
+
+import numpy as np
+import pytest
+
+from qbootstrapper.instruments import Instrument
+
+from conftest import local_timezone, run_examples
+
+EXPECTED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                        'example_curves.json')
+
+# the simultaneous strip is solved with scipy.optimize.minimize, whose
+# result moves a little between scipy versions
+TOLERANCES = {'fedfunds_libor.discount_curve': 1e-6,
+              'fedfunds_libor.projection_curve': 1e-6}
+
+EXAMPLE_CURVES = ['eonia', 'fedfunds', 'sonia', 'euribor', 'usdlibor',
+                  'fedfunds_short', 'usdlibor_short',
+                  'fedfunds_libor.discount_curve',
+                  'fedfunds_libor.projection_curve']
+
+
+def build_examples():
+    '''Returns a dict of the built example curves keyed by EXAMPLE_CURVES
+    '''
+    namespace = run_examples()
+    built = {}
+    for name in EXAMPLE_CURVES:
+        variable, _, attribute = name.partition('.')
+        curve = namespace[variable]
+        if not attribute:
+            curve.build()
+            built[name] = curve
+        else:
+            if not curve._built:
+                curve.build()
+            built[name] = getattr(curve, attribute)
+    return built
+
+
+def write_expected():
+    # the pillar timestamps are local time, see curves._timestamps
+    with local_timezone('UTC'):
+        built = build_examples()
+    pillars = dict((name, {'maturity': [str(date) for date in curve.curve['maturity']],
+                           'log_discount_factor': [float(value) for value in
+                                                   curve.curve['discount_factor']]})
+                   for name, curve in built.items())
+    with open(EXPECTED, 'w') as expected:
+        json.dump(pillars, expected, indent=1, sort_keys=True)
+        expected.write('\n')
+
+
+@pytest.fixture(scope='module')
+def built_examples():
+    with local_timezone('UTC'):
+        return build_examples()
+
+
+@pytest.mark.parametrize('name', EXAMPLE_CURVES)
+def test_example_curve_pillars(built_examples, name):
+    with open(EXPECTED) as expected:
+        pillars = json.load(expected)[name]
+    curve = built_examples[name].curve
+    np.testing.assert_array_equal(curve['maturity'],
+                                  np.array(pillars['maturity'], dtype='datetime64[D]'))
+    np.testing.assert_allclose(curve['discount_factor'],
+                               pillars['log_discount_factor'],
+                               rtol=0, atol=TOLERANCES.get(name, 1e-10))
+
+
+def test_overnight_grid_compounds_fridays_over_weekends():
+    # Thursday 2016-06-30 to Tuesday 2016-07-05, and Saturday 2016-07-09 to
+    # Wednesday 2016-07-13
+    starts = np.array(['2016-06-30', '2016-07-09'], dtype='datetime64[D]')
+    ends = np.array(['2016-07-05', '2016-07-13'], dtype='datetime64[D]')
+    dates, offsets = Instrument._overnight_grid(starts, ends)
+    expected = np.array(['2016-06-30', '2016-07-01', '2016-07-01',
+                         '2016-07-01', '2016-07-04',
+                         '2016-07-08', '2016-07-08', '2016-07-11',
+                         '2016-07-12'], dtype='datetime64[D]')
+    np.testing.assert_array_equal(dates, expected)
+    np.testing.assert_array_equal(offsets, [0, 5])
+
+
+if __name__ == '__main__':
+    write_expected()
@@ -0,0 +1,90 @@
+'''
+Copyright (c) Kevin Keogh 2016
+
+Tests of the daily grid of the curves, see Curve.grid
+'''
+import numpy as np
+import pytest
+
+from qbootstrapper.curves import _timestamps
+
+from conftest import run_examples
+
+
+@pytest.mark.parametrize('name', ['euribor', 'usdlibor'])
+def test_daily_grid_builds_fra_and_futures_curves(name):
+    # the FRA and futures pillars are solved from the log discount factors
+    # of the curve while it is being built
+    curve = run_examples()[name]
+    curve.build()
+    expected = curve.curve.copy()
+
+    curve.daily_grid = True
+    curve.set_quotes(curve.quotes())
+    curve.build()
+    np.testing.assert_array_equal(curve.curve, expected)
+    first, log_dfs = curve.grid()
+    assert first == expected['maturity'][0]
+    assert len(log_dfs) == (expected['maturity'][-1] - first).astype(int) + 1
+
+
+@pytest.mark.parametrize('zone', ['UTC', 'America/New_York', 'Asia/Tokyo'])
+def test_daily_grid_is_at_local_midnights(timezone, zone):
+    timezone(zone)
+    curve = run_examples()['eonia']
+    curve.daily_grid = True
+    curve.build()
+
+    first, log_dfs = curve.grid()
+    days = first + np.arange(len(log_dfs))
+    timestamps = _timestamps(days)
+    np.testing.assert_array_equal(log_dfs, curve.interpolator()(timestamps))
+    np.testing.assert_array_equal(curve.log_discount_factor(timestamps), log_dfs)
+    # the pillars are days of the grid
+    pillars = curve.curve['timestamp']
+    index = (curve.curve['maturity'] - first).astype(int)
+    np.testing.assert_array_equal(curve.log_discount_factor(pillars), log_dfs[index])
+    np.testing.assert_allclose(log_dfs[index], curve.curve['discount_factor'],
+                               rtol=0, atol=1e-15)
+
+
+def test_grid_file_is_rewritten_after_a_rebuild(tmp_path):
+    curve = run_examples()['eonia']
+    curve.daily_grid = True
+    curve.grid_path = str(tmp_path / 'eonia.grid')
+    curve.build()
+    first, log_dfs = curve.grid()
+    assert isinstance(log_dfs, np.memmap)
+    np.testing.assert_array_equal(np.fromfile(curve.grid_path), log_dfs)
+    # the grid is only materialized once for the pillars
+    assert curve.grid()[1] is log_dfs
+
+    previous = np.array(log_dfs)
+    curve.set_quotes(curve.quotes() + 0.001)
+    assert not curve._built
+    rebuilt_first, rebuilt = curve.grid()
+    assert curve._built
+    assert rebuilt_first == first
+    days = first + np.arange(len(rebuilt))
+    np.testing.assert_array_equal(rebuilt, curve.interpolator()(_timestamps(days)))
+    # higher rates, lower discount factors
+    assert np.all(rebuilt[1:] < previous[1:])
+    np.testing.assert_array_equal(np.fromfile(curve.grid_path), rebuilt)
+
+
+def test_off_grid_timestamps_are_interpolated():
+    curve = run_examples()['usdlibor']
+    curve.daily_grid = True
+    curve.build()
+    first, log_dfs = curve.grid()
+    days = first + np.arange(0, len(log_dfs), 37)
+    midnights = _timestamps(days)
+    # midday, before the first day and after the last
+    timestamps = np.concatenate([midnights, midnights + 43200.0,
+                                 [midnights[0] - 86400.0, midnights[-1] + 86400.0 * 40]])
+    expected = curve.interpolator()(timestamps)
+    np.testing.assert_array_equal(curve.log_discount_factor(timestamps), expected)
+    assert curve.log_discount_factor(timestamps[-1]) == expected[-1]
+    assert curve.log_discount_factor(timestamps[len(days)]) == expected[len(days)]
+    np.testing.assert_array_equal(expected[:len(days)],
+                                  log_dfs[(days - first).astype(int)])
@@ -0,0 +1,74 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+
+import numpy as np
+import pytest
+
+from qbootstrapper.environment import MarketEnvironment
+
+from conftest import run_examples
+
+
+@pytest.fixture
+def environment():
+    examples = run_examples()
+    environment = MarketEnvironment()
+    # the LIBOR curve first, so the dependency is found from either side
+    environment.add_curve('USDLIBOR', examples['usdlibor'])
+    environment.add_curve('FEDFUNDS', examples['fedfunds'])
+    environment.add_curve('EONIA', examples['eonia'])
+    return environment
+
+
+def test_queries_build_upstream_curves_first(environment):
+    assert environment.dependents('FEDFUNDS') == ['USDLIBOR']
+    assert environment.dirty() == ['EONIA', 'FEDFUNDS', 'USDLIBOR']
+
+    environment.curve('USDLIBOR')
+    assert environment.dirty() == ['EONIA']
+    assert environment.builds == {'FEDFUNDS': 1, 'USDLIBOR': 1, 'EONIA': 0}
+    environment.discount_factor('USDLIBOR', datetime.datetime(2020, 1, 2))
+    assert environment.builds['USDLIBOR'] == 1
+
+
+def test_quote_change_invalidates_dependents(environment):
+    environment.build()
+    maturity = datetime.datetime(2026, 7, 5)
+    quote = environment.get_quote('FEDFUNDS', maturity)
+
+    environment.set_quote('FEDFUNDS', maturity, quote)
+    assert environment.dirty() == []
+    environment.set_quote('FEDFUNDS', np.datetime64('2026-07-05'), quote + 0.001)
+    assert environment.dirty() == ['FEDFUNDS', 'USDLIBOR']
+
+    usdlibor = environment.curve('USDLIBOR')
+    assert environment.builds == {'FEDFUNDS': 2, 'USDLIBOR': 2, 'EONIA': 1}
+    assert environment.get_quote('FEDFUNDS', maturity) == quote + 0.001
+
+    # the same pillars as a fresh build on the moved discount curve
+    examples = run_examples()
+    fedfunds = examples['fedfunds']
+    fedfunds.set_quotes(environment.curves['FEDFUNDS'].quotes())
+    fedfunds.build()
+    examples['usdlibor'].build()
+    np.testing.assert_array_equal(usdlibor.curve, examples['usdlibor'].curve)
+
+
+def test_unknown_and_circular_dependencies(environment):
+    with pytest.raises(Exception, match='Curve "SONIA" not in environment'):
+        environment.add_curve('EURIBOR', run_examples()['euribor'],
+                              depends_on=['SONIA'])
+    assert 'EURIBOR' not in environment.curves
+
+    with pytest.raises(Exception, match='Curve "FEDFUNDS" has a circular '
+                                        'dependency'):
+        environment.add_curve('FEDFUNDS', environment.curves['FEDFUNDS'],
+                              depends_on=['USDLIBOR'])
+    assert 'FEDFUNDS' not in environment.curves
+
+    with pytest.raises(KeyError):
+        environment.get_quote('EONIA', datetime.datetime(2099, 1, 1))
+    with pytest.raises(TypeError):
+        environment.get_quote('EONIA', 0.01)
@@ -0,0 +1,45 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import numpy as np
+import pytest
+
+import qbootstrapper.export as export
+from qbootstrapper.scenarios import evaluate_views
+
+from conftest import run_examples
+
+
+@pytest.mark.parametrize('name', ['UTC', 'America/New_York', 'Asia/Tokyo'])
+def test_pillar_grid_reproduces_pillars(timezone, name):
+    timezone(name)
+    eonia = run_examples()['eonia']
+    eonia.build()
+    pillars = eonia.curve
+
+    columns = export.curve_columns('EONIA', eonia, grid=pillars['maturity'])
+    np.testing.assert_array_equal(columns['maturity'], pillars['maturity'])
+    np.testing.assert_allclose(columns['log_discount_factor'],
+                               pillars['discount_factor'], rtol=0, atol=1e-15)
+    np.testing.assert_allclose(evaluate_views([eonia], pillars['maturity'])[0],
+                               pillars['discount_factor'], rtol=0, atol=1e-15)
+
+
+def test_curve_and_schedule_files(examples, tmpdir):
+    eonia = examples['eonia']
+    eonia.build()
+    path = str(tmpdir.join('curves.npz'))
+    export.export_curves(path, {'EONIA': eonia}, grid=30, chunk_rows=7)
+    columns = np.load(path, allow_pickle=False)
+    assert sorted(columns.files) == sorted(export.CURVE_COLUMNS)
+    expected = export.curve_columns('EONIA', eonia, grid=30)
+    np.testing.assert_array_equal(columns['log_discount_factor'],
+                                  expected['log_discount_factor'])
+
+    path = str(tmpdir.join('schedules.csv'))
+    export.export_schedules(path, {'EONIA': eonia})
+    with open(path) as schedules:
+        header = schedules.readline().strip().split(',')
+        rows = schedules.readlines()
+    assert header == export.SCHEDULE_COLUMNS
+    assert len(rows) == len(export.schedule_columns('EONIA', eonia)['pv'])
@@ -0,0 +1,96 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import numpy as np
+import pytest
+
+from conftest import run_examples
+
+
+def test_residuals_do_not_materialize_the_daily_grid(tmp_path):
+    usdlibor = run_examples()['usdlibor']
+    usdlibor.build()
+    expected = usdlibor.residuals()
+
+    usdlibor.daily_grid = True
+    usdlibor.grid_path = str(tmp_path / 'usdlibor.grid')
+    usdlibor.set_quotes(usdlibor.quotes())
+    usdlibor.build()
+    grids = []
+    grid = usdlibor.grid
+    usdlibor.grid = lambda: grids.append(len(usdlibor.curve)) or grid()
+
+    np.testing.assert_array_equal(usdlibor.residuals(), expected)
+    assert grids == []
+    assert usdlibor._built
+    first, log_dfs = usdlibor.grid()
+    assert len(log_dfs) == (usdlibor.curve['maturity'][-1] - first).astype(int) + 1
+
+
+def full_rebuild(quotes):
+    rebuilt = run_examples()['usdlibor']
+    rebuilt.set_quotes(quotes)
+    rebuilt.build()
+    return rebuilt.curve
+
+
+def test_fast_update_is_close_to_a_full_rebuild():
+    usdlibor = run_examples()['usdlibor']
+    usdlibor.enable_fast_update()
+    base = usdlibor.curve.copy()
+    scales = np.array([instrument.quote_scale for instrument in usdlibor.instruments])
+    deltas = 0.0002 * scales * np.linspace(-1, 1, len(scales))
+
+    assert not usdlibor.apply_quote_deltas(deltas)
+    np.testing.assert_array_equal(usdlibor.curve['maturity'], base['maturity'])
+    expected = full_rebuild(usdlibor.quotes())
+    # second order in the moves, which are up to 1e-2
+    moves = np.abs(expected['discount_factor'] - base['discount_factor'])
+    errors = np.abs(usdlibor.curve['discount_factor'] - expected['discount_factor'])
+    assert errors.max() < 1e-3 * moves.max()
+    assert np.abs(usdlibor.residuals()).max() < 1e-5
+
+    # the moves are measured from the last full build, so undoing them
+    # returns to the base pillars
+    assert not usdlibor.apply_quote_deltas(-deltas)
+    np.testing.assert_allclose(usdlibor.curve['discount_factor'],
+                               base['discount_factor'], rtol=0, atol=1e-15)
+
+
+def test_fast_update_rebuilds_past_the_threshold():
+    usdlibor = run_examples()['usdlibor']
+    usdlibor.enable_fast_update(threshold=0.001)
+    scales = np.array([instrument.quote_scale for instrument in usdlibor.instruments])
+    deltas = np.zeros(len(scales))
+    deltas[-1] = 0.0006 * scales[-1]
+
+    assert not usdlibor.apply_quote_deltas(deltas)
+    # 0.0012 in total from the base
+    assert usdlibor.apply_quote_deltas(deltas)
+    np.testing.assert_array_equal(usdlibor.curve,
+                                  full_rebuild(usdlibor.quotes()))
+    # the rebuilt curve is the new base
+    assert not usdlibor.apply_quote_deltas(deltas)
+
+
+def test_fast_update_rebuilds_past_the_residual_tolerance():
+    usdlibor = run_examples()['usdlibor']
+    usdlibor.enable_fast_update(residual_tolerance=1e-12)
+    scales = np.array([instrument.quote_scale for instrument in usdlibor.instruments])
+
+    assert usdlibor.apply_quote_deltas(0.0002 * scales)
+    np.testing.assert_array_equal(usdlibor.curve,
+                                  full_rebuild(usdlibor.quotes()))
+    assert usdlibor.fast_update_error == 0.0
+
+
+def test_fast_update_must_be_enabled():
+    usdlibor = run_examples()['usdlibor']
+    usdlibor.build()
+    with pytest.raises(Exception, match='Fast update mode not enabled'):
+        usdlibor.apply_quote_deltas(np.zeros(len(usdlibor.instruments)))
+
+    usdlibor.enable_fast_update()
+    with pytest.raises(Exception, match='Expected {0} quote deltas, got '
+                                        '1'.format(len(usdlibor.instruments))):
+        usdlibor.apply_quote_deltas([0.0001])
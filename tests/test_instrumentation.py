@@ -0,0 +1,115 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import json
+
+import numpy as np
+import pytest
+
+from qbootstrapper.instrumentation import BuildHook, add_hook, remove_hook
+from qbootstrapper.solvers import SolverPolicy
+
+from conftest import run_examples
+
+
+class RecordingHook(BuildHook):
+    def __init__(self):
+        self.events = []
+
+    def build_started(self, curve):
+        self.events.append(('started', curve))
+
+    def instrument_solved(self, curve, report):
+        self.events.append(('solved', report.index))
+
+    def build_finished(self, curve, report):
+        self.events.append(('finished', report))
+
+
+def test_build_report_records_every_pillar():
+    usdlibor = run_examples()['usdlibor']
+    usdlibor.build()
+    report = usdlibor.build_report
+
+    assert report.curve_type == usdlibor.curve_type
+    assert [record.index for record in report.instruments] == list(
+        range(len(usdlibor.instruments)))
+    assert [np.datetime64(record.maturity.date()) for record in report.instruments] == \
+        list(usdlibor.curve['maturity'][1:])
+    methods = dict((record.instrument_type, record.method)
+                   for record in report.instruments)
+    assert methods['LIBORInstrument'] == 'analytic'
+    assert methods['LIBORSwapInstrument'] == 'secant'
+    assert all(record.converged for record in report.instruments)
+    assert report.evaluations() == sum(record.evaluations
+                                       for record in report.instruments) > 0
+    elapsed = [record.elapsed for record in report.slowest(3)]
+    assert elapsed == sorted(elapsed, reverse=True) and len(elapsed) == 3
+    assert report.interpolants > 0
+    assert report.allocations > 0 and report.allocated_bytes > 0
+    assert report.error is None and not report.cached and report.elapsed > 0
+
+    data = json.loads(json.dumps(report.to_dict()))
+    assert data['instruments'][-1]['maturity'] == str(usdlibor.curve['maturity'][-1])
+    assert len(data['instruments']) == len(report.instruments)
+    assert data['error'] is None
+    assert repr(report).startswith('BuildReport({0}, {1} instruments, '
+                                   '{2} evaluations'.format(report.curve_type,
+                                                            len(report.instruments),
+                                                            report.evaluations()))
+
+
+def test_hooks_are_called_for_each_build():
+    examples = run_examples()
+    eonia, fedfunds = examples['eonia'], examples['fedfunds']
+    everywhere, own = RecordingHook(), RecordingHook()
+    eonia.hooks.append(own)
+    add_hook(everywhere)
+    try:
+        eonia.build()
+        fedfunds.build()
+    finally:
+        remove_hook(everywhere)
+    eonia.build()
+
+    expected = ([('started', eonia)] +
+                [('solved', index) for index in range(len(eonia.instruments))] +
+                [('finished', eonia.build_report)])
+    assert own.events[-len(expected):] == expected
+    assert len(own.events) == 2 * len(expected)
+    assert everywhere.events[0] == ('started', eonia)
+    assert everywhere.events[len(expected) - 1][0] == 'finished'
+    assert everywhere.events[len(expected)] == ('started', fedfunds)
+    assert everywhere.events[-1] == ('finished', fedfunds.build_report)
+
+    with pytest.raises(TypeError, match='Hooks must be of type BuildHook'):
+        add_hook(object())
+
+
+def test_failed_build_reports_its_error():
+    usdlibor = run_examples()['usdlibor']
+    hook = RecordingHook()
+    usdlibor.hooks.append(hook)
+    usdlibor.solver = SolverPolicy(max_iterations=1, fallback=None)
+    with pytest.raises(RuntimeError) as error:
+        usdlibor.build()
+
+    report = usdlibor.build_report
+    assert report.error is error.value
+    assert hook.events[-1] == ('finished', report)
+    # the instruments before the failed swap were solved
+    assert 0 < len(report.instruments) < len(usdlibor.instruments)
+    assert report.to_dict()['error'] == repr(error.value)
+
+
+def test_simultaneous_build_counts_both_curves():
+    curve = run_examples()['fedfunds_libor']
+    curve.build()
+    report = curve.build_report
+    assert report.curve_type == curve.curve_type
+    assert len(report.instruments) == len(curve.instruments)
+    # the sub-curve builds are included in the counts, and leave reports
+    discount = curve.discount_curve.build_report
+    projection = curve.projection_curve.build_report
+    assert report.interpolants >= discount.interpolants + projection.interpolants
+    assert report.allocations > discount.allocations + projection.allocations
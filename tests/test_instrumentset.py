@@ -0,0 +1,87 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+
+import numpy as np
+import pytest
+
+import qbootstrapper as qb
+from qbootstrapper.instrumentset import InstrumentSet, build_scenarios
+
+from conftest import run_examples
+
+FIELDS = ['fixing_date', 'accrual_start', 'accrual_end', 'payment_date']
+
+
+def set_curve(curve, effective, instrument_set):
+    '''Returns a new curve like curve, built from an InstrumentSet
+    '''
+    if curve.discount_curve:
+        columnar = type(curve)(effective, discount_curve=curve.discount_curve)
+    else:
+        columnar = type(curve)(effective)
+    columnar.interpolation = curve.interpolation
+    columnar.set_instruments(instrument_set)
+    return columnar
+
+
+@pytest.mark.parametrize('name', ['eonia', 'fedfunds', 'sonia', 'euribor',
+                                  'usdlibor', 'fedfunds_short',
+                                  'usdlibor_short'])
+def test_instrument_set_matches_instrument_objects(examples, name):
+    curve = examples[name]
+    curve.build()
+    instrument_set = InstrumentSet.from_instruments(curve.instruments)
+    assert len(instrument_set) == len(curve.instruments)
+
+    for index, instrument in enumerate(curve.instruments):
+        created = instrument_set.instrument(index, curve)
+        assert type(created) is type(instrument)
+        assert created.maturity == instrument.maturity
+        assert created.get_quote() == instrument.get_quote()
+        for leg in ('fixed_schedule', 'float_schedule'):
+            if hasattr(instrument, leg):
+                for field in FIELDS:
+                    np.testing.assert_array_equal(getattr(created, leg).periods[field],
+                                                  getattr(instrument, leg).periods[field])
+
+    columnar = set_curve(curve, examples['curve_effective'], instrument_set)
+    columnar.build()
+    np.testing.assert_array_equal(columnar.curve, curve.curve)
+
+
+def test_set_quotes_and_scenarios_match_instrument_objects():
+    examples = run_examples()
+    usdlibor = examples['usdlibor']
+    usdlibor.build()
+    columnar = set_curve(usdlibor, examples['curve_effective'],
+                         InstrumentSet.from_instruments(usdlibor.instruments))
+    quotes = usdlibor.quotes() + 0.0001
+
+    columnar.set_quotes(quotes)
+    columnar.build()
+    usdlibor.set_quotes(quotes)
+    usdlibor.build()
+    np.testing.assert_array_equal(columnar.curve, usdlibor.curve)
+
+    scenarios = quotes + np.array([[0.0], [-0.0001]])
+    maturities, log_dfs = build_scenarios(columnar, scenarios)
+    np.testing.assert_array_equal(maturities, usdlibor.curve['maturity'])
+    np.testing.assert_array_equal(log_dfs[0], usdlibor.curve['discount_factor'])
+    np.testing.assert_array_equal(columnar.quotes(), quotes)
+
+
+def test_stub_swaps_use_their_own_schedules(examples):
+    eonia = examples['eonia']
+    conventions = examples['eonia_conventions']
+    stub = qb.OISSwapInstrument(examples['effective'], datetime.datetime(2019, 3, 5),
+                                0.01, eonia, second=datetime.datetime(2016, 12, 5),
+                                penultimate=datetime.datetime(2018, 12, 5),
+                                **conventions)
+    instrument_set = InstrumentSet.from_instruments([stub])
+    created = instrument_set.instrument(0, eonia)
+    for leg in ('fixed_schedule', 'float_schedule'):
+        for field in FIELDS:
+            np.testing.assert_array_equal(getattr(created, leg).periods[field],
+                                          getattr(stub, leg).periods[field])
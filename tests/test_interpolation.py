@@ -0,0 +1,80 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import numpy as np
+import pytest
+import scipy.interpolate
+
+from qbootstrapper.interpolation import (INTERPOLATIONS, LinearZeroInterpolation,
+                                         LogLinearInterpolation,
+                                         MonotoneConvexInterpolation,
+                                         NaturalCubicInterpolation,
+                                         PchipInterpolation)
+
+
+def random_pillars(seed):
+    '''Returns random pillar timestamps and log discount factors, with a
+    query grid that extends past both ends
+    '''
+    random_state = np.random.RandomState(seed)
+    count = random_state.randint(2, 40)
+    days = np.sort(random_state.choice(np.arange(1, 20000), count, replace=False))
+    x = days.astype(np.float64) * 86400 + 1.4e9
+    if seed % 3:
+        y = np.cumsum(random_state.normal(-0.0001, 0.001, count))
+    else:
+        y = -np.cumsum(np.abs(random_state.normal(0.01, 0.01, count)))
+    y[0] = 0
+    queries = np.linspace(x[0] - 1e7, x[-1] + 1e7, 3000)
+    return x, y, queries
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_engines_match_scipy(seed):
+    x, y, queries = random_pillars(seed)
+    np.testing.assert_allclose(PchipInterpolation(x, y)(queries),
+                               scipy.interpolate.PchipInterpolator(x, y)(queries),
+                               rtol=0, atol=1e-15)
+    np.testing.assert_allclose(NaturalCubicInterpolation(x, y)(queries),
+                               scipy.interpolate.CubicSpline(x, y, bc_type='natural')(queries),
+                               rtol=0, atol=1e-12)
+
+    inside = queries[(queries >= x[0]) & (queries <= x[-1])]
+    np.testing.assert_allclose(LogLinearInterpolation(x, y)(inside),
+                               np.interp(inside, x, y), rtol=0, atol=1e-15)
+    if len(x) > 2:
+        tenors = x - x[0]
+        zeros = -(y[1:] - y[0]) / tenors[1:]
+        later = inside[inside >= x[1]]
+        expected = y[0] - np.interp(later, x[1:], zeros) * (later - x[0])
+        np.testing.assert_allclose(LinearZeroInterpolation(x, y)(later),
+                                   expected, rtol=0, atol=1e-13)
+
+
+@pytest.mark.parametrize('seed', range(30))
+@pytest.mark.parametrize('engine', sorted(INTERPOLATIONS))
+def test_engines_reprice_pillars_continuously(seed, engine):
+    x, y, _ = random_pillars(seed)
+    interpolant = INTERPOLATIONS[engine](x, y)
+    np.testing.assert_allclose(interpolant(x), y, rtol=0, atol=1e-13)
+
+    # the end of each interval meets the start of the next
+    breakpoints = interpolant.breakpoints
+    widths = np.diff(breakpoints)
+    coefficients = interpolant.coefficients
+    ends = ((coefficients[0] * widths + coefficients[1]) * widths
+            + coefficients[2]) * widths + coefficients[3]
+    np.testing.assert_allclose(ends[:-1], coefficients[3, 1:], rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_monotone_convex_forwards_are_continuous(seed):
+    x, y, _ = random_pillars(seed)
+    interpolant = MonotoneConvexInterpolation(x, y)
+    widths = np.diff(interpolant.breakpoints)
+    coefficients = interpolant.coefficients
+    starts = -coefficients[2]
+    ends = -(3 * coefficients[0] * widths ** 2 + 2 * coefficients[1] * widths
+             + coefficients[2])
+    np.testing.assert_allclose(ends[:-1], starts[1:], rtol=0,
+                               atol=1e-12 * max(1, np.abs(starts).max()))
@@ -0,0 +1,99 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+
+import numpy as np
+import pytest
+
+from qbootstrapper import loader
+from qbootstrapper.synthetic import SyntheticMarket, write_quotes
+
+START = datetime.datetime(2016, 6, 27)
+
+
+@pytest.fixture(scope='module')
+def market():
+    return SyntheticMarket(seed=3, ois_pillars=8, libor_pillars=6, futures=2)
+
+
+def test_parse_tenor():
+    assert loader.parse_tenor('5D') == (5, 'days')
+    assert loader.parse_tenor('1w') == (1, 'weeks')
+    assert loader.parse_tenor(' 3M') == (3, 'months')
+    assert loader.parse_tenor('10Y') == (120, 'months')
+    with pytest.raises(Exception, match='Tenor "10X" not recognized'):
+        loader.parse_tenor('10X')
+
+
+def test_definition_round_trip(market):
+    for definition in market.definitions:
+        data = definition.to_dict()
+        assert loader.CurveDefinition.from_dict(data).to_dict() == data
+
+
+def test_loader_merges_the_quote_files_by_date(tmp_path, market):
+    rows = market.history(START, 4)
+    dates = sorted(set(row['date'] for row in rows))
+    # the OIS quotes in a CSV file and the LIBOR quotes in a JSON lines file,
+    # with a curve that is not defined
+    ois = str(tmp_path / 'ois.csv')
+    libor = str(tmp_path / 'libor.jsonl')
+    write_quotes(ois, [row for row in rows if row['curve'] == 'USD_OIS'])
+    write_quotes(libor, [dict(row, curve='EUR_OIS') if i % 7 == 0 else row
+                         for i, row in enumerate(rows)
+                         if row['curve'] == 'USD_LIBOR'])
+
+    curve_loader = loader.CurveLoader(market.definitions, [libor, ois],
+                                      start=loader._date(dates[1]),
+                                      end=loader._date(dates[2]))
+    loaded = list(curve_loader.dates())
+    assert [as_of for as_of, _ in loaded] == [loader._date(date) for date in dates[1:3]]
+    for as_of, date_rows in loaded:
+        expected = [row for row in rows if row['date'] == as_of.strftime('%Y-%m-%d')]
+        assert len(date_rows) < len(expected)
+        assert set(row['curve'] for row in date_rows) == set(['USD_OIS', 'USD_LIBOR'])
+
+    for as_of, curves in curve_loader:
+        assert sorted(curves) == ['USD_LIBOR', 'USD_OIS']
+        assert curves['USD_LIBOR'].discount_curve is curves['USD_OIS']
+
+
+def test_columnar_curves_match_instrument_curves(market):
+    rows = market.quotes(START)
+    objects = loader.build_curve_set(loader.order_definitions(market.definitions),
+                                     START, rows)
+    columnar = loader.build_curve_set(loader.order_definitions(market.definitions),
+                                      START, rows, columnar=True)
+    for name in ['USD_OIS', 'USD_LIBOR']:
+        objects[name].build()
+        columnar[name].build()
+        np.testing.assert_array_equal(columnar[name].curve, objects[name].curve)
+
+
+def test_curve_without_discount_quotes(market):
+    definitions = loader.order_definitions(market.definitions)
+    rows = [row for row in market.quotes(START) if row['curve'] == 'USD_LIBOR']
+    with pytest.raises(Exception, match='Discount curve "USD_OIS" of curve '
+                                        '"USD_LIBOR" has no quotes on 2016-06-27'):
+        loader.build_curve_set(definitions, START, rows)
+
+    failures = {}
+    assert loader.build_curve_set(definitions, START, rows, failures=failures) == {}
+    assert list(failures) == ['USD_LIBOR']
+
+
+def test_unsorted_quote_file_raises(tmp_path, market):
+    path = str(tmp_path / 'quotes.csv')
+    write_quotes(path, list(reversed(market.history(START, 2))))
+    with pytest.raises(Exception, match='is not sorted by date'):
+        list(loader.read_quotes(path))
+
+
+def test_unknown_instrument_raises(market):
+    rows = market.quotes(START)
+    rows[0] = dict(rows[0], instrument='99Y')
+    with pytest.raises(Exception, match='Instrument "99Y" not in curve '
+                                        'definition "USD_OIS"'):
+        loader.build_curve_set(loader.order_definitions(market.definitions),
+                               START, rows)
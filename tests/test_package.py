@@ -0,0 +1,61 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import json
+import subprocess
+import sys
+
+import pytest
+
+import qbootstrapper
+
+
+def imported_modules(code):
+    '''Returns the sorted qbootstrapper and scipy modules imported by a
+    fresh interpreter running code
+    '''
+    script = (code + '\nimport json, sys\n'
+              'print(json.dumps(sorted(name for name in sys.modules '
+              'if name.split(".")[0] in ("qbootstrapper", "scipy"))))')
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def test_import_is_lazy():
+    assert imported_modules('import qbootstrapper') == ['qbootstrapper']
+    modules = imported_modules('import qbootstrapper\nqbootstrapper.Curve')
+    assert 'qbootstrapper.curves' in modules
+    assert 'qbootstrapper.loader' not in modules
+    # scipy is only imported to solve a curve
+    assert not any(name.startswith('scipy') for name in modules)
+    modules = imported_modules('from qbootstrapper import store')
+    assert 'qbootstrapper.store' in modules
+    assert not any(name.startswith('scipy') for name in modules)
+
+
+def test_names_resolve_from_their_submodules():
+    from qbootstrapper.curves import Curve
+    from qbootstrapper.scenarios import key_rate_shifts
+    assert qbootstrapper.Curve is Curve
+    assert qbootstrapper.key_rate_shifts is key_rate_shifts
+    assert 'Curve' in vars(qbootstrapper)
+    assert qbootstrapper.store.__name__ == 'qbootstrapper.store'
+    for module, names in qbootstrapper._EXPORTS.items():
+        for name in names:
+            assert getattr(qbootstrapper, name) is getattr(
+                getattr(qbootstrapper, module), name)
+
+
+def test_unknown_name_raises_attribute_error():
+    with pytest.raises(AttributeError, match='module "qbootstrapper" has no '
+                                             'attribute "Curves"'):
+        qbootstrapper.Curves
+    assert not hasattr(qbootstrapper, 'CurveStore')
+    with pytest.raises(ImportError):
+        from qbootstrapper import Curves  # noqa: F401
+
+
+def test_dir_lists_the_lazy_names():
+    names = dir(qbootstrapper)
+    assert set(['Curve', 'MarketEnvironment', 'store', 'synthetic']) <= set(names)
+    assert names == sorted(names)
@@ -0,0 +1,90 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import copy
+
+import numpy as np
+import pytest
+
+from qbootstrapper.portfolio import SwapPortfolio
+
+CONVENTIONS = ['notional', 'fixed_basis', 'float_basis', 'fixed_length',
+               'float_length', 'fixed_period_length', 'float_period_length',
+               'fixed_period_adjustment', 'float_period_adjustment',
+               'fixed_payment_adjustment', 'float_payment_adjustment',
+               'rate_period', 'rate_period_length', 'rate_basis']
+
+
+def swap_values(curve, index, discount_curve=None):
+    '''Returns the SwapPortfolio trades of the swaps of a built curve, the
+    curves to price them with, and the values of the swaps from
+    _swap_value at their solved pillars. The curve of each swap holds the
+    pillars up to and including the swap's own, as when it was solved.
+    '''
+    pillars = curve.curve.copy()
+    rows, values, curves = [], [], {}
+    for position, instrument in enumerate(curve.instruments):
+        if instrument.instrument_type not in ('OIS_swap', 'LIBOR_swap'):
+            continue
+        name = 'pillar_{0}'.format(position)
+        truncated = copy.deepcopy(curve)
+        truncated.discount_curve = curve.discount_curve
+        truncated.curve = pillars[:position + 2]
+        truncated._built = True
+        curves[name] = truncated
+
+        curve.curve = pillars[:position + 1]
+        values.append(instrument._swap_value(pillars['discount_factor'][position + 1]))
+        curve.curve = pillars
+
+        row = dict((convention, getattr(instrument, convention))
+                   for convention in CONVENTIONS)
+        row.update({'effective': np.datetime64(instrument.effective.date()),
+                    'maturity': np.datetime64(instrument.maturity.date()),
+                    'rate': instrument.rate,
+                    'projection_curve': name,
+                    'discount_curve': discount_curve or name,
+                    'index': index})
+        rows.append(row)
+    if discount_curve is not None:
+        curves[discount_curve] = curve.discount_curve
+    trades = dict((column, np.array([row[column] for row in rows]))
+                  for column in rows[0])
+    return trades, curves, np.array(values)
+
+
+@pytest.mark.parametrize('name, index, discount_curve',
+                         [('eonia', 'OIS', None),
+                          ('usdlibor', 'LIBOR', 'FEDFUNDS')])
+def test_portfolio_matches_swap_value(examples, name, index, discount_curve):
+    curve = examples[name]
+    curve.build()
+    trades, curves, values = swap_values(curve, index, discount_curve)
+    valuation = SwapPortfolio(trades).price(curves)
+    np.testing.assert_allclose(valuation.pv, values, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(valuation.par_rate, trades['rate'], rtol=0,
+                               atol=1e-12)
+
+
+def test_pillar_sensitivities_match_bumped_pillars(examples):
+    curve = examples['eonia']
+    curve.build()
+    trades, _, _ = swap_values(curve, 'OIS')
+    trades['projection_curve'] = trades['discount_curve'] = np.array(
+        ['EONIA'] * len(trades['rate']))
+    # off-market rates, so that the fixed and floating legs both matter
+    trades['rate'] = trades['rate'] + 0.001
+    portfolio = SwapPortfolio(trades)
+    sensitivities = portfolio.pillar_sensitivities({'EONIA': curve})['EONIA']
+
+    pillars, bump = curve.curve, 1e-6
+    expected = np.empty_like(sensitivities)
+    for pillar in range(1, len(pillars)):
+        pvs = []
+        for sign in (1, -1):
+            curve.curve = pillars.copy()
+            curve.curve['discount_factor'][pillar] += sign * bump
+            pvs.append(portfolio.price({'EONIA': curve}).pv)
+        expected[:, pillar - 1] = (pvs[0] - pvs[1]) / (2 * bump)
+    curve.curve = pillars
+    np.testing.assert_allclose(sensitivities, expected, rtol=0, atol=1e-6)
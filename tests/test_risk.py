@@ -0,0 +1,123 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import numpy as np
+import pytest
+
+from qbootstrapper.portfolio import SwapPortfolio
+from qbootstrapper.risk import AdjointRiskEngine, BucketedRiskRunner
+
+from conftest import run_examples
+
+CONVENTIONS = ['notional', 'fixed_basis', 'float_basis', 'fixed_length',
+               'float_length', 'fixed_period_length', 'float_period_length',
+               'fixed_period_adjustment', 'float_period_adjustment',
+               'fixed_payment_adjustment', 'float_payment_adjustment',
+               'rate_period', 'rate_period_length', 'rate_basis']
+
+
+@pytest.fixture(scope='module')
+def market():
+    '''Returns the built FEDFUNDS and USDLIBOR example curves, and a
+    portfolio of off-market swaps on the USDLIBOR swap quotes
+    '''
+    examples = run_examples()
+    curves = {'FEDFUNDS': examples['fedfunds'], 'USDLIBOR': examples['usdlibor']}
+    curves['USDLIBOR'].build()
+    rows = []
+    for instrument in curves['USDLIBOR'].instruments:
+        if instrument.instrument_type != 'LIBOR_swap':
+            continue
+        row = dict((convention, getattr(instrument, convention))
+                   for convention in CONVENTIONS)
+        row.update({'effective': np.datetime64(instrument.effective.date()),
+                    'maturity': np.datetime64(instrument.maturity.date()),
+                    'rate': instrument.rate + 0.001,
+                    'projection_curve': 'USDLIBOR',
+                    'discount_curve': 'FEDFUNDS',
+                    'index': 'LIBOR'})
+        rows.append(row)
+    trades = dict((column, np.array([row[column] for row in rows]))
+                  for column in rows[0])
+    return curves, SwapPortfolio(trades)
+
+
+def bucketed(market, **kwargs):
+    curves, portfolio = market
+    return BucketedRiskRunner(curves['USDLIBOR'], portfolio=portfolio,
+                              names='USDLIBOR',
+                              curves={'FEDFUNDS': curves['FEDFUNDS']},
+                              **kwargs).run()
+
+
+def test_worker_processes_match_a_single_process(market):
+    curves, _ = market
+    pillars = curves['USDLIBOR'].curve.copy()
+    single = bucketed(market, processes=1)
+    pool = bucketed(market, processes=2)
+
+    np.testing.assert_array_equal(pool.sensitivities, single.sensitivities)
+    np.testing.assert_array_equal(pool.dv01, single.dv01)
+    np.testing.assert_array_equal(pool.pv, single.pv)
+    np.testing.assert_array_equal(single.pillars, pillars['discount_factor'][1:])
+    # the unbumped pillars are restored
+    np.testing.assert_array_equal(curves['USDLIBOR'].curve, pillars)
+    assert single.total_dv01().shape == (len(curves['USDLIBOR'].instruments),)
+
+
+def test_sensitivities_match_a_bumped_rebuild(market):
+    curves, _ = market
+    curve = curves['USDLIBOR']
+    risk = BucketedRiskRunner(curve, processes=1).run()
+    assert risk.dv01 is None
+    with pytest.raises(Exception, match='No portfolio was priced'):
+        risk.total_dv01()
+
+    base = curve.curve['discount_factor'][1:].copy()
+    quotes = curve.quotes()
+    for index in [0, len(quotes) // 2, len(quotes) - 1]:
+        instrument = curve.instruments[index]
+        bumped = quotes.copy()
+        bumped[index] += 0.0001 * instrument.quote_scale
+        try:
+            curve.set_quotes(bumped)
+            curve.build()
+            expected = ((curve.curve['discount_factor'][1:] - base) /
+                        (0.0001 * instrument.quote_scale))
+        finally:
+            curve.set_quotes(quotes)
+            curve.build()
+        np.testing.assert_allclose(risk.sensitivities[:, index], expected,
+                                   rtol=0, atol=1e-9)
+
+
+def test_adjoint_risk_matches_two_sided_bumps(market):
+    curves, portfolio = market
+    two_sided = bucketed(market, processes=1, two_sided=True)
+    one_sided = bucketed(market, processes=1)
+    # central differences differ from forward ones at second order
+    np.testing.assert_allclose(two_sided.dv01, one_sided.dv01, rtol=0,
+                               atol=0.005 * np.abs(two_sided.dv01).max())
+
+    engine = AdjointRiskEngine(curves)
+    assert engine.names == ['FEDFUNDS', 'USDLIBOR']
+    adjoint = engine.risk(portfolio)
+    columns = [column for column, (name, _) in enumerate(engine.quotes)
+               if name == 'USDLIBOR']
+    assert [engine.quotes[column][1] for column in columns] == two_sided.instruments
+    np.testing.assert_allclose(adjoint.pv, two_sided.pv, rtol=0, atol=1e-12)
+    # to the truncation error of the 1bp central differences
+    np.testing.assert_allclose(adjoint.dv01[:, columns], two_sided.dv01, rtol=0,
+                               atol=1e-4 * np.abs(two_sided.dv01).max())
+    np.testing.assert_allclose(engine.jacobians['USDLIBOR'][:, columns],
+                               two_sided.sensitivities, rtol=0,
+                               atol=1e-4 * np.abs(two_sided.sensitivities).max())
+
+
+def test_invalid_risk_requests():
+    examples = run_examples()
+    with pytest.raises(Exception, match='The curve names are required'):
+        BucketedRiskRunner(examples['usdlibor'], portfolio=object())
+    with pytest.raises(TypeError, match='SimultaneousStrippedCurve risk is '
+                                        'not supported'):
+        AdjointRiskEngine({'FEDFUNDS_LIBOR': examples['fedfunds_libor']})
@@ -0,0 +1,86 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+
+import numpy as np
+import pytest
+
+from qbootstrapper import scenarios
+from qbootstrapper.curves import _timestamps
+
+DATES = np.arange(np.datetime64('2016-07-01'), np.datetime64('2046-07-01'),
+                  np.timedelta64(97, 'D'))
+
+
+@pytest.fixture(scope='module')
+def eonia(examples):
+    curve = examples['eonia']
+    curve.build()
+    return curve
+
+
+def tenors(curve):
+    return (_timestamps(DATES) - curve.curve['timestamp'][0]) / scenarios.SECONDS_PER_YEAR
+
+
+def test_parallel_shift(eonia):
+    view = scenarios.ParallelShift(eonia, 0.0001)
+    timestamps = _timestamps(DATES)
+    np.testing.assert_allclose(view.log_discount_factor(timestamps),
+                               eonia.log_discount_factor(timestamps) -
+                               0.0001 * tenors(eonia), rtol=0, atol=1e-15)
+    maturity = datetime.datetime(2026, 7, 5)
+    assert view.discount_factor(maturity) == pytest.approx(
+        eonia.discount_factor(maturity) * np.exp(-0.0001 * (
+            (maturity - datetime.datetime(2016, 6, 30)).days / 365)), rel=1e-12)
+
+
+def test_key_rate_shifts_sum_to_a_parallel_shift(eonia):
+    views = scenarios.key_rate_shifts(eonia, [1, 2, 5, 10, 30], 0.0001)
+    shifts = sum(view.total_log_shift(_timestamps(DATES)) for view in views)
+    parallel = scenarios.ParallelShift(eonia, 0.0001)
+    np.testing.assert_allclose(shifts, parallel.total_log_shift(_timestamps(DATES)),
+                               rtol=0, atol=1e-15)
+
+
+def test_twist_and_butterfly_shapes(eonia):
+    twist = scenarios.Twist(eonia, -0.001, 0.001)
+    butterfly = scenarios.Butterfly(eonia, 0.001, -0.001)
+    years = np.array([1, 2, 3.5, 5, 7.5, 10, 20])
+    timestamps = eonia.curve['timestamp'][0] + years * scenarios.SECONDS_PER_YEAR
+    np.testing.assert_allclose(-twist.total_log_shift(timestamps) / years,
+                               [-0.001, -0.001, -0.000625, -0.00025, 0.000375,
+                                0.001, 0.001], rtol=0, atol=1e-15)
+    np.testing.assert_allclose(-butterfly.total_log_shift(timestamps) / years,
+                               [0.001, 0.001, 0, -0.001, 0, 0.001, 0.001],
+                               rtol=0, atol=1e-15)
+
+
+def test_stacked_views_and_evaluate_views(eonia, examples):
+    fedfunds = examples['fedfunds']
+    fedfunds.build()
+    spread = scenarios.SpreadCurve(eonia, fedfunds)
+    stacked = scenarios.ParallelShift(scenarios.Twist(spread, 0.001, -0.001), 0.0001)
+    assert stacked.root() is eonia
+
+    timestamps = _timestamps(DATES)
+    expected = (eonia.log_discount_factor(timestamps) +
+                fedfunds.log_discount_factor(timestamps) +
+                scenarios.Twist(eonia, 0.001, -0.001).total_log_shift(timestamps) -
+                0.0001 * tenors(eonia))
+    np.testing.assert_allclose(stacked.log_discount_factor(timestamps), expected,
+                               rtol=0, atol=1e-14)
+
+    views = [eonia, spread, stacked, scenarios.ParallelShift(fedfunds, 0.0001)]
+    values = scenarios.evaluate_views(views, DATES)
+    for view, row in zip(views, values):
+        np.testing.assert_allclose(row, view.log_discount_factor(timestamps),
+                                   rtol=0, atol=1e-14)
+
+
+def test_invalid_shifts_raise(eonia):
+    with pytest.raises(Exception, match='Tenors must be increasing'):
+        scenarios.ZeroShift(eonia, [5, 2], [0.001, 0.001])
+    with pytest.raises(Exception, match='same length'):
+        scenarios.ZeroShift(eonia, [2, 5], [0.001])
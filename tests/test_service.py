@@ -0,0 +1,44 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import asyncio
+import datetime
+
+from qbootstrapper.service import CurveService
+from qbootstrapper.synthetic import SyntheticMarket
+
+
+def test_tick_during_rebuild_completion_is_built():
+    market = SyntheticMarket(seed=1, ois_pillars=8, libor_pillars=6, futures=2)
+    as_of = datetime.datetime(2016, 6, 30)
+    quotes = dict((row['instrument'], row['quote'])
+                  for row in market.quotes(as_of) if row['curve'] == 'USD_OIS')
+    instrument = sorted(quotes)[-1]
+
+    async def run():
+        service = CurveService(market.definitions, as_of, debounce=0.001)
+        loop = asyncio.get_running_loop()
+        publish = service._publish
+
+        def publish_then_tick(name, curve, curve_quotes, build_time):
+            # the tick runs after the rebuild task has finished, but before
+            # its done callback
+            publish(name, curve, curve_quotes, build_time)
+            if service.latest(name).version == 1:
+                loop.call_soon(service.update, name,
+                               {instrument: quotes[instrument] + 1e-4})
+        service._publish = publish_then_tick
+
+        service.update('USD_OIS', quotes)
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            await service.wait()
+            if service.latest('USD_OIS') is not None and not service._tasks:
+                break
+        latest = service.latest('USD_OIS')
+        await service.close()
+        return latest
+
+    latest = asyncio.run(run())
+    assert latest.version == 2
+    assert latest.quotes[instrument] == quotes[instrument] + 1e-4
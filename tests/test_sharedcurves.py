@@ -0,0 +1,71 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import qbootstrapper as qb
+
+sharedcurves = pytest.importorskip('qbootstrapper.sharedcurves')
+
+EFFECTIVE = datetime.datetime(2016, 6, 30)
+VERSIONS = 2000
+
+
+def version_curve(version):
+    '''Returns a built curve whose pillars identify the version it is
+    published as: 2 to 6 pillars, with log discount factors proportional
+    to the version
+    '''
+    curve = qb.Curve(EFFECTIVE, interpolation='log_linear')
+    pillars = 2 + version % 5
+    start = curve.curve['timestamp'][0]
+    curve.curve = np.zeros(pillars, dtype=curve.curve.dtype)
+    curve.curve['maturity'] = np.datetime64('2016-06-30') + 365 * np.arange(pillars)
+    curve.curve['timestamp'] = start + 365 * 86400 * np.arange(pillars)
+    curve.curve['discount_factor'] = -0.01 * version * np.arange(pillars)
+    curve._built = True
+    return curve
+
+
+def read_until_stopped(prefix, stop, results):
+    '''Reader process, snapshots the curve until stop is set and puts the
+    number of reads and the versions that were torn on results
+    '''
+    shared = sharedcurves.SharedCurve(prefix, 'USD')
+    reads, torn = 0, []
+    while not stop.is_set() or reads == 0:
+        version, timestamps, log_dfs = shared.snapshot()
+        expected = version_curve(version).curve
+        if (not np.array_equal(timestamps, expected['timestamp']) or
+                not np.array_equal(log_dfs, expected['discount_factor'])):
+            torn.append(version)
+        reads += 1
+    shared.close()
+    results.put((reads, torn))
+
+
+def test_reader_never_sees_a_torn_version():
+    prefix = 'qbtest{0}_'.format(os.getpid())
+    publisher = sharedcurves.CurvePublisher(prefix, capacity=8)
+    curves = [version_curve(version) for version in range(VERSIONS + 1)]
+    try:
+        assert publisher.publish('USD', curves[1]) == 1
+        stop, results = multiprocessing.Event(), multiprocessing.Queue()
+        reader = multiprocessing.Process(target=read_until_stopped,
+                                         args=(prefix, stop, results))
+        reader.start()
+        for version in range(2, VERSIONS + 1):
+            assert publisher.publish('USD', curves[version]) == version
+        stop.set()
+        reads, torn = results.get(timeout=60)
+        reader.join(60)
+    finally:
+        publisher.unlink()
+    assert reader.exitcode == 0
+    assert reads > 0
+    assert torn == []
@@ -0,0 +1,94 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import numpy as np
+import pytest
+
+from qbootstrapper.solvers import POLICIES, SolverPolicy
+
+from conftest import run_examples
+
+
+@pytest.fixture(scope='module')
+def usdlibor():
+    '''Returns the usdlibor example curve, built with the default policy,
+    and its pillars
+    '''
+    curve = run_examples()['usdlibor']
+    curve.build()
+    return curve, curve.curve.copy()
+
+
+def swap_reports(curve):
+    return [instrument.solver_report for instrument in curve.instruments
+            if instrument.instrument_type == 'LIBOR_swap']
+
+
+@pytest.mark.parametrize('fallback', ['brentq', 'bisect'])
+def test_fallback_reaches_the_newton_pillars(usdlibor, fallback):
+    curve, expected = usdlibor
+    # one secant iteration never converges
+    curve.solver = SolverPolicy(max_iterations=1, fallback=fallback)
+    try:
+        curve.build()
+        pillars = curve.curve.copy()
+        reports = swap_reports(curve)
+        methods = set(record.method for record in curve.build_report.instruments
+                      if record.instrument_type == 'LIBORSwapInstrument')
+    finally:
+        curve.solver = POLICIES['default']
+        curve.build()
+
+    np.testing.assert_array_equal(pillars['maturity'], expected['maturity'])
+    np.testing.assert_allclose(pillars['discount_factor'],
+                               expected['discount_factor'], rtol=0, atol=1e-7)
+    assert reports
+    for report in reports:
+        assert report['method'] == 'secant+' + fallback
+        assert report['converged']
+        assert report['residual'] < 1e-6
+    assert methods == set(['secant+' + fallback])
+
+
+def test_fallback_without_newton_raises(usdlibor):
+    curve, _ = usdlibor
+    curve.solver = SolverPolicy(max_iterations=1, fallback=None)
+    try:
+        with pytest.raises(RuntimeError):
+            curve.build()
+    finally:
+        curve.solver = POLICIES['default']
+        curve.build()
+
+
+def test_fast_policy_is_close_to_default(usdlibor):
+    curve, expected = usdlibor
+    curve.solver = POLICIES['fast']
+    try:
+        curve.build()
+        pillars = curve.curve.copy()
+        reports = swap_reports(curve)
+    finally:
+        curve.solver = POLICIES['default']
+        curve.build()
+
+    np.testing.assert_allclose(pillars['discount_factor'],
+                               expected['discount_factor'], rtol=0, atol=1e-6)
+    for report in reports:
+        assert report['method'] == 'secant'
+        assert report['iterations'] <= POLICIES['fast'].max_iterations
+
+
+def test_bracket_is_widened_until_it_holds_the_root():
+    # the secant method converges to 3, outside of the initial bracket of
+    # [-0.25, 0.25], which is doubled four times to [-4, 4]
+    policy = SolverPolicy()
+    root, report = policy.solve(lambda guess: guess - 3, 0.0, 1.0)
+    assert root == pytest.approx(3, abs=policy.tolerance)
+    assert report['method'] == 'secant+brentq'
+    assert report['converged']
+    # 2 evaluations for each of the 5 brackets
+    assert report['evaluations'] >= 10
+
+    with pytest.raises(Exception, match='Could not bracket'):
+        SolverPolicy(expansions=3).solve(lambda guess: guess - 3, 0.0, 1.0)
@@ -0,0 +1,45 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+
+import numpy as np
+import pytest
+
+from qbootstrapper.store import CurveStore
+
+from conftest import run_examples
+
+
+@pytest.mark.parametrize('name', ['UTC', 'Asia/Tokyo'])
+def test_stored_curve_matches_built_curve(timezone, tmpdir, name):
+    timezone(name)
+    eonia = run_examples()['eonia']
+    eonia.interpolation = 'log_linear'
+    eonia.build()
+    as_of = eonia.curve['maturity'][0].astype(object)
+
+    store = CurveStore(str(tmpdir))
+    store.append('EONIA', [(as_of, eonia.curve['maturity'],
+                            eonia.curve['discount_factor'])],
+                 interpolation='log_linear')
+    stored = store.curve('EONIA', as_of)
+    assert stored.interpolation == 'log_linear'
+    for days in (0, 17, 400, 3000, 15000):
+        date = datetime.datetime.combine(as_of, datetime.time()) + datetime.timedelta(days=days)
+        assert stored.discount_factor(date) == eonia.discount_factor(date)
+
+
+def test_append_rejects_stored_dates(tmpdir):
+    store = CurveStore(str(tmpdir))
+    as_of = datetime.datetime(2016, 6, 30)
+    entry = (as_of, np.array(['2016-06-30', '2017-06-30'], dtype='datetime64[D]'),
+             np.array([0.0, -0.01]))
+    store.append('EONIA', [entry])
+    with pytest.raises(Exception):
+        store.append('EONIA', [entry])
+    with pytest.raises(Exception):
+        store.append('SONIA', [entry, entry])
+    # rewriting the same chunk is allowed
+    store.append('EONIA', [entry], chunk=0)
+    assert len(store.dates('EONIA')) == 1
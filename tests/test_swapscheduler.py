@@ -0,0 +1,79 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+
+import dateutil.relativedelta
+import numpy as np
+
+import qbootstrapper as qb
+from qbootstrapper.swapscheduler import Schedule, ScheduleTable, _shift_dates
+
+ADJUSTMENTS = ['unadjusted', 'following', 'preceding', 'modified following']
+FIELDS = ['fixing_date', 'accrual_start', 'accrual_end', 'payment_date']
+
+
+def random_swaps(count, seed=1):
+    random_state = np.random.RandomState(seed)
+    swaps = []
+    for _ in range(count):
+        effective = datetime.datetime(2010, 1, 1) + datetime.timedelta(
+            days=int(random_state.randint(0, 4000)))
+        period_length = random_state.choice(['months', 'months', 'weeks', 'days'])
+        if period_length == 'months':
+            length = int(random_state.choice([1, 3, 6, 12]))
+            days = int(random_state.randint(1, 20000))
+        else:
+            length = int(random_state.choice([1, 2, 7, 30]))
+            days = int(random_state.randint(1, 2000))
+        swaps.append({'effective': effective,
+                      'maturity': effective + datetime.timedelta(days=days),
+                      'length': length,
+                      'period_length': str(period_length),
+                      'period_adjustment': str(random_state.choice(ADJUSTMENTS)),
+                      'payment_adjustment': str(random_state.choice(ADJUSTMENTS)),
+                      'fixing_lag': int(random_state.choice([0, 2]))})
+    return swaps
+
+
+def test_schedule_table_matches_schedule():
+    swaps = random_swaps(150)
+    columns = dict((key, [swap[key] for swap in swaps]) for key in swaps[0])
+    table = ScheduleTable(columns.pop('effective'), columns.pop('maturity'),
+                          columns.pop('length'), **columns)
+    assert len(table) == len(swaps)
+    for index, swap in enumerate(swaps):
+        expected = Schedule(swap['effective'], swap['maturity'], swap['length'],
+                            period_adjustment=swap['period_adjustment'],
+                            payment_adjustment=swap['payment_adjustment'],
+                            fixing_lag=swap['fixing_lag'],
+                            period_length=swap['period_length']).periods
+        periods = table.periods(index)
+        assert len(periods) == len(expected), swap
+        for field in FIELDS:
+            np.testing.assert_array_equal(periods[field], expected[field])
+
+
+def test_shift_dates_clips_to_month_end():
+    dates = np.array(['2016-01-29', '2016-01-31', '2016-02-29', '2016-08-31'],
+                     dtype='datetime64[D]')
+    np.testing.assert_array_equal(_shift_dates(dates, 1, 'months'),
+                                  np.array(['2016-02-29', '2016-02-29',
+                                            '2016-03-29', '2016-09-30'],
+                                           dtype='datetime64[D]'))
+    np.testing.assert_array_equal(_shift_dates(dates, 2, 'weeks'),
+                                  dates + np.timedelta64(14, 'D'))
+
+
+def test_average_index_basis_swap_rate_ends(examples):
+    # month end fixings, whose rate periods end on shorter month ends
+    swap = qb.AverageIndexBasisSwapInstrument(datetime.datetime(2016, 8, 31),
+                                              datetime.datetime(2021, 8, 31),
+                                              examples['fedfunds_libor'],
+                                              leg_one_spread=0.0034)
+    fixing_dates = swap.leg_two_schedule.periods['fixing_date']
+    months = dateutil.relativedelta.relativedelta(months=swap.leg_two_rate_period)
+    expected = np.array([date.astype(object) + months for date in fixing_dates],
+                        dtype='datetime64[D]')
+    ends = swap._projection_dates[len(fixing_dates):]
+    np.testing.assert_array_equal(ends, expected.astype('<M8[s]').astype(np.float64))
@@ -0,0 +1,104 @@
+'''
+Copyright (c) Kevin Keogh 2016
+'''
+import datetime
+
+import numpy as np
+import pytest
+
+from qbootstrapper import loader
+from qbootstrapper.portfolio import SwapPortfolio
+from qbootstrapper.synthetic import SyntheticMarket, write_quotes
+
+AS_OF = datetime.datetime(2016, 7, 1)
+
+
+def small_market(seed=7, **kwargs):
+    return SyntheticMarket(seed=seed, ois_pillars=8, libor_pillars=6, futures=2,
+                           **kwargs)
+
+
+def test_markets_are_deterministic_by_seed():
+    market = small_market(markets=2)
+    # a different order of calls gives the same draws
+    other = small_market(markets=2)
+    ticks = list(other.ticks(20, AS_OF))
+    portfolio = other.portfolio(50, AS_OF)
+    history = other.history(AS_OF, 3)
+
+    assert market.history(AS_OF, 3) == history
+    assert list(market.ticks(20, AS_OF)) == ticks
+    expected = market.portfolio(50, AS_OF)
+    assert sorted(expected) == sorted(portfolio)
+    for column in expected:
+        np.testing.assert_array_equal(expected[column], portfolio[column])
+
+    assert small_market(seed=8, markets=2).quotes(AS_OF) != market.quotes(AS_OF)
+
+
+def test_history_is_sorted_by_business_day():
+    market = small_market()
+    # a Friday, so the walk skips the weekend
+    rows = market.history(AS_OF, 3)
+    dates = [row['date'] for row in rows]
+    assert dates == sorted(dates)
+    assert sorted(set(dates)) == ['2016-07-01', '2016-07-04', '2016-07-05']
+    per_date = len(market.quotes(AS_OF))
+    assert len(rows) == 3 * per_date
+    # the walk starts from the structures of the market
+    assert rows[:per_date] == market.quotes(AS_OF)
+    assert rows[per_date:2 * per_date] != [dict(row, date='2016-07-04')
+                                           for row in rows[:per_date]]
+
+
+def test_curves_recover_the_term_structures():
+    market = small_market(markets=2)
+    assert market.names == ['USD', 'EUR']
+    assert [definition.name for definition in market.definitions] == [
+        'USD_OIS', 'EUR_OIS', 'USD_LIBOR', 'EUR_LIBOR']
+    curves = market.curves(AS_OF)
+    assert curves['EUR_LIBOR'].discount_curve is curves['EUR_OIS']
+
+    # the quotes are approximate par rates, so the zero rates of the OIS
+    # curves are within 1bp of the structures and those of the LIBOR curves
+    # within 10bp
+    for name, curve in sorted(curves.items()):
+        curve.build()
+        pillars = curve.curve[1:]
+        years = (pillars['timestamp'] - curve.curve['timestamp'][0]) / (365 * 86400)
+        ois, basis = market.structures[name[:3]]
+        zero = ois.zero(years)
+        if name.endswith('_LIBOR'):
+            zero = zero + basis.zero(years)
+        tolerance = 0.001 if name.endswith('_LIBOR') else 0.0001
+        np.testing.assert_allclose(-pillars['discount_factor'] / years, zero,
+                                   rtol=0, atol=tolerance)
+
+    trades = market.portfolio(200, AS_OF)
+    valuation = SwapPortfolio(trades).price(curves)
+    # struck around par, with 25bp of noise
+    assert np.abs(valuation.par_rate - trades['rate']).max() < 0.015
+
+
+def test_written_quotes_load_as_the_market(tmp_path):
+    market = small_market()
+    rows = market.history(AS_OF, 2)
+    for path in [str(tmp_path / 'quotes.csv'), str(tmp_path / 'quotes.jsonl')]:
+        write_quotes(path, rows)
+        loaded = list(loader.read_quotes(path))
+        # the CSV quotes are strings until the curves are built
+        assert [(row['date'], row['curve'], row['instrument'], float(row['quote']))
+                for row in loaded] == [
+            (loader._date(row['date']), row['curve'], row['instrument'], row['quote'])
+            for row in rows]
+
+
+def test_basis_curve_builds():
+    market = small_market()
+    curve = market.basis_curve(AS_OF, tenors=(7, 10))
+    curve.build()
+    cutoff = np.datetime64('2023-01-01')
+    assert curve.discount_curve.curve['maturity'][-1] > cutoff
+    assert curve.projection_curve.curve['maturity'][-1] > cutoff
+    with pytest.raises(KeyError):
+        market.basis_curve(AS_OF, market='GBP')